@@ -5,7 +5,7 @@ V6 API router. Calls application only. No business logic.
 from fastapi import APIRouter, HTTPException
 
 from backend.v6.api.schemas import DailyPlanSchema, PlanRequest
-from backend.v6.application.use_cases.plan_population import plan_population
+from backend.v6.application.use_cases.plan_multi_site import plan_population_multi_site
 from backend.v6.infrastructure.population_loader import build_census_with_overrides, load_employees
 
 router = APIRouter()
@@ -16,6 +16,7 @@ def post_plan(request: PlanRequest) -> DailyPlanSchema:
     """
     POST /v6/plan
     Accepts list of employees. Optional employee_overrides (from app): applied with employee priority.
+    Employees with work_lat/work_lng are planned per destination office (one combined plan).
     """
     try:
         raw = [e.model_dump() for e in request.employees]
@@ -25,7 +26,7 @@ def post_plan(request: PlanRequest) -> DailyPlanSchema:
             employees = build_census_with_overrides(base, overrides)
         else:
             employees = base
-        plan = plan_population(
+        plan = plan_population_multi_site(
             employees,
             plan_date=request.date,
             include_shadow_metrics=request.include_shadow_metrics,
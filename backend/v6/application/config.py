@@ -3,12 +3,21 @@ Configuración por defecto para el caso de uso plan_population (oficina y constr
 Un solo lugar para evitar duplicar valores entre API, evaluadores y motor.
 """
 
+from pathlib import Path
+
 from backend.v6.domain.constraints import StructuralConstraints
 
 # Oficina por defecto (Madrid)
 DEFAULT_OFFICE_LAT = 40.4168
 DEFAULT_OFFICE_LNG = -3.7038
 
+# Caché en disco de matrices de tiempos (.npy, ver infrastructure/duration_matrix.py)
+DURATION_MATRIX_CACHE_DIR = (
+    Path(__file__).resolve().parent.parent / "data" / "cache" / "duration_matrices"
+)
+# Grafos viarios preprocesados (.npz, ver infrastructure/road_network.py)
+ROAD_GRAPH_CACHE_DIR = Path(__file__).resolve().parent.parent / "data" / "cache" / "road_graphs"
+
 # Preset cobertura Optimob (Block 4 en primera línea)
 DEFAULT_STRUCTURAL_CONSTRAINTS = StructuralConstraints(
     assign_radius_m=1200.0,
@@ -4,27 +4,28 @@ Run full V6 network design (Layer A) using Block 4 + Block 5.
 Uso (desde raíz del repo):
   python -m backend.v6.application.run_network_design_v6
   python -m backend.v6.application.run_network_design_v6 --map
+  python -m backend.v6.application.run_network_design_v6 --local-search-s 30   # rediseño semanal: menos buses
+  python -m backend.v6.application.run_network_design_v6 --multistart 32 --vrp-workers 8
 
 Flujo:
   census (CSV congelado) →
   Block 4 (paradas shuttle) →
   stops_coords / stops_demands →
-  matriz de tiempos D sencilla (Haversine) →
+  matriz de tiempos D (Haversine vectorizado o red viaria; perfil por hora opcional) →
   Block 5 (VRP) →
   rutas shuttle + KPIs estructurales (IOE, rutas, paradas fuera, etc.).
 """
 
 import argparse
-import math
 from pathlib import Path
-from typing import List, Tuple
-
-import numpy as np
+from typing import List
 
 from backend.v6.application.config import (
     DEFAULT_OFFICE_LAT,
     DEFAULT_OFFICE_LNG,
     DEFAULT_STRUCTURAL_CONSTRAINTS,
+    DURATION_MATRIX_CACHE_DIR,
+    ROAD_GRAPH_CACHE_DIR,
 )
 from backend.v6.application.shuttle_candidates import (
     block4_clusters_to_shuttle_options,
@@ -36,7 +37,23 @@ from backend.v6.core.network_design_engine.shuttle_vrp_engine import (
     VRPResult,
     run_shuttle_vrp,
 )
+from backend.v6.core.network_design_engine.shuttle_vrp_multistart import (
+    run_shuttle_vrp_multistart,
+)
 from backend.v6.domain.models import Employee, ShuttleOption
+from backend.v6.infrastructure.contraction_hierarchy import load_or_build_hierarchy
+from backend.v6.infrastructure.duration_matrix import (
+    DurationMatrixStore,
+    HaversineProvider,
+    build_duration_matrix,
+)
+from backend.v6.infrastructure.duration_profile import (
+    PeakProfileProvider,
+    build_duration_profile,
+    parse_peak_profile,
+)
+from backend.v6.infrastructure.population_loader import parse_arrival_to_minutes
+from backend.v6.infrastructure.road_network import RoadNetworkProvider, load_road_graph
 
 
 DATA_CSV = (
@@ -62,55 +79,6 @@ def _load_employees(csv_path: Path) -> List[Employee]:
     return employees
 
 
-def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Distancia en km entre dos coordenadas (lat, lon)."""
-    r = 6371.0
-    lat1_r = math.radians(lat1)
-    lat2_r = math.radians(lat2)
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_r) * math.cos(lat2_r) * math.sin(
-        dlon / 2
-    ) ** 2
-    c = 2 * math.asin(min(1.0, math.sqrt(a)))
-    return r * c
-
-
-def _build_duration_matrix(
-    stops_coords: List[Tuple[float, float]],
-    office_lat: float,
-    office_lng: float,
-    speed_kmh: float = 30.0,
-) -> Tuple[np.ndarray, int]:
-    """
-    Construye D (N×N) en segundos usando Haversine + velocidad constante.
-
-    Convención:
-      - N = S + 1, donde S = nº de paradas.
-      - Índice de oficina = S.
-    """
-    S = len(stops_coords)
-    N = S + 1
-    D = np.zeros((N, N), dtype=float)
-    office_idx = S
-
-    # nodos: 0..S-1 = paradas, S = oficina
-    all_coords: List[Tuple[float, float]] = stops_coords + [(office_lat, office_lng)]
-
-    for i in range(N):
-        for j in range(N):
-            if i == j:
-                D[i, j] = 0.0
-            else:
-                lat1, lon1 = all_coords[i]
-                lat2, lon2 = all_coords[j]
-                dist_km = _haversine_km(lat1, lon1, lat2, lon2)
-                # tiempo = distancia / velocidad
-                hours = dist_km / max(speed_kmh, 1.0)
-                D[i, j] = hours * 3600.0
-    return D, office_idx
-
-
 def _build_map(
     stops: List[ShuttleOption],
     vrp_result: VRPResult,
@@ -227,6 +195,62 @@ def main() -> int:
         action="store_true",
         help="Generar mapa Folium con rutas shuttle",
     )
+    parser.add_argument(
+        "--matrix-cache",
+        type=Path,
+        default=DURATION_MATRIX_CACHE_DIR,
+        help="Directorio de caché de matrices de tiempos (.npy)",
+    )
+    parser.add_argument(
+        "--no-matrix-cache",
+        action="store_true",
+        help="Calcular la matriz de tiempos sin leer ni escribir caché",
+    )
+    parser.add_argument(
+        "--road-graph",
+        type=Path,
+        default=None,
+        help="Grafo viario local (.graphml, .csv de aristas o .npz); por defecto Haversine",
+    )
+    parser.add_argument(
+        "--road-ch",
+        action="store_true",
+        help="Con --road-graph: consultas por contraction hierarchy (se construye y cachea la primera vez)",
+    )
+    parser.add_argument(
+        "--peak-profile",
+        default=None,
+        help="Factores de congestión por hora, p. ej. '07:30=1.15,08:30=1.45,09:30=1.10' (por defecto tiempos libres)",
+    )
+    parser.add_argument(
+        "--departure",
+        default="08:00",
+        help="Hora de salida de los shuttles (HH:MM) con --peak-profile",
+    )
+    parser.add_argument(
+        "--local-search-s",
+        type=float,
+        default=0.0,
+        help="Segundos de búsqueda local tras Clarke–Wright (menos rutas, luego menos duración); 0 = V4",
+    )
+    parser.add_argument(
+        "--local-search-seed",
+        type=int,
+        default=0,
+        help="Semilla de la búsqueda local (y de las variantes con --multistart)",
+    )
+    parser.add_argument(
+        "--multistart",
+        type=int,
+        default=1,
+        help="Variantes aleatorizadas de Clarke–Wright (la 0 es V4); se queda la mejor. 1 = solo V4",
+    )
+    parser.add_argument(
+        "--vrp-workers",
+        type=int,
+        default=None,
+        help="Procesos para --multistart (por defecto: nº CPUs; 1 = en serie)",
+    )
     args = parser.parse_args()
 
     if not args.csv.exists():
@@ -263,18 +287,66 @@ def main() -> int:
     stops_coords = [(s.centroid_lat, s.centroid_lng) for s in stops]
     stops_demands = [s.estimated_size for s in stops]
 
-    # ---------- Matriz de tiempos D (Haversine simple) ----------
-    D, office_idx = _build_duration_matrix(
-        stops_coords, args.office_lat, args.office_lng
-    )
+    # ---------- Matriz de tiempos D (caché en disco) ----------
+    provider = None
+    if args.road_graph is not None:
+        graph = load_road_graph(args.road_graph, ROAD_GRAPH_CACHE_DIR)
+        hierarchy = load_or_build_hierarchy(graph, ROAD_GRAPH_CACHE_DIR) if args.road_ch else None
+        provider = RoadNetworkProvider(graph, hierarchy=hierarchy)
+    cache_dir = None if args.no_matrix_cache else args.matrix_cache
+    if args.peak_profile:
+        # Perfil por hora de salida: K franjas (las del perfil), leídas a --departure.
+        peak = PeakProfileProvider(
+            provider or HaversineProvider(), parse_peak_profile(args.peak_profile)
+        )
+        D, office_idx = build_duration_profile(
+            stops_coords,
+            args.office_lat,
+            args.office_lng,
+            peak.departure_min,
+            peak,
+            cache_dir=cache_dir,
+        )
+    elif cache_dir is None:
+        D, office_idx = build_duration_matrix(
+            stops_coords, args.office_lat, args.office_lng, provider=provider
+        )
+    else:
+        # Store incremental: entre rediseños solo se calculan filas/columnas de paradas nuevas.
+        store = DurationMatrixStore.open(provider or HaversineProvider(), cache_dir)
+        D, office_idx = store.matrix(
+            stops_coords, args.office_lat, args.office_lng, prune=True
+        )
+        store.save()
+        print(
+            f"Matriz D: {store.n_computed} pares calculados "
+            f"de {(len(stops_coords) + 1) ** 2} (store incremental)"
+        )
 
     # ---------- Block 5 ----------
-    vrp_result = run_shuttle_vrp(
-        stops_demands=stops_demands,
-        duration_matrix=D,
-        office_index=office_idx,
-        constraints=constraints,
-    )
+    departure_min = parse_arrival_to_minutes(args.departure)
+    if args.multistart > 1:
+        vrp_result = run_shuttle_vrp_multistart(
+            stops_demands=stops_demands,
+            duration_matrix=D,
+            office_index=office_idx,
+            constraints=constraints,
+            n_starts=args.multistart,
+            workers=args.vrp_workers,
+            seed=args.local_search_seed,
+            local_search_s=args.local_search_s,
+            departure_min=departure_min,
+        )
+    else:
+        vrp_result = run_shuttle_vrp(
+            stops_demands=stops_demands,
+            duration_matrix=D,
+            office_index=office_idx,
+            constraints=constraints,
+            local_search_s=args.local_search_s,
+            local_search_seed=args.local_search_seed,
+            departure_min=departure_min,
+        )
 
     # ---------- KPIs estructurales ----------
     num_routes = len(vrp_result.routes_idx)
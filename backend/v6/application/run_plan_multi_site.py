@@ -0,0 +1,75 @@
+"""
+Plan diario multi-sede en lote (fuera de la API).
+
+Lee un JSON con el mismo cuerpo que POST /v6/plan (employees, date,
+employee_overrides, include_shadow_metrics), aplica los overrides y ejecuta
+plan_population_multi_site con un pool de procesos: una sede por proceso, así
+el tiempo total tiende al de la sede mayor. La API planifica las sedes en
+serie (no arranca procesos por petición); este es el punto de entrada para
+planificar empresas con varias oficinas en paralelo.
+
+Uso (desde raíz del repo):
+  python -m backend.v6.application.run_plan_multi_site plan.json
+  python -m backend.v6.application.run_plan_multi_site plan.json --workers 8 --out plan_out.json
+"""
+
+import argparse
+import json
+import os
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+from backend.v6.application.config import DEFAULT_OFFICE_LAT, DEFAULT_OFFICE_LNG
+from backend.v6.application.use_cases.plan_multi_site import (
+    group_by_site,
+    plan_population_multi_site,
+)
+from backend.v6.infrastructure.population_loader import build_census_with_overrides, load_employees
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Optimob V6 — plan diario multi-sede en lote")
+    parser.add_argument("request", type=Path, help="JSON con el cuerpo de POST /v6/plan")
+    parser.add_argument("--office-lat", type=float, default=DEFAULT_OFFICE_LAT, help="Oficina de quien no trae work_lat")
+    parser.add_argument("--office-lng", type=float, default=DEFAULT_OFFICE_LNG, help="Oficina de quien no trae work_lng")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto: nº CPUs; 1 = en serie)")
+    parser.add_argument("--out", type=Path, default=None, help="Guardar el DailyPlan en este JSON")
+    args = parser.parse_args()
+
+    if not args.request.exists():
+        print(f"ERROR: no existe el archivo {args.request}")
+        return 1
+
+    with open(args.request, encoding="utf-8") as f:
+        body = json.load(f)
+    employees = load_employees(body.get("employees", []))
+    if body.get("employee_overrides"):
+        employees = build_census_with_overrides(employees, body["employee_overrides"])
+    workers = args.workers or os.cpu_count() or 1
+    n_sites = len(group_by_site(employees, args.office_lat, args.office_lng))
+    print(f"Empleados: {len(employees)}  |  Sedes: {n_sites}  |  Workers: {workers}")
+
+    t0 = time.perf_counter()
+    plan = plan_population_multi_site(
+        employees,
+        plan_date=body.get("date"),
+        office_lat=args.office_lat,
+        office_lng=args.office_lng,
+        include_shadow_metrics=bool(body.get("include_shadow_metrics", False)),
+        workers=workers,
+    )
+    print(f"Plan {plan.date} en {time.perf_counter() - t0:.1f} s")
+    print(f"  Shuttles:     {len(plan.shuttle_routes)}")
+    print(f"  Carpools:     {len(plan.carpool_routes)}")
+    print(f"  Sin asignar:  {len(plan.unassigned)}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(asdict(plan), f, ensure_ascii=False, indent=2)
+        print(f"Plan guardado en {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
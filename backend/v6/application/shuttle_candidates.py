@@ -5,7 +5,10 @@ Primera línea: Block 4 (run_shuttle_stop_opening) → paradas viables y carpool
 Sombra: generate_shuttle_candidates (option.py) — solo para métricas de comparación.
 """
 
-from backend.v6.core.network_design_engine.shuttle_stop_engine import run_shuttle_stop_opening
+from backend.v6.core.network_design_engine.shuttle_stop_engine import (
+    Block4Stats,
+    run_shuttle_stop_opening,
+)
 from backend.v6.domain.constraints import StructuralConstraints
 from backend.v6.domain.models import Employee, ShuttleOption
 
@@ -40,13 +43,18 @@ def get_shuttle_candidates_block4(
     office_lat: float,
     office_lng: float,
     constraints: StructuralConstraints,
+    stats: Block4Stats | None = None,
+    stop_sites: list[tuple[float, float]] | None = None,
 ) -> tuple[list[ShuttleOption], set[str]]:
     """
     Primera línea: Block 4. Devuelve (shuttle_options, carpool_employee_ids).
     shuttle_options son las paradas viables; carpool_employee_ids es el residual (carpool).
+    stats: si se pasa, se rellena con tiempos por etapa y contadores de Block 4.
+    stop_sites: si se pasa, lista (lat, lng) de ubicaciones de parada autorizadas;
+    el greedy solo abre paradas en ellas.
     """
     final_clusters, carpool_set = run_shuttle_stop_opening(
-        employees, office_lat, office_lng, constraints
+        employees, office_lat, office_lng, constraints, stats=stats, stop_sites=stop_sites
     )
     employees_by_id = {e.employee_id: e for e in employees}
     options = block4_clusters_to_shuttle_options(final_clusters, employees_by_id)
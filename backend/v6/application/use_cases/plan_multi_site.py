@@ -0,0 +1,163 @@
+"""
+V6 plan multi-sede. Orchestrates plan_population per destination office. No FastAPI.
+
+El censo se agrupa por oficina de destino (Employee.work_lat/work_lng; sin ella,
+oficina por defecto) y cada sede se planifica por separado: Block 4 → carpool →
+asignación, sin estado mutable compartido (con workers > 1, en procesos aparte).
+Devuelve un único DailyPlan.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Optional
+
+from backend.v6.application.config import (
+    DEFAULT_OFFICE_LAT,
+    DEFAULT_OFFICE_LNG,
+    DEFAULT_STRUCTURAL_CONSTRAINTS,
+)
+from backend.v6.application.use_cases.plan_population import plan_population
+from backend.v6.domain.constraints import StructuralConstraints
+from backend.v6.domain.models import DailyPlan, Employee
+
+# Coordenadas de oficina a 6 decimales (~0.1 m): misma sede aunque venga con ruido de float.
+SITE_COORD_DECIMALS = 6
+
+
+def group_by_site(
+    employees: list[Employee],
+    office_lat: float,
+    office_lng: float,
+) -> list[tuple[float, float, list[Employee]]]:
+    """
+    Agrupa por oficina de destino en orden de primera aparición: [(lat, lng, empleados)].
+    La coordenada de cada sede es la del primer empleado que la usa.
+    """
+    sites: dict[tuple[float, float], tuple[float, float, list[Employee]]] = {}
+    for e in employees:
+        if e.work_lat is None or e.work_lng is None:
+            lat, lng = office_lat, office_lng
+        else:
+            lat, lng = e.work_lat, e.work_lng
+        key = (round(lat, SITE_COORD_DECIMALS), round(lng, SITE_COORD_DECIMALS))
+        if key not in sites:
+            sites[key] = (lat, lng, [])
+        sites[key][2].append(e)
+    return list(sites.values())
+
+
+def _plan_site(
+    employees: list[Employee],
+    plan_date: str,
+    office_lat: float,
+    office_lng: float,
+    constraints: StructuralConstraints,
+    include_shadow_metrics: bool,
+) -> DailyPlan:
+    """Worker: plan de una sede (top-level para poder ejecutarse en otro proceso)."""
+    return plan_population(
+        employees,
+        plan_date=plan_date,
+        office_lat=office_lat,
+        office_lng=office_lng,
+        constraints=constraints,
+        include_shadow_metrics=include_shadow_metrics,
+    )
+
+
+def _combine_plans(
+    plan_date: str,
+    site_plans: list[tuple[int, DailyPlan]],
+) -> DailyPlan:
+    """Une los planes por sede [(nº empleados, plan)]; option_id lleva prefijo site{k}_. Una sede: su plan tal cual."""
+    if len(site_plans) == 1:
+        return site_plans[0][1]
+    shuttle_routes: list[dict] = []
+    carpool_routes: list[dict] = []
+    unassigned: list[str] = []
+    shadow_n_clusters = 0
+    shadow_assigned = 0.0
+    any_shadow = False
+    n_total = 0
+    for k, (n_employees, plan) in enumerate(site_plans):
+        prefix = f"site{k}_"
+        for r in plan.shuttle_routes:
+            shuttle_routes.append({**r, "option_id": prefix + r["option_id"]})
+        for r in plan.carpool_routes:
+            carpool_routes.append({**r, "option_id": prefix + r["option_id"]})
+        unassigned.extend(plan.unassigned)
+        n_total += n_employees
+        if plan.shuttle_shadow_metrics is not None:
+            any_shadow = True
+            shadow_n_clusters += plan.shuttle_shadow_metrics["n_clusters"]
+            shadow_assigned += plan.shuttle_shadow_metrics["coverage_pct"] * n_employees / 100.0
+    shadow_metrics: Optional[dict] = None
+    if any_shadow:
+        shadow_metrics = {
+            "n_clusters": shadow_n_clusters,
+            "coverage_pct": (shadow_assigned / n_total * 100.0) if n_total else 0.0,
+        }
+    return DailyPlan(
+        date=plan_date,
+        shuttle_routes=shuttle_routes,
+        carpool_routes=carpool_routes,
+        unassigned=sorted(unassigned),
+        shuttle_shadow_metrics=shadow_metrics,
+    )
+
+
+def plan_population_multi_site(
+    employees: list[Employee],
+    plan_date: str | None = None,
+    office_lat: Optional[float] = None,
+    office_lng: Optional[float] = None,
+    constraints: Optional[StructuralConstraints] = None,
+    include_shadow_metrics: bool = False,
+    workers: int = 1,
+) -> DailyPlan:
+    """
+    Flow: group_by_site -> plan_population por sede -> DailyPlan único.
+    office_lat/office_lng: oficina de quien no trae work_lat/work_lng.
+    Con una sola sede devuelve el plan de plan_population sin tocar.
+    workers: 1 = sedes en serie en el proceso actual (sin pool; p. ej. en la API,
+    que no debe arrancar procesos por petición); > 1 = pool de hasta
+    min(workers, nº sedes) procesos. Mismo resultado en ambos casos.
+    """
+    if plan_date is None:
+        plan_date = date.today().isoformat()
+    if office_lat is None:
+        office_lat = DEFAULT_OFFICE_LAT
+    if office_lng is None:
+        office_lng = DEFAULT_OFFICE_LNG
+    if constraints is None:
+        constraints = DEFAULT_STRUCTURAL_CONSTRAINTS
+
+    sites = group_by_site(employees, office_lat, office_lng)
+    if len(sites) <= 1:
+        site_lat, site_lng, _ = sites[0] if sites else (office_lat, office_lng, [])
+        return _plan_site(
+            employees, plan_date, site_lat, site_lng, constraints, include_shadow_metrics
+        )
+
+    if workers <= 1:
+        plans = {
+            k: _plan_site(
+                site_employees, plan_date, lat, lng, constraints, include_shadow_metrics
+            )
+            for k, (lat, lng, site_employees) in enumerate(sites)
+        }
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sites))) as pool:
+            # Sedes grandes primero: el tiempo total tiende al de la sede mayor.
+            futures = {
+                k: pool.submit(
+                    _plan_site, site_employees, plan_date, lat, lng, constraints, include_shadow_metrics
+                )
+                for k, (lat, lng, site_employees) in sorted(
+                    enumerate(sites), key=lambda item: -len(item[1][2])
+                )
+            }
+            plans = {k: fut.result() for k, fut in futures.items()}
+    return _combine_plans(
+        plan_date, [(len(sites[k][2]), plans[k]) for k in range(len(sites))]
+    )
@@ -4,7 +4,7 @@ matching greedy con bonus δ, routing cheapest insertion + 2-opt, validación de
 """
 
 import time
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 from sklearn.cluster import DBSCAN
@@ -19,26 +19,48 @@ from backend.v6.domain.models import (
     MeetingPoint,
 )
 from backend.v6.core.allocation_engine.carpool_time_adapter import CarpoolTimeAdapter
+from backend.v6.core.coreset import Coreset, snap_points
+from backend.v6.core.duration_profile import DurationProfile
+
+EARTH_RADIUS_M = 6371000.0
 
 
 def _mps_por_cobertura(
     census: List[CarpoolPerson],
     config: CarpoolMatchConfig,
     adapter: CarpoolTimeAdapter,
-) -> List[MeetingPoint]:
-    """DBSCAN sobre (lat, lon) del censo → centroides → cluster suave → MPs."""
+) -> Tuple[List[MeetingPoint], Optional[Coreset]]:
+    """
+    DBSCAN sobre (lat, lon) del censo → centroides → cluster suave → MPs.
+    Con config.snap_tolerance_m, DBSCAN corre sobre el coreset (domicilios casi
+    idénticos = un punto con peso); las etiquetas se expanden a personas y los
+    centroides usan sus coordenadas reales. Devuelve (MPs, coreset o None).
+    """
     if not census:
-        return []
+        return [], None
     X = np.array([[p.lat, p.lng] for p in census], dtype=float)
     X_rad = np.radians(X)
-    eps_rad = config.dbscan_eps_m / 6371000.0
+    eps_rad = config.dbscan_eps_m / EARTH_RADIUS_M
     db = DBSCAN(
         eps=eps_rad,
         min_samples=config.dbscan_min_samples,
         algorithm="ball_tree",
         metric="haversine",
-    ).fit(X_rad)
-    labels = db.labels_
+    )
+    core = None
+    if config.snap_tolerance_m is None:
+        labels = db.fit(X_rad).labels_
+    else:
+        # Plano equirectangular local (m) para el snap; los puntos con peso vuelven a radianes.
+        cos_lat = np.cos(X_rad[:, 0].mean())
+        core = snap_points(
+            np.column_stack([X_rad[:, 0], X_rad[:, 1] * cos_lat]) * EARTH_RADIUS_M,
+            config.snap_tolerance_m,
+        )
+        P_rad = np.column_stack(
+            [np.bincount(core.point_of, weights=X_rad[:, d]) / core.weights for d in range(2)]
+        )
+        labels = db.fit(P_rad, sample_weight=core.weights).labels_[core.point_of]
 
     mps_raw: List[Tuple[float, float]] = []
     for k in sorted(set(labels)):
@@ -50,13 +72,13 @@ def _mps_por_cobertura(
         mps_raw.append((lat, lon))
 
     if not mps_raw:
-        return []
+        return [], core
     if len(mps_raw) == 1:
-        return [MeetingPoint(id_mp="MP_1", lat=mps_raw[0][0], lng=mps_raw[0][1])]
+        return [MeetingPoint(id_mp="MP_1", lat=mps_raw[0][0], lng=mps_raw[0][1])], core
 
     # Cluster suave para deduplicar MPs
     Xm = np.radians(np.array(mps_raw))
-    eps_m_rad = config.mp_cluster_eps_m / 6371000.0
+    eps_m_rad = config.mp_cluster_eps_m / EARTH_RADIUS_M
     db2 = DBSCAN(eps=eps_m_rad, min_samples=1, algorithm="ball_tree", metric="haversine").fit(Xm)
     rep_lat = []
     rep_lon = []
@@ -68,7 +90,41 @@ def _mps_por_cobertura(
     return [
         MeetingPoint(id_mp=f"MP_{i+1}", lat=rep_lat[i], lng=rep_lon[i])
         for i in range(len(rep_lat))
-    ]
+    ], core
+
+
+def _tt_matrix(
+    adapter: CarpoolTimeAdapter,
+    lat_a: np.ndarray,
+    lon_a: np.ndarray,
+    lat_b: np.ndarray,
+    lon_b: np.ndarray,
+) -> np.ndarray:
+    """
+    Tiempos (min) de cada punto A a cada punto B. Si el adapter ofrece
+    tt_min_matrix (p. ej. red viaria: un Dijkstra por origen) se pide el bloque
+    entero; si no, tt_min par a par.
+    """
+    batch = getattr(adapter, "tt_min_matrix", None)
+    if batch is not None:
+        return np.asarray(batch(lat_a, lon_a, lat_b, lon_b), dtype=float)
+    T = np.zeros((len(lat_a), len(lat_b)))
+    for i in range(len(lat_a)):
+        for j in range(len(lat_b)):
+            T[i, j] = adapter.tt_min(lat_a[i], lon_a[i], lat_b[j], lon_b[j])
+    return T
+
+
+def _tt_profile(
+    adapter: CarpoolTimeAdapter,
+    lat_a: np.ndarray,
+    lon_a: np.ndarray,
+    lat_b: np.ndarray,
+    lon_b: np.ndarray,
+) -> Optional[DurationProfile]:
+    """Tiempos (min) A×B por hora de salida si el adapter ofrece tt_min_profile; si no, None."""
+    profile = getattr(adapter, "tt_min_profile", None)
+    return None if profile is None else profile(lat_a, lon_a, lat_b, lon_b)
 
 
 def _cheapest_insertion_order(
@@ -170,7 +226,7 @@ def run_carpool_match(
         )
 
     # 1) MPs
-    mps = _mps_por_cobertura(census, config, adapter)
+    mps, core = _mps_por_cobertura(census, config, adapter)
     if not mps:
         return CarpoolMatchResult(
             matches=[], driver_routes=[], unmatched_pax_ids=[p.person_id for p in pax_list],
@@ -188,15 +244,15 @@ def run_carpool_match(
     mp_lon = np.array([mp.lng for mp in mps])
 
     # 2) Matrices
-    T_drv_mp = np.zeros((D, M))
-    T_mp_off = np.zeros(M)
-    T_drv_off = np.zeros(D)
-    for m in range(M):
-        T_mp_off[m] = adapter.tt_min(mp_lat[m], mp_lon[m], office_lat, office_lng)
-    for d in range(D):
-        T_drv_off[d] = adapter.tt_min(drv_lat[d], drv_lon[d], office_lat, office_lng)
-        for m in range(M):
-            T_drv_mp[d, m] = adapter.tt_min(drv_lat[d], drv_lon[d], mp_lat[m], mp_lon[m])
+    off_lat, off_lon = np.array([office_lat]), np.array([office_lng])
+    T_mp_off = _tt_matrix(adapter, mp_lat, mp_lon, off_lat, off_lon)[:, 0]
+    T_drv_off = _tt_matrix(adapter, drv_lat, drv_lon, off_lat, off_lon)[:, 0]
+    T_drv_mp = _tt_matrix(adapter, drv_lat, drv_lon, mp_lat, mp_lon)
+    # Perfiles por hora de salida (si el adapter los tiene) para candidatos con hora_obj.
+    P_drv_mp = _tt_profile(adapter, drv_lat, drv_lon, mp_lat, mp_lon)
+    P_mp_off = _tt_profile(adapter, mp_lat, mp_lon, off_lat, off_lon)
+    P_drv_off = _tt_profile(adapter, drv_lat, drv_lon, off_lat, off_lon)
+    perfiles = P_drv_mp is not None and P_mp_off is not None and P_drv_off is not None
 
     Walk_pax_mp = np.full((P, M), np.inf)
     for p in range(P):
@@ -229,6 +285,12 @@ def run_carpool_match(
                 d = int(d)
                 t_route = T_drv_mp[d, m] + T_mp_off[m]
                 t_direct = max(T_drv_off[d], 1e-6)
+                if perfiles and np.isfinite(hora_obj):
+                    # Salida = hora_obj − tiempo libre; cada tramo se lee a la hora en que empieza.
+                    dep = hora_obj - t_route
+                    t_drv_mp = P_drv_mp.value(dep, d, m)
+                    t_route = t_drv_mp + P_mp_off.value(dep + t_drv_mp, m, 0)
+                    t_direct = max(P_drv_off.value(hora_obj - T_drv_off[d], d, 0), 1e-6)
                 detour_min = max(0.0, t_route - t_direct)
                 detour_ratio = t_route / t_direct
                 if detour_min > config.max_detour_min or detour_ratio > config.max_detour_ratio:
@@ -323,11 +385,8 @@ def run_carpool_match(
     # 5) Routing por conductor: cheapest insertion + 2-opt + validación detour
     driver_routes: List[DriverRoute] = []
     mp_id_to_idx = {mps[i].id_mp: i for i in range(M)}
-    T_mp_mp = np.zeros((M, M))
-    for i in range(M):
-        for j in range(M):
-            if i != j:
-                T_mp_mp[i, j] = adapter.tt_min(mp_lat[i], mp_lon[i], mp_lat[j], mp_lon[j])
+    T_mp_mp = _tt_matrix(adapter, mp_lat, mp_lon, mp_lat, mp_lon)
+    np.fill_diagonal(T_mp_mp, 0.0)
 
     driver_ids_done = set()
     for m in match_rows:
@@ -409,4 +468,6 @@ def run_carpool_match(
         n_unmatched=len(unmatched),
         duration_ms=duration_ms,
         unmatched_reasons=unmatched_reasons,
+        n_snap_points=None if core is None else len(core.points),
+        snap_max_error_m=None if core is None else core.max_error_m,
     )
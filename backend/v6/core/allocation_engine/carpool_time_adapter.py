@@ -1,6 +1,7 @@
 """
 Adapter de tiempos y distancias para carpool (6A/6B).
 Implementación por defecto: Haversine + velocidad constante (sin OSM).
+Red viaria offline: infrastructure/road_network.RoadNetworkCarpoolAdapter.
 """
 
 import math
@@ -26,7 +27,14 @@ def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
 
 
 class CarpoolTimeAdapter(Protocol):
-    """Protocolo para tiempo (min) y distancia a pie (m)."""
+    """
+    Protocolo para tiempo (min) y distancia a pie (m). Opcional:
+    tt_min_matrix(lat1, lon1, lat2, lon2) -> (N, M) en minutos; si existe,
+    6B pide las matrices de tiempos en bloque en lugar de par a par.
+    tt_min_profile(lat1, lon1, lat2, lon2) -> DurationProfile (K, N, M) en
+    minutos; si existe, detour y ETA de pax con hora_obj_min se leen a su hora
+    de salida.
+    """
 
     def tt_min(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Tiempo de viaje en minutos entre dos puntos (conduciendo o aprox)."""
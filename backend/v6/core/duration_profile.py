@@ -0,0 +1,67 @@
+"""
+V6 time-dependent travel times. Pure logic only.
+A DurationProfile holds K departure-time slices of a travel-time matrix
+(K, N, M) and interpolates linearly between them; Block 5 reads one slice at
+the shuttle departure time and 6B reads per-candidate times at the
+passenger's departure time.
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class DurationProfile:
+    """
+    departure_min: (K,) ascending departure times, minutes since midnight.
+    slices: (K, N, M) travel times per departure time (float16/32/64, may be a
+    read-only memmap); same unit as the flat matrices they replace.
+    Outside [departure_min[0], departure_min[-1]] the nearest slice is used.
+    """
+    departure_min: np.ndarray
+    slices: np.ndarray
+
+    def __post_init__(self) -> None:
+        if self.slices.ndim != 3 or len(self.departure_min) != self.slices.shape[0]:
+            raise ValueError("slices must be (K, N, M) with one departure_min per slice")
+        if len(self.departure_min) == 0 or np.any(np.diff(self.departure_min) <= 0):
+            raise ValueError("departure_min must be non-empty and strictly increasing")
+
+    def bucket(self, minute: float) -> Tuple[int, int, float]:
+        """(k0, k1, w): time at minute = (1 - w) * slices[k0] + w * slices[k1]."""
+        m = self.departure_min
+        if minute <= m[0]:
+            return 0, 0, 0.0
+        if minute >= m[-1]:
+            return len(m) - 1, len(m) - 1, 0.0
+        k1 = int(np.searchsorted(m, minute, side="right"))
+        k0 = k1 - 1
+        return k0, k1, float((minute - m[k0]) / (m[k1] - m[k0]))
+
+    def at(self, minute: float) -> np.ndarray:
+        """(N, M) float64 matrix interpolated at minute."""
+        k0, k1, w = self.bucket(minute)
+        if w == 0.0:
+            return np.asarray(self.slices[k0], dtype=float)
+        return (1.0 - w) * np.asarray(self.slices[k0], dtype=float) + w * np.asarray(
+            self.slices[k1], dtype=float
+        )
+
+    def value(self, minute: float, i: int, j: int) -> float:
+        """Single entry (i, j) interpolated at minute (no full-slice copy)."""
+        k0, k1, w = self.bucket(minute)
+        a = float(self.slices[k0, i, j])
+        return a if w == 0.0 else (1.0 - w) * a + w * float(self.slices[k1, i, j])
+
+
+def resolve_duration_matrix(
+    duration_matrix: Union[np.ndarray, DurationProfile], departure_min: Optional[float]
+) -> np.ndarray:
+    """Flat matrix as-is; a DurationProfile is read at departure_min (required)."""
+    if isinstance(duration_matrix, DurationProfile):
+        if departure_min is None:
+            raise ValueError("departure_min is required with a DurationProfile")
+        return duration_matrix.at(departure_min)
+    return np.asarray(duration_matrix, dtype=float)
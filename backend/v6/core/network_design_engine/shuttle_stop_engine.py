@@ -3,16 +3,24 @@ V6 shuttle stop engine. Migrated from V4 Block 4. Pure logic only.
 No Folium, Google, FastAPI. All globals become explicit parameters.
 """
 
+import heapq
+import itertools
+import logging
 import math
-from dataclasses import dataclass
-from typing import List, Set, Tuple
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field, replace
+from typing import ContextManager, Dict, Iterator, List, Optional, Set, Tuple
 
 import numpy as np
-from scipy.spatial import KDTree
-from sklearn.cluster import KMeans
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import ConvexHull, KDTree, QhullError
 
+from backend.v6.core.coreset import Coreset, snap_points
 from backend.v6.domain.constraints import StructuralConstraints
-from backend.v6.domain.models import Employee
+from backend.v6.domain.models import CensusDelta, Employee
 
 # Defaults from V4 Block 4 (used when not on StructuralConstraints)
 MIN_STOP_SEP_M = 350.0
@@ -24,8 +32,15 @@ MAX_OK = 40
 FUSION_RADIUS = 150.0
 DIAMETER_MAX_M = 1500.0
 EXCLUDE_RADIUS_M = 1000.0
+SPLIT_METHOD = "balanced"  # "kmeans" = V4 (KMeans n_init=10, random_state=42)
+HULL_BRUTE_MAX = 64  # up to this many points / hull vertices, diameter over all pairs
+CANDIDATE_SITES = "employees"  # greedy centres: "employees" (V4) | "grid" (one per grid cell)
+SITE_GRID_M = 100.0  # grid cell side for candidate_sites="grid"
+SNAP_TOLERANCE_M: Optional[float] = None  # weighted-coreset greedy (see snap_points); None = off (V4)
 M_PER_DEG_LAT = 111320.0
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass(frozen=True)
 class ShuttleStopParams:
@@ -39,78 +54,344 @@ class ShuttleStopParams:
     fusion_radius: float = FUSION_RADIUS
     diameter_max_m: float = DIAMETER_MAX_M
     exclude_radius_m: float = EXCLUDE_RADIUS_M
+    split_method: str = SPLIT_METHOD
+    candidate_sites: str = CANDIDATE_SITES
+    site_grid_m: float = SITE_GRID_M
+    snap_tolerance_m: Optional[float] = SNAP_TOLERANCE_M
+
+
+@dataclass
+class Block4Stats:
+    """
+    Optional instrumentation of a Block 4 run: wall time per stage (seconds) and
+    counters (greedy heap work, KDTree queries, clusters split / merged / excluded...).
+    Pass an instance as stats= to collect; with stats=None nothing is recorded.
+    Stage times from process-pool workers are summed (CPU time, not wall time).
+    """
+    stage_s: Dict[str, float] = field(default_factory=dict)
+    counters: Dict[str, int] = field(default_factory=dict)
+    # Largest employee -> weighted point distance when snap_tolerance_m is set.
+    snap_error_m: float = 0.0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_s[name] = self.stage_s.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def merge(self, other: "Block4Stats") -> None:
+        for name, sec in other.stage_s.items():
+            self.stage_s[name] = self.stage_s.get(name, 0.0) + sec
+        for name, n in other.counters.items():
+            self.count(name, n)
+        self.snap_error_m = max(self.snap_error_m, other.snap_error_m)
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        """Flat, JSON-ready view (structured logs, dashboards)."""
+        return {
+            "stage_s": dict(self.stage_s),
+            "counters": dict(self.counters),
+            "snap_error_m": self.snap_error_m,
+        }
+
+
+def _stage(stats: Optional[Block4Stats], name: str) -> ContextManager[None]:
+    return nullcontext() if stats is None else stats.stage(name)
 
 
 def _lat_lon_to_meters(
     employees: List[Employee], office_lat: float, office_lng: float
 ) -> np.ndarray:
     """Local tangent plane: origin at office. Returns (N, 2) in meters."""
+    return _points_to_meters(
+        [(e.home_lat, e.home_lng) for e in employees], office_lat, office_lng
+    )
+
+
+def _points_to_meters(
+    points: List[Tuple[float, float]], office_lat: float, office_lng: float
+) -> np.ndarray:
+    """(lat, lng) pairs to the office tangent plane. Returns (N, 2) in meters."""
     cos_lat = math.cos(math.radians(office_lat))
-    ys = np.array([e.home_lat for e in employees])
-    xs = np.array([e.home_lng for e in employees])
+    ys = np.array([lat for lat, _ in points])
+    xs = np.array([lng for _, lng in points])
     y_m = (ys - office_lat) * M_PER_DEG_LAT
     x_m = (xs - office_lng) * M_PER_DEG_LAT * cos_lat
     return np.column_stack([y_m, x_m])
 
 
-def coverage_for_center(
-    i_center: int,
+def radius_neighbour_graph(
     X: np.ndarray,
     tree: KDTree,
-    current_unassigned_mask: np.ndarray,
     radius: float,
+    queries: Optional[np.ndarray] = None,
+) -> csr_matrix:
+    """
+    Radius-neighbour graph as CSR (self included). Each row lists its neighbours
+    in index order, as KDTree.query_ball_point returns them; data holds the
+    distances. Built once per run and shared by every greedy round.
+    queries: rows for these points instead of X (shape (len(queries), len(X))).
+    """
+    Q = X if queries is None else queries
+    M = len(Q)
+    nbrs = tree.query_ball_point(Q, r=radius)
+    lengths = np.fromiter((len(n) for n in nbrs), dtype=np.int64, count=M)
+    indptr = np.zeros(M + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    cols = np.fromiter(
+        itertools.chain.from_iterable(nbrs), dtype=np.int64, count=int(indptr[-1])
+    )
+    rows = np.repeat(np.arange(M), lengths)
+    cols = cols[np.lexsort((cols, rows))]
+    dists = np.linalg.norm(X[cols] - Q[rows], axis=1)
+    # Explicit zeros (self, duplicated homes) are kept: never call eliminate_zeros here.
+    return csr_matrix((dists, cols, indptr), shape=(M, len(X)))
+
+
+def coverage_for_center(
+    i_center: int,
+    graph: csr_matrix,
+    current_unassigned_mask: np.ndarray,
     cap: int,
 ) -> Tuple[List[int], List[float]]:
     """Neighbors within radius that are unassigned, sorted by distance, capped."""
-    nbrs = tree.query_ball_point(X[i_center : i_center + 1], r=radius)[0]
-    nbrs = [j for j in nbrs if current_unassigned_mask[j]]
-    if not nbrs:
-        return [], []
-    dists = np.linalg.norm(X[nbrs] - X[i_center], axis=1)
-    order = np.argsort(dists)
-    take = [nbrs[k] for k in order][:cap]
-    return take, [float(dists[k]) for k in order][:cap]
+    lo, hi = graph.indptr[i_center], graph.indptr[i_center + 1]
+    nbrs = graph.indices[lo:hi]
+    keep = current_unassigned_mask[nbrs]
+    nbrs, dists = nbrs[keep], graph.data[lo:hi][keep]
+    # Same argsort as V4 on the same index-ordered input: equal distances keep V4's order.
+    order = np.argsort(dists)[:cap]
+    return nbrs[order].tolist(), dists[order].tolist()
 
 
 def greedy_open_stops(
     X: np.ndarray,
-    tree: KDTree,
+    graph: csr_matrix,
     min_threshold: int,
-    radius: float,
     cap: int,
     initial_unassigned_mask: np.ndarray,
     min_sep: float,
-) -> Tuple[List[np.ndarray], List[List[int]], np.ndarray]:
+    stats: Optional[Block4Stats] = None,
+) -> Tuple[List[int], List[List[int]], np.ndarray]:
     """
     Greedy stop opening: best gain >= min_threshold until no progress.
+    Returns (center indices, members per center, unassigned mask), in opening order.
     Enforces minimum separation (min_sep) between stop centers.
     Tie-break: same gain -> smaller center index (deterministic).
+
+    Lazy evaluation (CELF): a candidate's gain can only shrink as employees get
+    assigned and centers get opened, so gains live in a heap as upper bounds and
+    are only refreshed when a candidate reaches the top. The number of unassigned
+    neighbours per point is kept up to date from the (symmetric) radius graph,
+    so refreshing a gain is a lookup instead of a new query.
     """
     unassigned = initial_unassigned_mask.copy()
+    centers_idx: List[int] = []
     centers_xy: List[np.ndarray] = []
     members_list: List[List[int]] = []
-    progressed = True
-    while progressed:
-        progressed = False
-        best: dict = {"gain": 0, "center": None, "take": None}
-        for i in np.where(unassigned)[0]:
-            if too_close(X[i], centers_xy, min_sep):
+    candidates = np.where(unassigned)[0]
+    if len(candidates) == 0:
+        return centers_idx, members_list, unassigned
+
+    N = len(X)
+    row_of = np.repeat(np.arange(N), np.diff(graph.indptr))
+    counts = np.bincount(row_of[unassigned[graph.indices]], minlength=N)
+    heap: List[Tuple[int, int]] = [
+        (-min(int(counts[i]), cap), int(i)) for i in candidates
+    ]
+    heapq.heapify(heap)
+    pops = refreshes = 0
+    while heap:
+        neg_gain, i = heapq.heappop(heap)
+        pops += 1
+        if not unassigned[i]:
+            continue
+        # Separation only gets stricter as centers open: too close now, too close forever.
+        if too_close(X[i], centers_xy, min_sep):
+            continue
+        gain = min(int(counts[i]), cap)
+        if gain != -neg_gain:
+            heapq.heappush(heap, (-gain, i))
+            refreshes += 1
+            continue
+        if gain < min_threshold:
+            break
+        take, _ = coverage_for_center(i, graph, unassigned, cap=cap)
+        centers_idx.append(i)
+        centers_xy.append(X[i].copy())
+        members_list.append(take)
+        unassigned[take] = False
+        touched = np.concatenate(
+            [graph.indices[graph.indptr[j] : graph.indptr[j + 1]] for j in take]
+        )
+        counts -= np.bincount(touched, minlength=N)
+    if stats is not None:
+        stats.count("greedy_heap_pops", pops)
+        stats.count("greedy_gain_refreshes", refreshes)
+    return centers_idx, members_list, unassigned
+
+
+def greedy_open_sites(
+    S: np.ndarray,
+    graph: csr_matrix,
+    min_threshold: int,
+    cap: int,
+    initial_unassigned_mask: np.ndarray,
+    min_sep: float,
+    stats: Optional[Block4Stats] = None,
+) -> Tuple[List[int], List[List[int]], np.ndarray]:
+    """
+    greedy_open_stops over candidate sites S (M, 2) instead of employees: graph
+    (M x N, see radius_neighbour_graph) lists the employees within radius of each
+    site. Same rules (best gain >= min_threshold, ties -> smaller site index,
+    min_sep between opened sites, CELF); a site need not be an employee home.
+    Returns (site indices, members per site, unassigned mask), in opening order.
+    """
+    unassigned = initial_unassigned_mask.copy()
+    centers_idx: List[int] = []
+    centers_xy: List[np.ndarray] = []
+    members_list: List[List[int]] = []
+    M = graph.shape[0]
+    if M == 0 or not unassigned.any():
+        return centers_idx, members_list, unassigned
+
+    row_of = np.repeat(np.arange(M), np.diff(graph.indptr))
+    counts = np.bincount(row_of[unassigned[graph.indices]], minlength=M)
+    sites_of = graph.T.tocsr()
+    heap: List[Tuple[int, int]] = [
+        (-min(int(counts[s]), cap), int(s)) for s in np.flatnonzero(counts)
+    ]
+    heapq.heapify(heap)
+    pops = refreshes = 0
+    while heap:
+        neg_gain, s = heapq.heappop(heap)
+        pops += 1
+        if too_close(S[s], centers_xy, min_sep):
+            continue
+        gain = min(int(counts[s]), cap)
+        if gain != -neg_gain:
+            heapq.heappush(heap, (-gain, s))
+            refreshes += 1
+            continue
+        if gain < min_threshold:
+            break
+        take, _ = coverage_for_center(s, graph, unassigned, cap=cap)
+        centers_idx.append(s)
+        centers_xy.append(S[s].copy())
+        members_list.append(take)
+        unassigned[take] = False
+        touched = np.concatenate(
+            [sites_of.indices[sites_of.indptr[j] : sites_of.indptr[j + 1]] for j in take]
+        )
+        counts -= np.bincount(touched, minlength=M)
+    if stats is not None:
+        stats.count("greedy_heap_pops", pops)
+        stats.count("greedy_gain_refreshes", refreshes)
+    return centers_idx, members_list, unassigned
+
+
+def greedy_open_weighted(
+    core: Coreset,
+    graph: csr_matrix,
+    min_threshold: int,
+    cap: int,
+    min_sep: float,
+    stats: Optional[Block4Stats] = None,
+) -> Tuple[List[int], List[List[int]], np.ndarray]:
+    """
+    greedy_open_stops over a coreset: graph (M x M, see radius_neighbour_graph) is
+    the radius graph of core.points and a gain counts the employees left at the
+    neighbouring points. Coverage takes points nearest first and, inside a
+    point, its employees in index order; a point is split when the cap is hit.
+    Centres are points with employees left, reported as their smallest
+    remaining employee index. Returns (centre employee indices, members
+    (employee indices) per centre, employees left per point), in opening order.
+    """
+    P = core.points
+    left = core.weights.astype(np.int64)
+    centers_idx: List[int] = []
+    centers_xy: List[np.ndarray] = []
+    members_list: List[List[int]] = []
+    M = len(P)
+    if M == 0:
+        return centers_idx, members_list, left
+
+    row_of = np.repeat(np.arange(M), np.diff(graph.indptr))
+    counts = np.bincount(row_of, weights=left[graph.indices], minlength=M).astype(np.int64)
+    heap: List[Tuple[int, int]] = [(-min(int(counts[j]), cap), j) for j in range(M)]
+    heapq.heapify(heap)
+    pops = refreshes = 0
+    while heap:
+        neg_gain, j = heapq.heappop(heap)
+        pops += 1
+        if left[j] == 0:
+            continue
+        if too_close(P[j], centers_xy, min_sep):
+            continue
+        gain = min(int(counts[j]), cap)
+        if gain != -neg_gain:
+            heapq.heappush(heap, (-gain, j))
+            refreshes += 1
+            continue
+        if gain < min_threshold:
+            break
+        centers_idx.append(int(core.members[j][core.weights[j] - left[j]]))
+        centers_xy.append(P[j].copy())
+        take: List[int] = []
+        taken_pts: List[int] = []
+        taken_n: List[int] = []
+        room = cap
+        lo, hi = graph.indptr[j], graph.indptr[j + 1]
+        # Nearest points first, ties -> smaller point index.
+        for k in graph.indices[lo:hi][np.argsort(graph.data[lo:hi], kind="stable")]:
+            if left[k] == 0:
                 continue
-            take, _ = coverage_for_center(
-                int(i), X, tree, unassigned, radius=radius, cap=cap
-            )
-            gain = len(take)
-            if gain > best["gain"] or (
-                gain == best["gain"]
-                and (best["center"] is None or i < best["center"])
-            ):
-                best.update({"gain": gain, "center": int(i), "take": take})
-        if best["center"] is not None and best["gain"] >= min_threshold:
-            centers_xy.append(X[best["center"]].copy())
-            members_list.append(best["take"])
-            unassigned[best["take"]] = False
-            progressed = True
-    return centers_xy, members_list, unassigned
+            t = min(int(left[k]), room)
+            start = int(core.weights[k] - left[k])
+            take.extend(core.members[k][start : start + t].tolist())
+            left[k] -= t
+            taken_pts.append(int(k))
+            taken_n.append(t)
+            room -= t
+            if room == 0:
+                break
+        members_list.append(take)
+        touched = [graph.indices[graph.indptr[k] : graph.indptr[k + 1]] for k in taken_pts]
+        counts -= np.bincount(
+            np.concatenate(touched),
+            weights=np.repeat(taken_n, [len(t) for t in touched]),
+            minlength=M,
+        ).astype(np.int64)
+    if stats is not None:
+        stats.count("greedy_heap_pops", pops)
+        stats.count("greedy_gain_refreshes", refreshes)
+    return centers_idx, members_list, left
+
+
+def grid_candidate_sites(X: np.ndarray, cell_m: float) -> np.ndarray:
+    """
+    Reduced candidate set: one employee per occupied grid cell of side cell_m,
+    the one nearest to the cell mean (ties -> smaller index). Ascending indices.
+    """
+    N = len(X)
+    if N == 0:
+        return np.zeros(0, dtype=np.int64)
+    _, cell = np.unique(np.floor(X / cell_m).astype(np.int64), axis=0, return_inverse=True)
+    cell = cell.ravel()
+    size = np.bincount(cell)
+    mean = np.column_stack(
+        [np.bincount(cell, weights=X[:, 0]) / size, np.bincount(cell, weights=X[:, 1]) / size]
+    )
+    d = np.linalg.norm(X - mean[cell], axis=1)
+    order = np.lexsort((np.arange(N), d, cell))
+    first = np.ones(N, dtype=bool)
+    first[1:] = cell[order][1:] != cell[order][:-1]
+    return np.sort(order[first])
 
 
 def too_close(center_xy: np.ndarray, centers_xy: List[np.ndarray], min_sep: float) -> bool:
@@ -121,16 +402,6 @@ def too_close(center_xy: np.ndarray, centers_xy: List[np.ndarray], min_sep: floa
     return bool((dif[:, 0] ** 2 + dif[:, 1] ** 2 <= (min_sep ** 2)).any())
 
 
-def best_medoid(members: List[int], X: np.ndarray) -> np.ndarray:
-    """Point in members that minimizes sum of distances to others."""
-    if not members:
-        raise ValueError("empty members")
-    pts = X[members]
-    dmat = np.linalg.norm(pts[:, None, :] - pts[None, :, :], axis=2)
-    idx = int(np.argmin(dmat.sum(axis=1)))
-    return X[members[idx]].copy()
-
-
 def cluster_center_xy(idx_list: List[int], X: np.ndarray) -> np.ndarray:
     """Mean of X at idx_list."""
     if not idx_list:
@@ -139,161 +410,1175 @@ def cluster_center_xy(idx_list: List[int], X: np.ndarray) -> np.ndarray:
 
 
 def cluster_diameter(idx_list: List[int], X: np.ndarray) -> float:
-    """Max pairwise distance in cluster; for n>400 use bbox diagonal."""
+    """
+    Max pairwise distance in cluster (exact, any size). All pairs up to
+    HULL_BRUTE_MAX points; above, convex hull + rotating calipers, O(n log n).
+    """
     if len(idx_list) <= 1:
         return 0.0
-    pts = X[idx_list]
-    if len(idx_list) <= 400:
-        dx = pts[:, 0][:, None] - pts[:, 0][None, :]
-        dy = pts[:, 1][:, None] - pts[:, 1][None, :]
-        return float(np.sqrt((dx * dx + dy * dy).max()))
-    minx, miny = pts.min(axis=0)
-    maxx, maxy = pts.max(axis=0)
-    return float(np.hypot(maxx - minx, maxy - miny))
+    if len(idx_list) <= HULL_BRUTE_MAX:
+        pts = X[idx_list]
+        return _max_cross_distance(pts, pts)
+    return _hull_diameter(X[_hull_indices(idx_list, X)])
 
 
-def run_shuttle_stop_opening(
-    employees: List[Employee],
-    office_lat: float,
-    office_lng: float,
-    constraints: StructuralConstraints,
-) -> Tuple[List[List[str]], Set[str]]:
+def _bisect_principal_axis(
+    pos: np.ndarray,
+    pts: np.ndarray,
+    sizes: List[int],
+    labels: np.ndarray,
+    first_label: int,
+) -> None:
+    """Recursively bisect pos (rows of pts) along the principal axis into len(sizes) parts."""
+    if len(sizes) == 1:
+        labels[pos] = first_label
+        return
+    k1 = len(sizes) // 2
+    n1 = sum(sizes[:k1])
+    c = pts[pos] - pts[pos].mean(axis=0)
+    _, vecs = np.linalg.eigh(c.T @ c)
+    axis = vecs[:, -1]
+    if axis[int(np.argmax(np.abs(axis)))] < 0:
+        axis = -axis
+    order = np.lexsort((pos, c @ axis))
+    _bisect_principal_axis(pos[order[:n1]], pts, sizes[:k1], labels, first_label)
+    _bisect_principal_axis(pos[order[n1:]], pts, sizes[k1:], labels, first_label + k1)
+
+
+def split_oversized(
+    members: List[int],
+    X: np.ndarray,
+    k: int,
+    method: str = SPLIT_METHOD,
+) -> List[List[int]]:
     """
-    Full Block 4 pipeline. Returns final_clusters (list of list of employee_id),
-    carpool_set (set of employee_id for residual).
-    Block 4 params come from constraints via getattr with V4 defaults.
+    Split an oversized cluster into k sub-clusters (each keeps members order).
+
+    method="balanced": recursive principal-axis bisection, deterministic; sizes
+    are floor/ceil of n/k, so every part is <= max_ok when k = ceil(n / max_ok).
+    method="kmeans": V4 behaviour (KMeans n_init=10, random_state=42).
     """
-    if not employees:
-        return [], set()
-    ids = [e.employee_id for e in employees]
-    X = _lat_lon_to_meters(employees, office_lat, office_lng)
-    N = len(X)
-    tree = KDTree(X)
-    radius = constraints.assign_radius_m
-    cap = constraints.max_cluster_size
-    min_shuttle = getattr(constraints, "min_shuttle", 6)
-    min_sep = getattr(constraints, "min_stop_sep_m", MIN_STOP_SEP_M)
-    fallback_min = getattr(constraints, "fallback_min", FALLBACK_MIN)
-    fallback_sep = getattr(constraints, "fallback_sep_m", FALLBACK_SEP_M)
-    pair_radius = getattr(constraints, "pair_radius_m", None) or PAIR_RADIUS_M
-    min_ok = getattr(constraints, "min_ok", MIN_OK)
-    min_ok_far_m = getattr(constraints, "min_ok_far_m", None)
-    min_ok_far = getattr(constraints, "min_ok_far", 6)
-    max_ok = getattr(constraints, "max_ok", MAX_OK)
-    fusion_radius = getattr(constraints, "fusion_radius", FUSION_RADIUS)
-    diameter_max_m = getattr(constraints, "diameter_max_m", DIAMETER_MAX_M)
-    exclude_radius_m = getattr(constraints, "exclude_radius_m", EXCLUDE_RADIUS_M)
-
-    unassigned_shuttle_mask = np.ones(N, dtype=bool)
-    centers_xy, members_list, unassigned = greedy_open_stops(
-        X, tree, min_shuttle, radius, cap, unassigned_shuttle_mask, min_sep
-    )
-    if len(centers_xy) == 0:
-        centers_xy, members_list, unassigned = greedy_open_stops(
-            X, tree, fallback_min, radius, cap, unassigned_shuttle_mask, min_sep
-        )
+    n = len(members)
+    if method == "kmeans":
+        from sklearn.cluster import KMeans
 
-    for i in range(len(centers_xy)):
-        if members_list[i]:
-            centers_xy[i] = best_medoid(members_list[i], X)
+        labels = KMeans(n_clusters=k, n_init=10, random_state=42).fit_predict(X[members])
+    elif method == "balanced":
+        sizes = [n // k + (1 if p < n % k else 0) for p in range(k)]
+        labels = np.empty(n, dtype=np.int64)
+        _bisect_principal_axis(np.arange(n), X[members], sizes, labels, 0)
+    else:
+        raise ValueError(f"unknown split_method: {method}")
+    return [[members[i] for i in range(n) if labels[i] == lab] for lab in range(k)]
 
-    assigned_mask = np.zeros(N, dtype=bool)
-    for mems in members_list:
-        assigned_mask[mems] = True
-    cap_left = [cap - len(m) for m in members_list]
-    for i in range(N):
-        if assigned_mask[i]:
-            continue
-        for k, mems in enumerate(members_list):
-            if cap_left[k] <= 0:
-                continue
-            if any(np.linalg.norm(X[i] - X[j]) <= pair_radius for j in mems):
-                members_list[k].append(i)
-                cap_left[k] -= 1
-                assigned_mask[i] = True
-                break
 
-    def effective_min_ok(members: List[int]) -> int:
-        """min_ok adaptativo: si min_ok_far_m está definido, clusters lejos de oficina usan min_ok_far (ej. 6)."""
-        if min_ok_far_m is None or min_ok_far_m <= 0 or min_ok_far >= min_ok:
-            return min_ok
-        cxy = cluster_center_xy(members, X)
-        dist_to_office = float(np.linalg.norm(cxy))
-        return min_ok_far if dist_to_office > min_ok_far_m else min_ok
-
-    kept_clusters: List[List[int]] = []
-    for mems in members_list:
-        n = len(mems)
-        eff_min = effective_min_ok(mems)
-        if n < eff_min:
-            continue
-        if n > max_ok:
-            k = int(math.ceil(n / max_ok))
-            km = KMeans(n_clusters=k, n_init=10, random_state=42)
-            labels = km.fit_predict(X[mems])
-            for lab in range(k):
-                sub = [mems[i] for i in range(n) if labels[i] == lab]
-                if not sub:
-                    continue
-                sub_min = effective_min_ok(sub)
-                if len(sub) >= sub_min:
-                    kept_clusters.append(sub)
-        else:
-            kept_clusters.append(mems)
+def _hull_indices(idx_list: List[int], X: np.ndarray) -> np.ndarray:
+    """
+    Indices (into X) of the convex-hull vertices of idx_list, counter-clockwise.
+    Degenerate input (<= 3 points, collinear, duplicates): all of them, or only
+    the extreme points when there are more than HULL_BRUTE_MAX.
+    """
+    idx = np.asarray(idx_list, dtype=np.int64)
+    if len(idx) <= 3:
+        return idx
+    try:
+        hull = ConvexHull(X[idx])
+    except QhullError:
+        if len(idx) <= HULL_BRUTE_MAX:
+            return idx
+        pts = X[idx]
+        lex = np.lexsort((pts[:, 1], pts[:, 0]))
+        extremes = {
+            int(lex[0]), int(lex[-1]),
+            int(np.argmin(pts[:, 1])), int(np.argmax(pts[:, 1])),
+        }
+        return idx[sorted(extremes)]
+    return idx[hull.vertices]
 
+
+def _max_cross_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Max distance between a point of a and a point of b (both (n, 2))."""
+    dx = a[:, 0][:, None] - b[:, 0][None, :]
+    dy = a[:, 1][:, None] - b[:, 1][None, :]
+    return float(np.sqrt((dx * dx + dy * dy).max()))
+
+
+def _hull_diameter(P: np.ndarray) -> float:
+    """
+    Diameter of P (n, 2). Above HULL_BRUTE_MAX points P must be convex-hull
+    vertices in counter-clockwise order (_hull_indices): rotating calipers find
+    the antipodal vertex of every edge; distances are then evaluated like
+    _max_cross_distance on those pairs (and their neighbours, against rounding
+    in the area tests), so the value matches the all-pairs maximum.
+    """
+    h = len(P)
+    if h <= HULL_BRUTE_MAX:
+        return _max_cross_distance(P, P)
+    xs, ys = P[:, 0].tolist(), P[:, 1].tolist()
+
+    def area2(a: int, b: int, c: int) -> float:
+        return (xs[b] - xs[a]) * (ys[c] - ys[a]) - (ys[b] - ys[a]) * (xs[c] - xs[a])
+
+    antipode = np.empty(h, dtype=np.int64)
+    j = 1
+    for i in range(h):
+        i1 = (i + 1) % h
+        steps = 0
+        while steps < h and area2(i, i1, (j + 1) % h) > area2(i, i1, j):
+            j = (j + 1) % h
+            steps += 1
+        antipode[i] = j
+    edge_start = np.arange(h)
+    a = np.concatenate([edge_start, (edge_start + 1) % h])
+    b = np.concatenate([antipode, antipode])
+    a = np.repeat(a, 3)
+    b = (np.repeat(b, 3) + np.tile([-1, 0, 1], 2 * h)) % h
+    dx = P[a, 0] - P[b, 0]
+    dy = P[a, 1] - P[b, 1]
+    return float(np.sqrt((dx * dx + dy * dy).max()))
+
+
+def fuse_clusters(
+    clusters: List[List[int]],
+    X: np.ndarray,
+    fusion_radius: float,
+    max_ok: int,
+    diameter_max_m: float,
+    stats: Optional[Block4Stats] = None,
+) -> List[List[int]]:
+    """
+    Prudent merge: repeated passes fusing clusters whose centroids are within
+    fusion_radius, if the merged cluster has <= max_ok members and diameter
+    <= diameter_max_m. Same pass semantics as V4: centroids are frozen at the
+    start of each pass, pairs are visited in (i, j) order, absorbed j drop out.
+
+    Candidate pairs come from a centroid KDTree. Centroids are only recomputed
+    for clusters that merged, and each cluster keeps its hull vertices and exact
+    diameter, updated on merge, so a merge check only compares the two hulls.
+    """
+    clusters = [list(c) for c in clusters]
+    centers = [cluster_center_xy(c, X) for c in clusters]
+    hulls = [_hull_indices(c, X) for c in clusters]
+    diams = [_hull_diameter(X[h]) if len(c) > 1 else 0.0 for c, h in zip(clusters, hulls)]
     changed = True
-    while changed:
+    while changed and len(clusters) > 1:
         changed = False
-        centers_xy2 = [cluster_center_xy(c, X) for c in kept_clusters]
+        centers_arr = np.array(centers)
+        # Slightly inflated radius; the exact V4 test below decides.
+        pairs = KDTree(centers_arr).query_pairs(
+            r=fusion_radius * (1.0 + 1e-9) + 1e-9, output_type="ndarray"
+        )
+        if stats is not None:
+            stats.count("fusion_passes")
+            stats.count("kdtree_queries")
+            stats.count("fusion_candidate_pairs", len(pairs))
+        if len(pairs) == 0:
+            break
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
         to_remove: Set[int] = set()
-        for i in range(len(kept_clusters)):
-            if i in to_remove:
+        dirty: Set[int] = set()
+        for i, j in pairs.tolist():
+            if i in to_remove or j in to_remove:
                 continue
-            for j in range(i + 1, len(kept_clusters)):
-                if j in to_remove:
-                    continue
-                if np.linalg.norm(centers_xy2[i] - centers_xy2[j]) <= fusion_radius:
-                    merged = sorted(set(kept_clusters[i] + kept_clusters[j]))
-                    if len(merged) <= max_ok and cluster_diameter(merged, X) <= diameter_max_m:
-                        kept_clusters[i] = merged
-                        to_remove.add(j)
-                        changed = True
+            if np.linalg.norm(centers_arr[i] - centers_arr[j]) > fusion_radius:
+                continue
+            if len(clusters[i]) + len(clusters[j]) > max_ok:
+                continue
+            merged = sorted(set(clusters[i] + clusters[j]))
+            if len(merged) > max_ok:
+                continue
+            merged_hull = None
+            if len(hulls[i]) * len(hulls[j]) <= HULL_BRUTE_MAX * HULL_BRUTE_MAX:
+                diam = max(diams[i], diams[j], _max_cross_distance(X[hulls[i]], X[hulls[j]]))
+            else:
+                merged_hull = _hull_indices(np.concatenate([hulls[i], hulls[j]]).tolist(), X)
+                diam = _hull_diameter(X[merged_hull])
+            if diam <= diameter_max_m:
+                clusters[i] = merged
+                if merged_hull is None:
+                    merged_hull = _hull_indices(np.concatenate([hulls[i], hulls[j]]).tolist(), X)
+                hulls[i] = merged_hull
+                diams[i] = diam
+                to_remove.add(j)
+                dirty.add(i)
+                changed = True
+        for i in dirty:
+            centers[i] = cluster_center_xy(clusters[i], X)
         if to_remove:
-            kept_clusters = [c for k, c in enumerate(kept_clusters) if k not in to_remove]
-
-    all_indices = set(range(N))
-    all_assigned_to_shuttle = set(idx for mems in kept_clusters for idx in mems)
-    carpool_indices = all_indices - all_assigned_to_shuttle
-
-    office_xy = np.array([0.0, 0.0])
-    final_clusters_indices: List[List[int]] = []
-    for mems in kept_clusters:
-        cxy = cluster_center_xy(mems, X)
-        if np.linalg.norm(cxy - office_xy) < exclude_radius_m:
-            carpool_indices.update(mems)
+            if stats is not None:
+                stats.count("clusters_merged", len(to_remove))
+            keep = [k for k in range(len(clusters)) if k not in to_remove]
+            clusters = [clusters[k] for k in keep]
+            centers = [centers[k] for k in keep]
+            hulls = [hulls[k] for k in keep]
+            diams = [diams[k] for k in keep]
+    return clusters
+
+
+def reabsorb_pair_radius(
+    X: np.ndarray,
+    tree: KDTree,
+    members_list: List[List[int]],
+    cap: int,
+    pair_radius: float,
+    stats: Optional[Block4Stats] = None,
+) -> None:
+    """
+    In-place reabsorption: each unassigned point (ascending index) joins the first
+    cluster with room that has a member within pair_radius. Members reabsorbed
+    earlier count for later points, as in V4.
+    One batched radius query; cluster membership is tracked per point.
+    """
+    N = len(X)
+    cluster_of = np.full(N, -1, dtype=np.int64)
+    for k, mems in enumerate(members_list):
+        cluster_of[mems] = k
+    cap_left = np.array([cap - len(m) for m in members_list], dtype=np.int64)
+    pending = np.where(cluster_of < 0)[0]
+    if len(pending) == 0 or not members_list:
+        return
+    nbrs_per_point = tree.query_ball_point(X[pending], r=pair_radius)
+    if stats is not None:
+        stats.count("kdtree_queries", len(pending))
+    for i, nbrs in zip(pending.tolist(), nbrs_per_point):
+        ks = cluster_of[nbrs]
+        ks = ks[ks >= 0]
+        if ks.size == 0:
+            continue
+        ks = ks[cap_left[ks] > 0]
+        if ks.size == 0:
+            continue
+        k = int(ks.min())
+        members_list[k].append(i)
+        cap_left[k] -= 1
+        cluster_of[i] = k
+        if stats is not None:
+            stats.count("reabsorbed")
+
+
+def _stops_within_radius(
+    x: np.ndarray,
+    centroids: np.ndarray,
+    cand: np.ndarray,
+    radius: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Candidate stops within radius of x, sorted by (distance, stop index)."""
+    d = np.linalg.norm(x - centroids[cand], axis=1)
+    ok = d <= radius
+    cand, d = cand[ok], d[ok]
+    order = np.lexsort((cand, d))
+    return cand[order], d[order]
+
+
+def assign_residual_by_stop_radius(
+    X: np.ndarray,
+    clusters: List[List[int]],
+    residual: Set[int],
+    cap: int,
+    radius: float,
+    method: str = "greedy",
+    k_nearest: int = 8,
+    stats: Optional[Block4Stats] = None,
+) -> Set[int]:
+    """
+    Second pass: residual employees join a stop whose centroid (frozen before the
+    pass) is within radius and that still has room (< cap). Appends in place and
+    returns the indices assigned.
+
+    method="greedy": ascending employee index, nearest stop with room
+    (ties -> smaller stop index). One batched k-nearest query on a centroid
+    KDTree; the ball query is only used when all k nearest are full.
+    method="min_cost": capacity-constrained assignment that maximises the number
+    assigned, then minimises total distance (sparse min-cost flow, see
+    _min_cost_flow_assign).
+    """
+    if not clusters or not residual:
+        return set()
+    centroids = np.array([cluster_center_xy(mems, X) for mems in clusters])
+    ctree = KDTree(centroids)
+    res = np.array(sorted(residual), dtype=np.int64)
+    # Slightly inflated bound; the exact V4 test (norm <= radius) decides.
+    r_query = radius * (1.0 + 1e-9) + 1e-9
+    if method not in ("greedy", "min_cost"):
+        raise ValueError(f"unknown residual_assignment method: {method}")
+    if stats is not None:
+        stats.count("kdtree_queries", len(res))
+    if method == "min_cost":
+        return _assign_residual_min_cost(X, clusters, res, centroids, ctree, cap, radius, r_query)
+
+    kq = min(k_nearest, len(clusters))
+    dd, kk = ctree.query(X[res], k=kq, distance_upper_bound=r_query)
+    dd = dd.reshape(len(res), kq)
+    kk = kk.reshape(len(res), kq)
+    sizes = np.array([len(m) for m in clusters], dtype=np.int64)
+    assigned: Set[int] = set()
+    for row, i in enumerate(res.tolist()):
+        found = np.isfinite(dd[row])
+        if not found.any():
+            continue
+        cand, _ = _stops_within_radius(X[i], centroids, kk[row][found], radius)
+        room = cand[sizes[cand] < cap]
+        if room.size == 0 and found.all() and kq < len(clusters):
+            if stats is not None:
+                stats.count("kdtree_queries")
+            cand = np.asarray(ctree.query_ball_point(X[i], r=r_query), dtype=np.int64)
+            cand, _ = _stops_within_radius(X[i], centroids, cand, radius)
+            room = cand[sizes[cand] < cap]
+        if room.size == 0:
             continue
-        final_clusters_indices.append(mems)
+        k = int(room[0])
+        clusters[k].append(i)
+        sizes[k] += 1
+        assigned.add(i)
+    return assigned
+
+
+def _assign_residual_min_cost(
+    X: np.ndarray,
+    clusters: List[List[int]],
+    res: np.ndarray,
+    centroids: np.ndarray,
+    ctree: KDTree,
+    cap: int,
+    radius: float,
+    r_query: float,
+) -> Set[int]:
+    """
+    Min-cost variant of assign_residual_by_stop_radius (see there): min-cost
+    max-flow on the sparse residual -> stop graph (edges only within radius,
+    stop capacity = room left), solved per connected component.
+    """
+    cand_per_res = ctree.query_ball_point(X[res], r=r_query)
+    rows: List[int] = []
+    cands: List[np.ndarray] = []
+    dists: List[np.ndarray] = []
+    for row, cand in enumerate(cand_per_res):
+        cand, d = _stops_within_radius(
+            X[res[row]], centroids, np.asarray(cand, dtype=np.int64), radius
+        )
+        ok = np.array([len(clusters[k]) < cap for k in cand.tolist()], dtype=bool)
+        if ok.any():
+            rows.append(row)
+            cands.append(cand[ok])
+            dists.append(d[ok])
+    if not rows:
+        return set()
+    R, K = len(rows), len(clusters)
+    lengths = np.array([len(c) for c in cands], dtype=np.int64)
+    edge_r = np.repeat(np.arange(R), lengths)
+    edge_k = np.concatenate(cands)
+    bip = csr_matrix(
+        (np.ones(len(edge_r)), (edge_r, R + edge_k)), shape=(R + K, R + K)
+    )
+    _, label = connected_components(bip, directed=False)
+    room = np.array([cap - len(m) for m in clusters], dtype=np.int64)
+    stop_of = np.full(R, -1, dtype=np.int64)
+    by_label: Dict[int, List[int]] = {}
+    for r in range(R):
+        by_label.setdefault(int(label[r]), []).append(r)
+    for comp in by_label.values():
+        _min_cost_flow_assign(comp, cands, dists, room, stop_of)
+    assigned: Set[int] = set()
+    for r in range(R):
+        if stop_of[r] >= 0:
+            i = int(res[rows[r]])
+            clusters[int(stop_of[r])].append(i)
+            assigned.add(i)
+    return assigned
+
+
+def _min_cost_flow_assign(
+    comp: List[int],
+    cands: List[np.ndarray],
+    dists: List[np.ndarray],
+    room: np.ndarray,
+    stop_of: np.ndarray,
+) -> None:
+    """
+    Residuals comp (rows of cands / dists) to stops with room: as many as
+    possible, then least total distance. Fills stop_of in place.
+
+    Every residual first takes its nearest stop; if no stop overflows that is
+    optimal. Otherwise successive shortest paths, searched from the stops with
+    room left (few, while residuals are many): each round a Dijkstra with
+    potentials (reduced costs >= 0) finds the cheapest chain "stop with room
+    <- residual moved from stop <- ... <- free residual" and applies it.
+    Each round is O(E log V) on the component's radius edges.
+    """
+    load: Dict[int, int] = {}
+    for r in comp:
+        k = int(cands[r][0])
+        load[k] = load.get(k, 0) + 1
+    if all(n <= room[k] for k, n in load.items()):
+        for r in comp:
+            stop_of[r] = int(cands[r][0])
+        return
+
+    # Stop k -> residuals within radius, nearest first (edge cost = distance).
+    # Rows are nodes r, stops nodes ~k (negative): one potential / distance map.
+    rows_of: Dict[int, List[Tuple[float, int]]] = {}
+    for r in comp:
+        for k, d in zip(cands[r].tolist(), dists[r].tolist()):
+            rows_of.setdefault(k, []).append((d, r))
+    for lst in rows_of.values():
+        lst.sort()
+    nearest_free = dict.fromkeys(rows_of, 0)  # first possibly free row in rows_of[k]
+    placed_of: Dict[int, List[Tuple[float, int]]] = {k: [] for k in rows_of}  # assigned rows
+    used = dict.fromkeys(rows_of, 0)
+    # Free rows are only settled as the end of a chain, so their potential stays 0
+    # and a stop only needs an edge to its nearest free row.
+    pot: Dict[int, float] = {}
+    at = dict.fromkeys(comp, -1)  # stop of each row (-1 = free)
+    n_free = len(comp)
+    while n_free:
+        heap = [(-pot.get(~k, 0.0), ~k) for k in sorted(rows_of) if used[k] < room[k]]
+        dist = {v: d for d, v in heap}
+        prev: Dict[int, int] = {}
+        heapq.heapify(heap)
+        done: Set[int] = set()
+        end = None
+        while heap:
+            d, v = heapq.heappop(heap)
+            if v in done:
+                continue
+            done.add(v)
+            if v >= 0 and at[v] < 0:
+                end = v
+                break
+            pv = pot.get(v, 0.0)
+            if v < 0:
+                k, lst = ~v, rows_of[~v]
+                i = nearest_free[k]
+                while i < len(lst) and at[lst[i][1]] >= 0:
+                    i += 1
+                nearest_free[k] = i
+                out = [(r, w) for w, r in placed_of[k] if at[r] != k]
+                if i < len(lst):
+                    out.append((lst[i][1], lst[i][0]))
+            else:
+                # Residual v leaves its stop: undo that assignment edge.
+                k = at[v]
+                out = [(~k, -float(dists[v][cands[v] == k][0]))]
+            for u, w in out:
+                nd = d + w + pv - pot.get(u, 0.0)
+                if nd < dist.get(u, math.inf) - 1e-12:
+                    dist[u] = nd
+                    prev[u] = v
+                    heapq.heappush(heap, (nd, u))
+        if end is None:
+            break  # no stop with room reaches a free residual: flow is maximal
+        # pot += min(dist, d_end) for every node; the common d_end cancels in
+        # reduced costs, so only settled nodes (dist < d_end) need an update.
+        d_end = dist[end]
+        for v in done:
+            pot[v] = pot.get(v, 0.0) + dist[v] - d_end
+        for k, d in zip(cands[end].tolist(), dists[end].tolist()):
+            placed_of[k].append((d, end))
+        n_free -= 1
+        # Apply the chain: each residual on it moves to the stop before it.
+        r = end
+        while True:
+            k = ~prev[r]
+            old = at[r]
+            at[r] = k
+            used[k] += 1
+            if old >= 0:
+                used[old] -= 1
+            if ~k not in prev:  # k had room left: chain starts here
+                break
+            r = prev[~k]
+    for r, k in at.items():
+        stop_of[r] = k
+
+
+def spatial_components(X: np.ndarray, link: float) -> np.ndarray:
+    """
+    Connected components of the graph "distance <= link", labelled in order of
+    first appearance in X. Grid of side link/sqrt(2) (a cell is always connected)
+    plus union-find over neighbouring cells, so memory stays O(N).
+    """
+    N = len(X)
+    if N == 0:
+        return np.zeros(0, dtype=np.int64)
+    side = link / math.sqrt(2.0)
+    keys, cell_of = np.unique(
+        np.floor(X / side).astype(np.int64), axis=0, return_inverse=True
+    )
+    cell_of = cell_of.ravel()
+    order = np.argsort(cell_of, kind="stable")
+    bounds = np.searchsorted(cell_of[order], np.arange(len(keys) + 1))
+    key_to_cell = {k: c for c, k in enumerate(map(tuple, keys.tolist()))}
+    parent = list(range(len(keys)))
+
+    def find(c: int) -> int:
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    def points(c: int) -> np.ndarray:
+        return X[order[bounds[c] : bounds[c + 1]]]
+
+    Xs = X[order]
+    lo = np.minimum.reduceat(Xs, bounds[:-1], axis=0)
+    hi = np.maximum.reduceat(Xs, bounds[:-1], axis=0)
+    trees: dict = {}
+    reach = int(math.ceil(link / side))
+    offsets = [
+        (dx, dy)
+        for dx in range(-reach, reach + 1)
+        for dy in range(-reach, reach + 1)
+        if (dx, dy) > (0, 0)
+    ]
+    # Slightly inflated: merging too much is safe, splitting too much is not.
+    r_link = link * (1.0 + 1e-9) + 1e-9
+    for c, (cx, cy) in enumerate(keys.tolist()):
+        for dx, dy in offsets:
+            c2 = key_to_cell.get((cx + dx, cy + dy))
+            if c2 is None:
+                continue
+            r1, r2 = find(c), find(c2)
+            if r1 == r2:
+                continue
+            gap = np.maximum(0.0, np.maximum(lo[c2] - hi[c], lo[c] - hi[c2]))
+            if float(gap @ gap) > r_link * r_link:
+                continue
+            a, b = points(c), points(c2)
+            if len(a) * len(b) <= 4096:
+                dx = a[:, 0][:, None] - b[:, 0][None, :]
+                dy = a[:, 1][:, None] - b[:, 1][None, :]
+                linked = bool((dx * dx + dy * dy <= r_link * r_link).any())
+            else:
+                if c2 not in trees:
+                    trees[c2] = KDTree(b)
+                d, _ = trees[c2].query(a, k=1, distance_upper_bound=r_link)
+                linked = bool(np.isfinite(d).any())
+            if linked:
+                parent[max(r1, r2)] = min(r1, r2)
+    roots = np.array([find(c) for c in cell_of], dtype=np.int64)
+    _, first = np.unique(roots, return_index=True)
+    label_of_root = {int(roots[i]): lab for lab, i in enumerate(sorted(first))}
+    return np.array([label_of_root[int(r)] for r in roots], dtype=np.int64)
+
+
+@dataclass(frozen=True)
+class _Block4Params:
+    """Block 4 parameters resolved from constraints (getattr with V4 defaults)."""
+    radius: float
+    cap: int
+    min_shuttle: int
+    min_sep: float
+    fallback_min: int
+    pair_radius: float
+    min_ok: int
+    min_ok_far_m: Optional[float]
+    min_ok_far: int
+    max_ok: int
+    fusion_radius: float
+    diameter_max_m: float
+    exclude_radius_m: float
+    split_method: str
+    candidate_sites: str
+    site_grid_m: float
+    snap_tolerance_m: Optional[float]
+    assign_by_stop_radius: bool
+    residual_assignment: str
+
+    @property
+    def link(self) -> float:
+        """Distance beyond which two points never interact before fusion."""
+        # Snapped homes share a weighted point, so they must share a component too.
+        return max(self.radius, self.pair_radius, self.min_sep, self.snap_tolerance_m or 0.0)
+
+
+def _resolve_params(
+    constraints: StructuralConstraints,
+    defaults: ShuttleStopParams = ShuttleStopParams(),
+) -> _Block4Params:
+    """Block 4 params from constraints; what constraints does not set comes from defaults."""
+    return _Block4Params(
+        radius=constraints.assign_radius_m,
+        cap=constraints.max_cluster_size,
+        min_shuttle=getattr(constraints, "min_shuttle", 6),
+        min_sep=getattr(constraints, "min_stop_sep_m", defaults.min_stop_sep_m),
+        fallback_min=getattr(constraints, "fallback_min", defaults.fallback_min),
+        pair_radius=getattr(constraints, "pair_radius_m", None) or defaults.pair_radius_m,
+        min_ok=getattr(constraints, "min_ok", defaults.min_ok),
+        min_ok_far_m=getattr(constraints, "min_ok_far_m", None),
+        min_ok_far=getattr(constraints, "min_ok_far", 6),
+        max_ok=getattr(constraints, "max_ok", defaults.max_ok),
+        fusion_radius=getattr(constraints, "fusion_radius", defaults.fusion_radius),
+        diameter_max_m=getattr(constraints, "diameter_max_m", defaults.diameter_max_m),
+        exclude_radius_m=getattr(constraints, "exclude_radius_m", defaults.exclude_radius_m),
+        split_method=getattr(constraints, "split_method", None) or defaults.split_method,
+        candidate_sites=getattr(constraints, "candidate_sites", None) or defaults.candidate_sites,
+        site_grid_m=getattr(constraints, "site_grid_m", None) or defaults.site_grid_m,
+        snap_tolerance_m=(
+            defaults.snap_tolerance_m
+            if getattr(constraints, "snap_tolerance_m", None) is None
+            else constraints.snap_tolerance_m
+        ),
+        assign_by_stop_radius=getattr(constraints, "assign_by_stop_radius_after", None) is True,
+        residual_assignment=getattr(constraints, "residual_assignment", None) or "greedy",
+    )
+
+
+def _effective_min_ok(members: List[int], X: np.ndarray, p: _Block4Params) -> int:
+    """min_ok adaptativo: si min_ok_far_m está definido, clusters lejos de oficina usan min_ok_far (ej. 6)."""
+    if p.min_ok_far_m is None or p.min_ok_far_m <= 0 or p.min_ok_far >= p.min_ok:
+        return p.min_ok
+    cxy = cluster_center_xy(members, X)
+    dist_to_office = float(np.linalg.norm(cxy))
+    return p.min_ok_far if dist_to_office > p.min_ok_far_m else p.min_ok
+
+
+# ((-gain, center index), kept sub-clusters) for one opened stop.
+_StopEntry = Tuple[Tuple[int, int], List[List[int]]]
+
+
+def _open_component(
+    X: np.ndarray,
+    p: _Block4Params,
+    min_threshold: int,
+    stats: Optional[Block4Stats] = None,
+    S: Optional[np.ndarray] = None,
+) -> Tuple[int, List[_StopEntry]]:
+    """
+    Greedy opening, reabsorption and min_ok / max_ok filtering on one
+    spatial component (X in office meters, local indices). S: candidate sites
+    of the component (entries are then keyed by site); None = every employee,
+    or the weighted coreset of the employees when p.snap_tolerance_m is set.
+    Returns (stops opened, entries in opening order).
+    """
+    all_unassigned = np.ones(len(X), dtype=bool)
+    core = None
+    if S is None and p.snap_tolerance_m is not None:
+        with _stage(stats, "coreset"):
+            core = snap_points(X, p.snap_tolerance_m)
+        if stats is not None:
+            stats.count("coreset_points", len(core.points))
+            stats.snap_error_m = max(stats.snap_error_m, core.max_error_m)
+    with _stage(stats, "graph"):
+        tree = KDTree(X)
+        if core is None:
+            graph = radius_neighbour_graph(X, tree, p.radius, queries=S)
+        else:
+            graph = radius_neighbour_graph(core.points, KDTree(core.points), p.radius)
+    with _stage(stats, "greedy"):
+        if core is not None:
+            centers_idx, members_list, _ = greedy_open_weighted(
+                core, graph, min_threshold, p.cap, p.min_sep, stats
+            )
+        elif S is None:
+            centers_idx, members_list, _ = greedy_open_stops(
+                X, graph, min_threshold, p.cap, all_unassigned, p.min_sep, stats
+            )
+        else:
+            centers_idx, members_list, _ = greedy_open_sites(
+                S, graph, min_threshold, p.cap, all_unassigned, p.min_sep, stats
+            )
+    if stats is not None:
+        stats.count("kdtree_queries", graph.shape[0])
+        stats.count("stops_opened", len(centers_idx))
+    return len(centers_idx), _stop_entries(X, tree, centers_idx, members_list, p, stats=stats)
+
+
+def _stop_entries(
+    X: np.ndarray,
+    tree: KDTree,
+    centers_idx: List[int],
+    members_list: List[List[int]],
+    p: _Block4Params,
+    split_cache: Optional[Dict[Tuple[Tuple[int, ...], int, str], List[List[int]]]] = None,
+    stats: Optional[Block4Stats] = None,
+) -> List[_StopEntry]:
+    """
+    Reabsorption (members_list is modified in place) and min_ok / max_ok
+    filtering. split_cache, if given, memoizes split_oversized across calls.
+    """
+    keys = [(-len(m), c) for m, c in zip(members_list, centers_idx)]
+    with _stage(stats, "reabsorb"):
+        reabsorb_pair_radius(X, tree, members_list, p.cap, p.pair_radius, stats)
+
+    out: List[_StopEntry] = []
+    with _stage(stats, "split"):
+        for key, mems in zip(keys, members_list):
+            n = len(mems)
+            if n < _effective_min_ok(mems, X, p):
+                if stats is not None:
+                    stats.count("clusters_below_min_ok")
+                continue
+            if n > p.max_ok:
+                k = int(math.ceil(n / p.max_ok))
+                if split_cache is None:
+                    parts = split_oversized(mems, X, k, method=p.split_method)
+                else:
+                    key_split = (tuple(mems), k, p.split_method)
+                    if key_split not in split_cache:
+                        split_cache[key_split] = split_oversized(mems, X, k, method=p.split_method)
+                    parts = split_cache[key_split]
+                subs = [
+                    sub
+                    for sub in parts
+                    if sub and len(sub) >= _effective_min_ok(sub, X, p)
+                ]
+                if stats is not None:
+                    stats.count("clusters_split")
+                    stats.count("split_parts_kept", len(subs))
+                    stats.count("split_parts_dropped", len(parts) - len(subs))
+                out.append((key, subs))
+            else:
+                out.append((key, [mems]))
+    return out
+
+
+# (employee indices, their coordinates, site indices or None, site coordinates or None)
+_ComponentTask = Tuple[np.ndarray, np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]
+
+
+def _open_components(
+    tasks: List[_ComponentTask],
+    p: _Block4Params,
+    min_threshold: int,
+    collect_stats: bool = False,
+) -> Tuple[List[Tuple[int, List[_StopEntry]]], Optional[Block4Stats]]:
+    """
+    Worker entry point: runs _open_component on a batch and maps back to global
+    indices. Returns (results, stats of the batch or None).
+    """
+    stats = Block4Stats() if collect_stats else None
+    results = []
+    for idx, X, site_idx, S in tasks:
+        n_open, local = _open_component(X, p, min_threshold, stats, S)
+        centre = idx if site_idx is None else site_idx
+        results.append(
+            (
+                n_open,
+                [
+                    ((neg_gain, int(centre[c])), [idx[sub].tolist() for sub in subs])
+                    for (neg_gain, c), subs in local
+                ],
+            )
+        )
+    return results, stats
+
+
+def _split_components(labels: np.ndarray, idx: Optional[np.ndarray] = None) -> List[np.ndarray]:
+    """Index arrays per component label (ascending indices inside each)."""
+    if idx is None:
+        idx = np.arange(len(labels))
+    if len(labels) == 0:
+        return []
+    order = np.argsort(labels, kind="stable")
+    bounds = np.searchsorted(labels[order], np.arange(int(labels.max()) + 2))
+    return [idx[order[bounds[c] : bounds[c + 1]]] for c in range(len(bounds) - 1)]
+
+
+def _run_components(
+    X: np.ndarray,
+    components: List[np.ndarray],
+    p: _Block4Params,
+    min_threshold: int,
+    workers: int,
+    stats: Optional[Block4Stats] = None,
+    S: Optional[np.ndarray] = None,
+    site_components: Optional[List[np.ndarray]] = None,
+) -> List[Tuple[int, List[_StopEntry]]]:
+    """
+    Per-component stages (serial or process pool). One (stops opened, entries)
+    per component, in the order of components. Components smaller than
+    min_threshold (or without candidate sites) cannot open a stop and are not solved.
+    """
+    results: List[Tuple[int, List[_StopEntry]]] = [(0, []) for _ in components]
+    todo = [
+        k
+        for k, idx in enumerate(components)
+        if len(idx) >= min_threshold and (site_components is None or len(site_components[k]))
+    ]
+    tasks: List[_ComponentTask] = [
+        (components[k], X[components[k]], None, None)
+        if site_components is None
+        else (components[k], X[components[k]], site_components[k], S[site_components[k]])
+        for k in todo
+    ]
+    if stats is not None:
+        stats.count("greedy_runs")
+        stats.count("components_solved", len(tasks))
+    if workers > 1 and len(tasks) > 1:
+        batches: List[List[int]] = [[] for _ in range(workers)]
+        # Largest first, round-robin: keeps batches balanced by point count.
+        for t, pos in enumerate(sorted(range(len(tasks)), key=lambda i: -len(tasks[i][0]))):
+            batches[t % workers].append(pos)
+        batches = [b for b in batches if b]
+        with ProcessPoolExecutor(max_workers=len(batches)) as pool:
+            outs = pool.map(
+                _open_components,
+                [[tasks[i] for i in b] for b in batches],
+                [p] * len(batches),
+                [min_threshold] * len(batches),
+                [stats is not None] * len(batches),
+            )
+            for b, (out, batch_stats) in zip(batches, outs):
+                for i, r in zip(b, out):
+                    results[todo[i]] = r
+                if stats is not None:
+                    stats.merge(batch_stats)
+    else:
+        out, batch_stats = _open_components(tasks, p, min_threshold, stats is not None)
+        for i, r in enumerate(out):
+            results[todo[i]] = r
+        if stats is not None:
+            stats.merge(batch_stats)
+    return results
+
+
+def _candidate_sites(
+    X: np.ndarray,
+    p: _Block4Params,
+    stop_sites: Optional[List[Tuple[float, float]]],
+    office_lat: float,
+    office_lng: float,
+) -> Optional[np.ndarray]:
+    """Candidate stop centres in office meters; None when every employee is a candidate."""
+    if stop_sites is not None:
+        return _points_to_meters(list(stop_sites), office_lat, office_lng).reshape(-1, 2)
+    if p.candidate_sites == "employees":
+        return None
+    if p.candidate_sites == "grid":
+        return X[grid_candidate_sites(X, p.site_grid_m)]
+    raise ValueError(f"unknown candidate_sites: {p.candidate_sites}")
+
+
+def _components(
+    X: np.ndarray, S: Optional[np.ndarray], link: float
+) -> Tuple[List[np.ndarray], Optional[List[np.ndarray]]]:
+    """
+    Spatial components of the employees (and, with candidate sites, of employees
+    and sites together, since a site links the employees it covers).
+    Returns (employee indices per component, site indices per component or None).
+    """
+    if S is None:
+        return _split_components(spatial_components(X, link)), None
+    N = len(X)
+    both = _split_components(spatial_components(np.vstack([X, S]), link))
+    cuts = [int(np.searchsorted(c, N)) for c in both]
+    return [c[:k] for c, k in zip(both, cuts)], [c[k:] - N for c, k in zip(both, cuts)]
+
+
+def _merge_entries(results: List[Tuple[int, List[_StopEntry]]]) -> List[List[int]]:
+    """
+    Kept clusters in global opening order. Greedy picks inside a component come
+    out sorted by (-gain, center index), so merging by that key restores the
+    order a single global greedy run would produce.
+    """
+    merged = heapq.merge(*(entries for _, entries in results), key=lambda e: e[0])
+    return [sub for _, subs in merged for sub in subs]
+
+
+def _finish_clusters(
+    X: np.ndarray,
+    kept_clusters: List[List[int]],
+    p: _Block4Params,
+    stats: Optional[Block4Stats] = None,
+) -> Tuple[List[List[int]], Set[int]]:
+    """Global stages on the merged clusters: fusion, office exclusion, residual pass."""
+    N = len(X)
+    with _stage(stats, "fusion"):
+        kept_clusters = fuse_clusters(
+            kept_clusters, X, p.fusion_radius, p.max_ok, p.diameter_max_m, stats
+        )
+
+    with _stage(stats, "exclusion"):
+        all_indices = set(range(N))
+        all_assigned_to_shuttle = set(idx for mems in kept_clusters for idx in mems)
+        carpool_indices = all_indices - all_assigned_to_shuttle
+
+        office_xy = np.array([0.0, 0.0])
+        final_clusters_indices: List[List[int]] = []
+        for mems in kept_clusters:
+            cxy = cluster_center_xy(mems, X)
+            if np.linalg.norm(cxy - office_xy) < p.exclude_radius_m:
+                carpool_indices.update(mems)
+                continue
+            final_clusters_indices.append(mems)
+    if stats is not None:
+        stats.count("clusters_excluded", len(kept_clusters) - len(final_clusters_indices))
 
     # Segundo paso opcional: asignar residual por distancia al centro de parada (evita "rojo más cerca que gris")
-    assign_by_stop_radius = getattr(constraints, "assign_by_stop_radius_after", None) is True
-    if assign_by_stop_radius and final_clusters_indices and carpool_indices:
-        centroids_final = [cluster_center_xy(mems, X) for mems in final_clusters_indices]
-        for i in sorted(carpool_indices):
-            best_k: int | None = None
-            best_d: float = float("inf")
-            for k, mems in enumerate(final_clusters_indices):
-                if len(mems) >= cap:
-                    continue
-                d = float(np.linalg.norm(X[i] - centroids_final[k]))
-                if d <= radius and d < best_d:
-                    best_d = d
-                    best_k = k
-            if best_k is not None:
-                final_clusters_indices[best_k].append(i)
-                carpool_indices = carpool_indices - {i}
-
-    final_clusters: List[List[str]] = [
-        [ids[i] for i in cluster] for cluster in final_clusters_indices
+    if p.assign_by_stop_radius and final_clusters_indices and carpool_indices:
+        with _stage(stats, "residual"):
+            assigned = assign_residual_by_stop_radius(
+                X, final_clusters_indices, carpool_indices, p.cap, p.radius,
+                method=p.residual_assignment, stats=stats,
+            )
+        carpool_indices -= assigned
+        if stats is not None:
+            stats.count("residual_assigned", len(assigned))
+    return final_clusters_indices, carpool_indices
+
+
+@dataclass
+class Block4State:
+    """
+    Result of a Block 4 run plus what update_shuttle_stop_opening needs to patch
+    it: the census (in index order), its coordinates and, per spatial component,
+    the pre-fusion result keyed by employee_id. With candidate sites other than
+    employees, components stays empty and updates re-run Block 4 in full.
+    """
+    employees: List[Employee]
+    office_lat: float
+    office_lng: float
+    constraints: StructuralConstraints
+    final_clusters: List[List[str]]
+    carpool_set: Set[str]
+    X: np.ndarray
+    min_threshold: int
+    # Per component: (employee_ids, stops opened, [((-gain, center_id), [[ids]])]).
+    components: List[Tuple[List[str], int, List[Tuple[Tuple[int, str], List[List[str]]]]]]
+    component_of: Dict[str, int]
+    params: ShuttleStopParams = ShuttleStopParams()
+    stats: Optional[Block4Stats] = None
+    stop_sites: Optional[List[Tuple[float, float]]] = None
+
+
+def _solve_state(
+    employees: List[Employee],
+    X: np.ndarray,
+    office_lat: float,
+    office_lng: float,
+    constraints: StructuralConstraints,
+    p: _Block4Params,
+    components: List[np.ndarray],
+    results: List[Tuple[int, List[_StopEntry]]],
+    min_threshold: int,
+    params: ShuttleStopParams,
+    stats: Optional[Block4Stats] = None,
+    stop_sites: Optional[List[Tuple[float, float]]] = None,
+) -> Block4State:
+    """Global stages on per-component results and packing into a Block4State."""
+    ids = [e.employee_id for e in employees]
+    final_clusters_indices, carpool_indices = _finish_clusters(
+        X, _merge_entries(results), p, stats
+    )
+    incremental = stop_sites is None and p.candidate_sites == "employees"
+    packed = [
+        (
+            [ids[i] for i in idx],
+            n_open,
+            [
+                ((neg_gain, ids[c]), [[ids[i] for i in sub] for sub in subs])
+                for (neg_gain, c), subs in entries
+            ],
+        )
+        for idx, (n_open, entries) in zip(components, results)
+        if incremental
     ]
-    carpool_set: Set[str] = {ids[i] for i in carpool_indices}
-    return final_clusters, carpool_set
+    return Block4State(
+        employees=list(employees),
+        office_lat=office_lat,
+        office_lng=office_lng,
+        constraints=constraints,
+        final_clusters=[[ids[i] for i in cluster] for cluster in final_clusters_indices],
+        carpool_set={ids[i] for i in carpool_indices},
+        X=X,
+        min_threshold=min_threshold,
+        components=packed,
+        component_of={eid: k for k, (cids, _, _) in enumerate(packed) for eid in cids},
+        params=params,
+        stats=stats,
+        stop_sites=None if stop_sites is None else list(stop_sites),
+    )
+
+
+def _log_stats(stats: Block4Stats, state: Block4State, run: str) -> None:
+    """One structured log record per instrumented run (extra["block4"])."""
+    stats.count("employees", len(state.employees))
+    stats.count("final_clusters", len(state.final_clusters))
+    stats.count("carpool", len(state.carpool_set))
+    logger.info("block4 %s: %.3fs", run, stats.stage_s.get("total", 0.0),
+                extra={"block4": {"run": run, **stats.as_dict()}})
+
+
+def run_shuttle_stop_opening_state(
+    employees: List[Employee],
+    office_lat: float,
+    office_lng: float,
+    constraints: StructuralConstraints,
+    workers: int = 1,
+    params: ShuttleStopParams = ShuttleStopParams(),
+    stats: Optional[Block4Stats] = None,
+    stop_sites: Optional[List[Tuple[float, float]]] = None,
+) -> Block4State:
+    """run_shuttle_stop_opening keeping the Block4State (for update_shuttle_stop_opening)."""
+    with _stage(stats, "total"):
+        p = _resolve_params(constraints, params)
+        with _stage(stats, "projection"):
+            X = _lat_lon_to_meters(employees, office_lat, office_lng)
+            S = _candidate_sites(X, p, stop_sites, office_lat, office_lng)
+        with _stage(stats, "components"):
+            components, site_components = _components(X, S, p.link)
+        if stats is not None:
+            stats.count("components", len(components))
+            if S is not None:
+                stats.count("candidate_sites", len(S))
+        min_threshold = p.min_shuttle
+        with _stage(stats, "solve_components"):
+            results = _run_components(
+                X, components, p, min_threshold, workers, stats, S, site_components
+            )
+            if sum(n for n, _ in results) == 0:
+                min_threshold = p.fallback_min
+                results = _run_components(
+                    X, components, p, min_threshold, workers, stats, S, site_components
+                )
+        state = _solve_state(
+            employees, X, office_lat, office_lng, constraints, p, components, results,
+            min_threshold, params, stats, stop_sites,
+        )
+    if stats is not None:
+        _log_stats(stats, state, "full")
+    return state
+
+
+def update_shuttle_stop_opening(
+    state: Block4State,
+    delta: CensusDelta,
+    workers: int = 1,
+    stats: Optional[Block4Stats] = None,
+) -> Block4State:
+    """
+    Incremental Block 4: applies delta (moved / added / removed employees) to a
+    previous state and re-solves only the components touched by the change:
+    those holding a removed or moved employee, and those within interaction
+    distance of a new home. Fusion, office exclusion and the residual pass run
+    again on the patched clusters. The result equals run_shuttle_stop_opening
+    on the new census: previous order minus removed, moved updated in place,
+    added appended.
+    """
+    start = time.perf_counter()
+    p = _resolve_params(state.constraints, state.params)
+    old_index = {e.employee_id: i for i, e in enumerate(state.employees)}
+    removed = {eid for eid in delta.removed if eid in old_index}
+    updated = {e.employee_id: e for e in list(delta.moved) + list(delta.added)}
+    employees = [
+        updated.get(e.employee_id, e)
+        for e in state.employees
+        if e.employee_id not in removed
+    ] + [e for eid, e in updated.items() if eid not in old_index and eid not in removed]
+    relocated = {
+        eid
+        for eid, e in updated.items()
+        if eid not in removed
+        and (
+            eid not in old_index
+            or (e.home_lat, e.home_lng)
+            != (state.employees[old_index[eid]].home_lat, state.employees[old_index[eid]].home_lng)
+        )
+    }
+    if not removed and not relocated:
+        return replace(state, employees=employees, stats=stats)
+    if (
+        state.min_threshold != p.min_shuttle
+        or state.stop_sites is not None
+        or p.candidate_sites != "employees"
+    ):
+        return run_shuttle_stop_opening_state(
+            employees, state.office_lat, state.office_lng, state.constraints, workers,
+            state.params, stats, state.stop_sites,
+        )
+
+    with _stage(stats, "projection"):
+        X = _lat_lon_to_meters(employees, state.office_lat, state.office_lng)
+    index = {e.employee_id: i for i, e in enumerate(employees)}
+    affected = {state.component_of[eid] for eid in removed | relocated if eid in old_index}
+    if relocated and len(state.X):
+        new_pts = X[[index[eid] for eid in relocated]]
+        r_link = p.link * (1.0 + 1e-9) + 1e-9
+        for nbrs in KDTree(state.X).query_ball_point(new_pts, r=r_link):
+            affected.update(state.component_of[state.employees[j].employee_id] for j in nbrs)
+
+    region = sorted(
+        {index[eid] for k in affected for eid in state.components[k][0] if eid in index}
+        | {index[eid] for eid in relocated}
+    )
+    region_idx = np.array(region, dtype=np.int64)
+    with _stage(stats, "components"):
+        new_components = _split_components(spatial_components(X[region_idx], p.link), region_idx)
+    if stats is not None:
+        stats.count("components_reused", len(state.components) - len(affected))
+        stats.count("components", len(new_components))
+    with _stage(stats, "solve_components"):
+        new_results = _run_components(X, new_components, p, p.min_shuttle, workers, stats)
+
+    components: List[np.ndarray] = []
+    results: List[Tuple[int, List[_StopEntry]]] = []
+    for k, (cids, n_open, entries) in enumerate(state.components):
+        if k in affected:
+            continue
+        components.append(np.array([index[eid] for eid in cids], dtype=np.int64))
+        results.append(
+            (
+                n_open,
+                [
+                    ((neg_gain, index[c]), [[index[eid] for eid in sub] for sub in subs])
+                    for (neg_gain, c), subs in entries
+                ],
+            )
+        )
+    components.extend(new_components)
+    results.extend(new_results)
+    if sum(n for n, _ in results) == 0:
+        return run_shuttle_stop_opening_state(
+            employees, state.office_lat, state.office_lng, state.constraints, workers,
+            state.params, stats, state.stop_sites,
+        )
+    new_state = _solve_state(
+        employees, X, state.office_lat, state.office_lng, state.constraints,
+        p, components, results, p.min_shuttle, state.params, stats,
+    )
+    if stats is not None:
+        stats.stage_s["total"] = stats.stage_s.get("total", 0.0) + time.perf_counter() - start
+        _log_stats(stats, new_state, "incremental")
+    return new_state
+
+
+def run_shuttle_stop_opening(
+    employees: List[Employee],
+    office_lat: float,
+    office_lng: float,
+    constraints: StructuralConstraints,
+    workers: int = 1,
+    params: ShuttleStopParams = ShuttleStopParams(),
+    stats: Optional[Block4Stats] = None,
+    stop_sites: Optional[List[Tuple[float, float]]] = None,
+) -> Tuple[List[List[str]], Set[str]]:
+    """
+    Full Block 4 pipeline. Returns final_clusters (list of list of employee_id),
+    carpool_set (set of employee_id for residual).
+    Block 4 params come from constraints via getattr; params supplies the rest
+    (defaults = V4).
+
+    Greedy opening, reabsorption and splitting only relate points closer
+    than max(assign_radius_m, pair_radius_m, min_stop_sep_m), so they run per
+    spatial component; workers > 1 solves components in a process pool.
+    Fusion, office exclusion and the residual pass run on the merged result.
+    Output is identical for any workers value.
+
+    stats: optional Block4Stats filled with per-stage times and counters (and
+    logged once at INFO with extra["block4"]); None = no instrumentation.
+
+    Candidate stop centres: every employee (default), one per grid cell
+    (params.candidate_sites="grid", cell params.site_grid_m), or stop_sites,
+    a caller list of allowed (lat, lng) stop locations. Greedy coverage is then
+    evaluated from those sites only.
+
+    params.snap_tolerance_m (or constraints.snap_tolerance_m): greedy opening runs
+    on a weighted coreset of the homes (see snap_points); later stages use the
+    real coordinates. The snap error is reported in stats.snap_error_m.
+    """
+    if not employees:
+        return [], set()
+    state = run_shuttle_stop_opening_state(
+        employees, office_lat, office_lng, constraints, workers, params, stats, stop_sites
+    )
+    return state.final_clusters, state.carpool_set
@@ -0,0 +1,229 @@
+"""
+V6 Block 4 parameter sweep. Pure logic only.
+Evaluates a grid of StructuralConstraints / ShuttleStopParams values on one census,
+sharing the projection, KDTree, radius graphs and greedy openings across combinations.
+"""
+
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields, replace
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import KDTree
+
+from backend.v6.core.coreset import Coreset, snap_points
+from backend.v6.core.network_design_engine.shuttle_stop_engine import (
+    ShuttleStopParams,
+    _Block4Params,
+    _candidate_sites,
+    _finish_clusters,
+    _lat_lon_to_meters,
+    _merge_entries,
+    _resolve_params,
+    _stop_entries,
+    greedy_open_sites,
+    greedy_open_stops,
+    greedy_open_weighted,
+    radius_neighbour_graph,
+)
+from backend.v6.domain.constraints import StructuralConstraints
+from backend.v6.domain.models import Employee
+
+_CONSTRAINT_FIELDS = {f.name for f in fields(StructuralConstraints)}
+_PARAM_FIELDS = {f.name for f in fields(ShuttleStopParams)}
+
+# Process-pool workers read the shared precomputation from here (set by _init_worker).
+_SHARED: Dict[str, Any] = {}
+
+
+def expand_grid(
+    base_constraints: StructuralConstraints,
+    grid: Mapping[str, Sequence[Any]],
+    base_params: ShuttleStopParams = ShuttleStopParams(),
+) -> List[Tuple[Dict[str, Any], StructuralConstraints, ShuttleStopParams]]:
+    """
+    Cartesian product of grid (parameter name -> values), last name varying fastest.
+    Names that are StructuralConstraints fields are set there, the rest on
+    ShuttleStopParams. Returns (setting, constraints, params) per combination.
+    """
+    unknown = [name for name in grid if name not in _CONSTRAINT_FIELDS | _PARAM_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown Block 4 parameters: {unknown}")
+    names = list(grid)
+    combos = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        setting = dict(zip(names, values))
+        constraints = replace(
+            base_constraints, **{k: v for k, v in setting.items() if k in _CONSTRAINT_FIELDS}
+        )
+        params = replace(
+            base_params, **{k: v for k, v in setting.items() if k not in _CONSTRAINT_FIELDS}
+        )
+        combos.append((setting, constraints, params))
+    return combos
+
+
+def _kpis(
+    n_employees: int,
+    clusters: List[List[int]],
+    carpool: set,
+    n_open: int,
+    fallback: bool,
+    elapsed_s: float,
+) -> Dict[str, Any]:
+    """Coverage, cluster-count and stop-size KPIs of one Block 4 result."""
+    sizes = np.array([len(c) for c in clusters], dtype=np.int64)
+    n_shuttle = int(sizes.sum())
+    return {
+        "n_employees": n_employees,
+        "n_stops_opened": n_open,
+        "n_clusters": len(clusters),
+        "n_shuttle": n_shuttle,
+        "n_carpool": len(carpool),
+        "coverage_pct": 100.0 * n_shuttle / n_employees if n_employees else 0.0,
+        "stop_size_min": int(sizes.min()) if len(sizes) else 0,
+        "stop_size_median": float(np.median(sizes)) if len(sizes) else 0.0,
+        "stop_size_mean": float(sizes.mean()) if len(sizes) else 0.0,
+        "stop_size_max": int(sizes.max()) if len(sizes) else 0,
+        "fallback": fallback,
+        "elapsed_s": elapsed_s,
+    }
+
+
+def _sweep_group(
+    X: np.ndarray,
+    tree: KDTree,
+    graph: csr_matrix,
+    S: Optional[np.ndarray],
+    core: Optional[Coreset],
+    group: List[Tuple[int, _Block4Params]],
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Combinations sharing (radius, cap, min_sep, min_shuttle, fallback_min and
+    candidate sites S or coreset core): greedy opening runs once and splits of identical clusters
+    are reused; the later stages run once per combination. Same result as
+    run_shuttle_stop_opening for each combination.
+    """
+    p0 = group[0][1]
+    start = time.perf_counter()
+    all_unassigned = np.ones(len(X), dtype=bool)
+
+    def greedy(min_threshold: int) -> Tuple[List[int], List[List[int]], np.ndarray]:
+        if core is not None:
+            return greedy_open_weighted(core, graph, min_threshold, p0.cap, p0.min_sep)
+        if S is None:
+            return greedy_open_stops(X, graph, min_threshold, p0.cap, all_unassigned, p0.min_sep)
+        return greedy_open_sites(S, graph, min_threshold, p0.cap, all_unassigned, p0.min_sep)
+
+    centers_idx, members_list, _ = greedy(p0.min_shuttle)
+    fallback = not centers_idx
+    if fallback:
+        centers_idx, members_list, _ = greedy(p0.fallback_min)
+    greedy_s = (time.perf_counter() - start) / len(group)
+
+    rows = []
+    split_cache: Dict[Tuple[Tuple[int, ...], int, str], List[List[int]]] = {}
+    for k, p in group:
+        start = time.perf_counter()
+        entries = _stop_entries(
+            X, tree, centers_idx, [list(m) for m in members_list], p, split_cache
+        )
+        clusters, carpool = _finish_clusters(X, _merge_entries([(len(centers_idx), entries)]), p)
+        elapsed_s = greedy_s + time.perf_counter() - start
+        rows.append((k, _kpis(len(X), clusters, carpool, len(centers_idx), fallback, elapsed_s)))
+    return rows
+
+
+# Radius graphs are shared per (radius, candidate_sites, site_grid_m, snap_tolerance_m).
+_GraphKey = Tuple[float, str, float, Optional[float]]
+_Graph = Tuple[csr_matrix, Optional[np.ndarray], Optional[Coreset]]
+
+
+def _graph_key(p: _Block4Params) -> _GraphKey:
+    return (p.radius, p.candidate_sites, p.site_grid_m, p.snap_tolerance_m)
+
+
+def _init_worker(X: np.ndarray, tree: KDTree, graphs: Dict[_GraphKey, _Graph]) -> None:
+    _SHARED.update(X=X, tree=tree, graphs=graphs)
+
+
+def _sweep_task(group: List[Tuple[int, _Block4Params]]) -> List[Tuple[int, Dict[str, Any]]]:
+    graph, S, core = _SHARED["graphs"][_graph_key(group[0][1])]
+    return _sweep_group(_SHARED["X"], _SHARED["tree"], graph, S, core, group)
+
+
+def sweep_shuttle_stop_opening(
+    employees: List[Employee],
+    office_lat: float,
+    office_lng: float,
+    base_constraints: StructuralConstraints,
+    grid: Mapping[str, Sequence[Any]],
+    base_params: ShuttleStopParams = ShuttleStopParams(),
+    workers: Optional[int] = None,
+    stop_sites: Optional[List[Tuple[float, float]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Block 4 over every combination of grid (see expand_grid). Returns one row per
+    combination, in expand_grid order: the grid values followed by the _kpis columns.
+
+    Projection and KDTree are built once, the radius graph once per assign_radius_m
+    (and candidate-site setting), greedy opening once per (radius, cap, min_sep,
+    min_shuttle, fallback_min, candidate sites). stop_sites as in run_shuttle_stop_opening.
+    Combination groups are spread over a process pool (workers=None: one per CPU,
+    at most one per group; workers=1: serial). Each row matches what
+    run_shuttle_stop_opening returns for that combination.
+    """
+    combos = expand_grid(base_constraints, grid, base_params)
+    X = _lat_lon_to_meters(employees, office_lat, office_lng)
+    tree = KDTree(X)
+
+    groups: Dict[Tuple[Any, ...], List[Tuple[int, _Block4Params]]] = {}
+    for k, (_, constraints, params) in enumerate(combos):
+        p = _resolve_params(constraints, params)
+        key = (*_graph_key(p), p.cap, p.min_sep, p.min_shuttle, p.fallback_min)
+        groups.setdefault(key, []).append((k, p))
+    graphs: Dict[_GraphKey, _Graph] = {}
+    for group in groups.values():
+        p = group[0][1]
+        if _graph_key(p) in graphs:
+            continue
+        S = _candidate_sites(X, p, stop_sites, office_lat, office_lng)
+        if S is None and p.snap_tolerance_m is not None:
+            core = snap_points(X, p.snap_tolerance_m)
+            graph = radius_neighbour_graph(core.points, KDTree(core.points), p.radius)
+            graphs[_graph_key(p)] = (graph, None, core)
+        else:
+            graphs[_graph_key(p)] = (radius_neighbour_graph(X, tree, p.radius, queries=S), S, None)
+
+    tasks = list(groups.values())
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+    if workers > 1 and len(tasks) < workers:
+        # Fewer groups than workers: split them (each chunk repeats its greedy opening).
+        per_group = workers // len(tasks)
+        tasks = [
+            group[c::n_chunks]
+            for group in tasks
+            for n_chunks in [min(per_group, len(group))]
+            for c in range(n_chunks)
+        ]
+
+    results: List[Tuple[int, Dict[str, Any]]] = []
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(X, tree, graphs)
+        ) as pool:
+            for out in pool.map(_sweep_task, tasks):
+                results.extend(out)
+    else:
+        for group in tasks:
+            graph, S, core = graphs[_graph_key(group[0][1])]
+            results.extend(_sweep_group(X, tree, graph, S, core, group))
+
+    rows: List[Dict[str, Any]] = [{} for _ in combos]
+    for k, kpis in results:
+        rows[k] = {**combos[k][0], **kpis}
+    return rows
@@ -6,19 +6,26 @@ Pure logic only:
 - Receives an already-built duration matrix D and high-level constraints.
 
 Implements:
-- Route class (seq, load, dur, feasible_merge_with, merge_with)
-- Clarke–Wright open VRP (open routes that end at office)
+- Route class (seq, load, dur, feasible_merge_with, merge_with): reference route model
+- _RouteStore: array-backed routes (O(1) merge checks) used by run_shuttle_vrp
+- Clarke–Wright open VRP (open routes that end at office), savings kept in a lazy max-heap
 - Small-route absorption (MIN_EMP_SHUTTLE)
 - Backfill constrained by detour cap and BACKFILL_MAX_MIN_PER_PAX
+- Optional local-search post-optimizer (shuttle_vrp_local_search)
+- Time-dependent input: a DurationProfile is read at the shuttle departure time
 
 The goal is to mirror V4 Block 5 semantics while keeping a clean, testable engine.
 """
 
+import heapq
+import math
 from dataclasses import dataclass
-from typing import List, Sequence, Set, Tuple
+from typing import Callable, List, Optional, Sequence, Set, Tuple, Union
 
 import numpy as np
 
+from backend.v6.core.duration_profile import DurationProfile, resolve_duration_matrix
+from backend.v6.core.network_design_engine.shuttle_vrp_local_search import improve_routes
 from backend.v6.domain.constraints import StructuralConstraints
 
 
@@ -118,6 +125,289 @@ class Route:
         self.dur = int(new_dur)
 
 
+# Detour ratios this close (relative) to detour_cap are re-checked with the exact
+# V4 mean (np.mean over the stop list) instead of the running sum.
+_DETOUR_EXACT_RTOL = 1e-9
+
+
+class _RouteStore:
+    """
+    Array-backed open routes, indexed by route id (the stop the route started
+    from). Parallel arrays hold head, tail, load, duration (whole seconds, as
+    Route.dur), stop count and the running sum of T_to_office; stop sequences
+    are linked lists in succ (-1 = last stop). Merge and insertion checks are
+    O(1) arithmetic per pair and vectorize over many pairs at once.
+    """
+
+    def __init__(
+        self,
+        stops_demands: Sequence[int],
+        D: np.ndarray,
+        office_index: int,
+        T_to_office: np.ndarray,
+        bus_capacity: int,
+        max_stops: int,
+        max_route_duration: int,
+        detour_cap: float,
+    ) -> None:
+        S = len(stops_demands)
+        self.D = D
+        self.office_index = office_index
+        self.T = T_to_office
+        self.bus_capacity = bus_capacity
+        self.max_stops = max_stops
+        self.max_route_duration = max_route_duration
+        self.detour_cap = detour_cap
+        self.demand = np.asarray(stops_demands, dtype=np.int64)
+        self.D_off = D[np.arange(S), office_index]
+        # One single-stop route per stop.
+        self.alive = np.ones(S, dtype=bool)
+        self.head = np.arange(S)
+        self.tail = np.arange(S)
+        self.load = self.demand.copy()
+        self.dur = np.trunc(self.D_off)
+        self.n_stops = np.ones(S, dtype=np.int64)
+        self.sum_T = T_to_office.astype(float)
+        self.succ = np.full(S, -1, dtype=np.int64)
+
+    def ids(self) -> np.ndarray:
+        """Live route ids, ascending (the V4 route-list order)."""
+        return np.flatnonzero(self.alive)
+
+    def seq(self, r: int) -> List[int]:
+        out = [int(self.head[r])]
+        while self.succ[out[-1]] >= 0:
+            out.append(int(self.succ[out[-1]]))
+        return out
+
+    def _detour_ok(
+        self,
+        new_dur: np.ndarray,
+        sum_T: np.ndarray,
+        n: np.ndarray,
+        stops_of: Callable[[int], List[int]],
+    ) -> np.ndarray:
+        """new_dur / mean(T_to_office) <= detour_cap (a zero mean passes)."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = sum_T / n
+            ratio = new_dur / mean
+            ok = ~((mean > 0.0) & (ratio > self.detour_cap))
+            near = np.abs(ratio - self.detour_cap) <= _DETOUR_EXACT_RTOL * self.detour_cap
+        for k in np.flatnonzero(near & (mean > 0.0)):
+            exact = float(np.mean(self.T[stops_of(int(k))]))
+            ok[k] = not (exact > 0.0 and new_dur[k] / exact > self.detour_cap)
+        return ok
+
+    def merge_eval(
+        self, src: np.ndarray, dst: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Route.feasible_merge_with for the pairs src[k] -> dst[k] (arrays or a
+        scalar broadcast against an array). Returns (feasible, saving, new_dur, new_load).
+        """
+        src, dst = np.broadcast_arrays(np.asarray(src), np.asarray(dst))
+        t, h = self.tail[src], self.head[dst]
+        new_load = self.load[src] + self.load[dst]
+        n = self.n_stops[src] + self.n_stops[dst]
+        new_dur = self.dur[src] - self.D_off[t] + self.D[t, h] + self.dur[dst]
+        ok = (
+            (self.T[t] > self.T[h])
+            & (new_load <= self.bus_capacity)
+            & (n <= self.max_stops)
+            & (new_dur <= self.max_route_duration)
+        )
+        cand = np.flatnonzero(ok)
+        ok[cand] = self._detour_ok(
+            new_dur[cand],
+            self.sum_T[src[cand]] + self.sum_T[dst[cand]],
+            n[cand],
+            lambda k: self.seq(int(src[cand[k]])) + self.seq(int(dst[cand[k]])),
+        )
+        saving = self.D_off[t] - self.D[t, h]
+        return ok, saving, new_dur, new_load
+
+    def append_eval(
+        self, r: np.ndarray, i: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Backfill check of stop i[k] as new tail of route r[k] (broadcast like
+        merge_eval): capacity, stops, direction, duration and detour cap (a zero
+        mean fails). Returns (feasible, new_dur, current duration).
+        """
+        r, i = np.broadcast_arrays(np.asarray(r), np.asarray(i))
+        shape = r.shape
+        r, i = r.ravel(), i.ravel()
+        t = self.tail[r]
+        t_curr = self.dur[r]
+        new_dur = t_curr - self.D_off[t] + self.D[t, i] + self.D_off[i]
+        n = self.n_stops[r] + 1
+        sum_T = self.sum_T[r] + self.T[i]
+        ok = (
+            (self.load[r] + self.demand[i] <= self.bus_capacity)
+            & (n <= self.max_stops)
+            & (self.T[i] < self.T[t])
+            & (new_dur <= self.max_route_duration)
+            & (sum_T > 0.0)
+        )
+        cand = np.flatnonzero(ok)
+        ok[cand] = self._detour_ok(
+            new_dur[cand],
+            sum_T[cand],
+            n[cand],
+            lambda k: self.seq(int(r[cand[k]])) + [int(i[cand[k]])],
+        )
+        return ok.reshape(shape), new_dur.reshape(shape), t_curr.reshape(shape)
+
+    def merge(self, a: int, b: int, new_dur: float) -> None:
+        """Route.merge_with: appends route b to route a."""
+        self.succ[self.tail[a]] = self.head[b]
+        self.tail[a] = self.tail[b]
+        self.load[a] += self.load[b]
+        self.dur[a] = math.trunc(new_dur)
+        self.n_stops[a] += self.n_stops[b]
+        self.sum_T[a] += self.sum_T[b]
+        self.alive[b] = False
+
+    def append(self, r: int, i: int, new_dur: float) -> None:
+        """Backfill: stop i becomes the new tail of route r."""
+        self.succ[self.tail[r]] = i
+        self.tail[r] = i
+        self.load[r] += self.demand[i]
+        self.dur[r] = math.trunc(new_dur)
+        self.n_stops[r] += 1
+        self.sum_T[r] += self.T[i]
+
+
+def _backfill(store: _RouteStore, pending: List[int], max_min_per_pax: float) -> None:
+    """
+    V4 backfill: passes over pending (in order) until none is inserted; each
+    stop goes to the route with the smallest (added minutes per pax, -demand,
+    -new load) among feasible ones within max_min_per_pax (ties -> first route).
+
+    The pending x route costs are evaluated as one matrix; an insertion only
+    changes its route, so only that column is re-evaluated.
+    """
+    routes = store.ids()
+    if not pending or not len(routes):
+        return
+    pend = np.array(pending, dtype=np.int64)
+
+    def costs(r: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(added minutes per pax or inf, new duration) for pending x routes r."""
+        ok, new_dur, t_curr = store.append_eval(r[None, :], pend[:, None])
+        delta = ((new_dur - t_curr) / 60.0) / np.maximum(1, store.demand[pend])[:, None]
+        return np.where(ok & (delta <= max_min_per_pax), delta, np.inf), new_dur
+
+    cost, new_dur = costs(routes)
+    left = np.ones(len(pend), dtype=bool)
+    changed = True
+    while changed and left.any():
+        changed = False
+        for p in np.flatnonzero(left):
+            row = cost[p]
+            best = row.min()
+            if not np.isfinite(best):
+                continue
+            cand = np.flatnonzero(row == best)
+            # Same delta and demand: the largest new load wins, then the first route.
+            c = int(cand[np.argmax(store.load[routes[cand]])])
+            store.append(int(routes[c]), int(pend[p]), float(new_dur[p, c]))
+            left[p] = False
+            cost[p] = np.inf
+            col_cost, col_dur = costs(routes[c : c + 1])
+            cost[left, c] = col_cost[left, 0]
+            new_dur[:, c] = col_dur[:, 0]
+            changed = True
+
+
+# (-saving, -new_load, a, b, version of a, version of b, new_dur): heap order is
+# the V4 merge order (largest (saving, new_load), ties -> smaller a, then smaller b).
+_SavingEntry = Tuple[float, int, int, int, int, int, float]
+
+
+@dataclass(frozen=True)
+class _CWVariant:
+    """
+    Clarke–Wright variant for multi-start. Default = V4: saving
+    D[tail, office] - D[tail, head], no noise, small routes absorbed by the
+    heaviest feasible route. Otherwise: saving D[tail, office] - lam * D[tail, head]
+    scaled by a uniform (1 +- noise) factor, and absorption candidates in
+    random order when shuffle_absorption; randomness from seed.
+    """
+    lam: float = 1.0
+    noise: float = 0.0
+    shuffle_absorption: bool = False
+    seed: Tuple[int, ...] = ()
+
+
+_V4_VARIANT = _CWVariant()
+
+
+def _saving_entries(
+    store: _RouteStore,
+    src: np.ndarray,
+    dst: np.ndarray,
+    version: List[int],
+    variant: _CWVariant = _V4_VARIANT,
+    rng: Optional[np.random.Generator] = None,
+) -> List[_SavingEntry]:
+    """Heap entries for the feasible merges among src[k] -> dst[k]."""
+    ok, saving, new_dur, new_load = store.merge_eval(src, dst)
+    src, dst = np.broadcast_arrays(np.asarray(src), np.asarray(dst))
+    k = np.flatnonzero(ok)
+    if variant != _V4_VARIANT:
+        t, h = store.tail[src[k]], store.head[dst[k]]
+        saving = np.zeros_like(saving)
+        saving[k] = store.D_off[t] - variant.lam * store.D[t, h]
+        if variant.noise > 0.0:
+            saving[k] *= 1.0 + variant.noise * rng.uniform(-1.0, 1.0, len(k))
+    return [
+        (-s, -l, a, b, version[a], version[b], d)
+        for s, l, a, b, d in zip(
+            saving[k].tolist(), new_load[k].tolist(), src[k].tolist(),
+            dst[k].tolist(), new_dur[k].tolist(),
+        )
+    ]
+
+
+def _clarke_wright_open(
+    store: _RouteStore,
+    variant: _CWVariant = _V4_VARIANT,
+    rng: Optional[np.random.Generator] = None,
+) -> None:
+    """
+    Open Clarke–Wright from single-stop routes: merges the feasible pair a -> b
+    with the largest (saving, new_load) until none is left; ties -> smaller a,
+    then smaller b (route ids follow the V4 list order). Same merge sequence as
+    the V4 all-pairs scan.
+
+    Savings are computed once (vectorized over all S x S pairs) and kept in a
+    max-heap with lazy invalidation: a merge changes route a and removes route
+    b, so only pairs involving a are re-evaluated; entries built on an older
+    version of either route are skipped. A non-default variant only changes
+    the saving used as heap key (feasibility is unchanged).
+    """
+    S = len(store.alive)
+    version = [0] * S
+    if S < 2:
+        return
+    a_all, b_all = np.nonzero(~np.eye(S, dtype=bool))
+    heap = _saving_entries(store, a_all, b_all, version, variant, rng)
+    heapq.heapify(heap)
+    while heap:
+        _, _, a, b, va, vb, new_dur = heapq.heappop(heap)
+        if not (store.alive[a] and store.alive[b]) or version[a] != va or version[b] != vb:
+            continue
+        store.merge(a, b, new_dur)
+        version[a] += 1
+        others = store.ids()
+        others = others[others != a]
+        for entry in _saving_entries(store, a, others, version, variant, rng) + _saving_entries(
+            store, others, a, version, variant, rng
+        ):
+            heapq.heappush(heap, entry)
+
+
 @dataclass(frozen=True)
 class VRPResult:
     """Output of the shuttle VRP engine."""
@@ -127,14 +417,80 @@ class VRPResult:
     unserved_stop_indices: List[int]
 
 
+def _vrp_result(routes_idx: List[List[int]], S: int) -> VRPResult:
+    served_idx = {i for seq in routes_idx for i in seq}
+    stops_out_idx = [i for i in range(S) if i not in served_idx]
+    return VRPResult(
+        routes_idx=routes_idx,
+        served_stop_indices=served_idx,
+        unserved_stop_indices=stops_out_idx,
+    )
+
+
+def _solve_routes(
+    stops_demands: Sequence[int],
+    D: np.ndarray,
+    office_index: int,
+    bus_capacity: int,
+    detour_cap: float,
+    backfill_max_min_per_pax: float,
+    min_emp_shuttle: int,
+    max_stops: int,
+    max_route_duration: int,
+    variant: _CWVariant = _V4_VARIANT,
+) -> List[List[int]]:
+    """Clarke–Wright, small-route absorption and backfill. Returns the stop sequences."""
+    S = len(stops_demands)
+    # Time from each stop to office
+    T_to_office = np.array([D[i, office_index] for i in range(S)], dtype=float)
+
+    # ---------- Inicialización ----------
+    store = _RouteStore(
+        stops_demands, D, office_index, T_to_office,
+        bus_capacity, max_stops, max_route_duration, detour_cap,
+    )
+
+    # ---------- Clarke–Wright "open" ----------
+    rng = np.random.default_rng(list(variant.seed)) if variant != _V4_VARIANT else None
+    _clarke_wright_open(store, variant, rng)
+
+    # ---------- Limpieza: rutas pequeñas ----------
+    small_ids = [int(r) for r in store.ids() if store.load[r] < min_emp_shuttle]
+    for r_small in reversed(small_ids):
+        others = store.ids()
+        others = others[others != r_small]
+        if variant.shuffle_absorption:
+            order = rng.permutation(others)
+        else:
+            order = others[np.argsort(-store.load[others], kind="stable")]
+        ok, _, new_dur, _ = store.merge_eval(order, r_small)
+        if ok.any():
+            k = int(np.argmax(ok))
+            store.merge(int(order[k]), r_small, float(new_dur[k]))
+        # else: keep small route as-is (same as V4: no explicit deletion here)
+
+    # ---------- Backfill barato ----------
+    served_idx: Set[int] = {i for r in store.ids() for i in store.seq(r)}
+    pending = sorted(
+        [i for i in range(S) if i not in served_idx],
+        key=lambda i: (-stops_demands[i], -T_to_office[i]),
+    )
+    _backfill(store, pending, backfill_max_min_per_pax)
+
+    return [store.seq(int(r)) for r in store.ids()]
+
+
 def run_shuttle_vrp(
     stops_demands: Sequence[int],
-    duration_matrix: np.ndarray,
+    duration_matrix: Union[np.ndarray, DurationProfile],
     office_index: int,
     constraints: StructuralConstraints,
     min_emp_shuttle: int = MIN_EMP_SHUTTLE_DEFAULT,
     max_stops: int = MAX_STOPS_DEFAULT,
     max_route_duration: int = MAX_ROUTE_DURATION_DEFAULT,
+    local_search_s: float = 0.0,
+    local_search_seed: int = 0,
+    departure_min: Optional[float] = None,
 ) -> VRPResult:
     """
     Run V4-style Clarke–Wright open VRP + small-route absorption + backfill.
@@ -144,6 +500,7 @@ def run_shuttle_vrp(
         duration_matrix: ndarray (N,N) with travel times in seconds.
             V4 convention: N = S+1 and office_index = S, but we only require that
             duration_matrix has office_index as the row/col used for office travel times.
+            A DurationProfile (K departure-time slices) is read at departure_min.
         office_index: index of the office node in duration_matrix.
         constraints: StructuralConstraints with at least:
             - bus_capacity
@@ -152,6 +509,11 @@ def run_shuttle_vrp(
         min_emp_shuttle: MIN_EMP_SHUTTLE (minimum employees for a viable route).
         max_stops: MAX_STOPS (max number of stops per route).
         max_route_duration: MAX_ROUTE_DURATION (seconds).
+        local_search_s: time budget (seconds) for improve_routes after backfill
+            (fewer routes, then less total duration); 0 = off (V4).
+        local_search_seed: seed of the local-search kicks.
+        departure_min: shuttle departure time (minutes since midnight); required
+            when duration_matrix is a DurationProfile, ignored otherwise.
 
     Returns:
         VRPResult with:
@@ -162,7 +524,7 @@ def run_shuttle_vrp(
     if not stops_demands:
         return VRPResult(routes_idx=[], served_stop_indices=set(), unserved_stop_indices=[])
 
-    D = np.asarray(duration_matrix, dtype=float)
+    D = resolve_duration_matrix(duration_matrix, departure_min)
     S = len(stops_demands)
     if D.shape[0] != D.shape[1]:
         raise ValueError("duration_matrix must be square")
@@ -173,131 +535,13 @@ def run_shuttle_vrp(
     detour_cap = constraints.detour_cap
     backfill_max_min_per_pax = constraints.backfill_max_delta_min
 
-    # Time from each stop to office
-    T_to_office = np.array([D[i, office_index] for i in range(S)], dtype=float)
-
-    # ---------- Inicialización ----------
-    routes: List[Route] = [
-        Route(
-            seq=[i],
-            stops_demands=stops_demands,
-            D=D,
-            office_index=office_index,
-            T_to_office=T_to_office,
-            bus_capacity=bus_capacity,
-            max_stops=max_stops,
-            max_route_duration=max_route_duration,
-            detour_cap=detour_cap,
-        )
-        for i in range(S)
-    ]
-
-    # ---------- Clarke–Wright "open" ----------
-    merged = True
-    while merged and len(routes) > 1:
-        merged = False
-        best: Tuple[Tuple[float, int], int, int, float, int] | None = None
-        for a in range(len(routes)):
-            for b in range(len(routes)):
-                if a == b:
-                    continue
-                feas = routes[a].feasible_merge_with(routes[b])
-                if feas is None:
-                    continue
-                saving, new_dur, new_load, _ = feas
-                key = (saving, new_load)
-                if best is None or key > best[0]:
-                    best = (key, a, b, new_dur, new_load)
-        if best is not None:
-            _, a_idx, b_idx, new_dur, new_load = best
-            routes[a_idx].merge_with(routes[b_idx], new_dur, new_load)
-            routes.pop(b_idx)
-            merged = True
-
-    # ---------- Limpieza: rutas pequeñas ----------
-    small_idxs = [r for r in range(len(routes)) if routes[r].load < min_emp_shuttle]
-    for r_idx in sorted(small_idxs, reverse=True):
-        r_small = routes[r_idx]
-        absorbed = False
-        order = sorted(
-            [i for i in range(len(routes)) if i != r_idx],
-            key=lambda k: routes[k].load,
-            reverse=True,
-        )
-        for k in order:
-            feas = routes[k].feasible_merge_with(r_small)
-            if feas:
-                _, new_dur, new_load, _ = feas
-                routes[k].merge_with(r_small, new_dur, new_load)
-                routes.pop(r_idx)
-                absorbed = True
-                break
-        if not absorbed:
-            # keep small route as-is (same as V4: no explicit deletion here)
-            pass
-
-    # ---------- Backfill barato ----------
-    served_idx: Set[int] = {i for r in routes for i in r.seq}
-    pending = sorted(
-        [i for i in range(S) if i not in served_idx],
-        key=lambda i: (-stops_demands[i], -T_to_office[i]),
+    routes_idx = _solve_routes(
+        stops_demands, D, office_index, bus_capacity, detour_cap,
+        backfill_max_min_per_pax, min_emp_shuttle, max_stops, max_route_duration,
     )
-
-    changed = True
-    while changed and pending:
-        changed = False
-        for i in list(pending):
-            best: Tuple[Tuple[float, int, int], int, float] | None = None
-            for r_id, r in enumerate(routes):
-                # Capacity and max stops
-                if r.load + stops_demands[i] > bus_capacity:
-                    continue
-                if len(r.seq) + 1 > max_stops:
-                    continue
-                # Direction towards office
-                if T_to_office[i] >= T_to_office[r.tail()]:
-                    continue
-                t_curr = float(r.dur)
-                t_new = (
-                    r.dur
-                    - float(D[r.tail(), office_index])
-                    + float(D[r.tail(), i])
-                    + float(D[i, office_index])
-                )
-                if t_new > max_route_duration:
-                    continue
-                base_mean = float(np.mean([T_to_office[k] for k in (r.seq + [i])]))
-                if base_mean <= 0.0:
-                    continue
-                detour_ratio = t_new / base_mean
-                if detour_ratio > detour_cap:
-                    continue
-
-                delta_min_per_pax = ((t_new - t_curr) / 60.0) / max(1, stops_demands[i])
-                if delta_min_per_pax <= backfill_max_min_per_pax:
-                    key = (
-                        delta_min_per_pax,
-                        -stops_demands[i],
-                        -(r.load + stops_demands[i]),
-                    )
-                    if best is None or key < best[0]:
-                        best = (key, r_id, t_new)
-
-            if best:
-                _, r_id, t_new = best
-                routes[r_id].seq.append(i)
-                routes[r_id].load += stops_demands[i]
-                routes[r_id].dur = int(t_new)
-                pending.remove(i)
-                changed = True
-
-    routes_idx: List[List[int]] = [r.seq for r in routes]
-    served_idx = {i for seq in routes_idx for i in seq}
-    stops_out_idx = [i for i in range(S) if i not in served_idx]
-
-    return VRPResult(
-        routes_idx=routes_idx,
-        served_stop_indices=served_idx,
-        unserved_stop_indices=stops_out_idx,
-    )
-
+    if local_search_s > 0:
+        routes_idx = improve_routes(
+            routes_idx, stops_demands, D, office_index, bus_capacity, max_stops,
+            max_route_duration, detour_cap, local_search_s, seed=local_search_seed,
+        )
+    return _vrp_result(routes_idx, S)
@@ -0,0 +1,268 @@
+"""
+V6 shuttle VRP local search. Pure logic only.
+Post-optimizer for open shuttle routes (stop sequences ending at the office):
+2-opt, or-opt, relocate, swap and cross-exchange moves on granular neighbour
+lists, plus route-elimination kicks while the time budget lasts.
+Objective: fewer routes first, then less total duration.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LS_NEIGHBOURS = 10  # granular neighbour list size (nearest stops by duration)
+LS_MAX_SEGMENT = 3  # longest segment moved by or-opt / relocate
+LS_CROSS_SEGMENT = 2  # longest segment exchanged by cross-exchange
+LS_EPS = 1e-6  # minimum duration gain (seconds) for a move to count
+
+# One candidate move: (route index, new sequence) for each route it changes.
+_Move = List[Tuple[int, List[int]]]
+
+
+@dataclass(frozen=True)
+class _Problem:
+    D: np.ndarray
+    office_index: int
+    demand: np.ndarray
+    T_to_office: np.ndarray
+    bus_capacity: int
+    max_stops: int
+    max_route_duration: float
+    detour_cap: float
+
+    def duration(self, seq: Sequence[int]) -> float:
+        if not seq:
+            return 0.0
+        return float(self.D[seq[:-1], seq[1:]].sum() + self.D[seq[-1], self.office_index])
+
+    def feasible(self, seq: Sequence[int], dur: float) -> bool:
+        """Capacity, max_stops, max_route_duration and detour cap (V4 Block 5 rules)."""
+        if len(seq) > self.max_stops or int(self.demand[seq].sum()) > self.bus_capacity:
+            return False
+        if dur > self.max_route_duration:
+            return False
+        base_mean = float(np.mean(self.T_to_office[seq]))
+        return not (base_mean > 0.0 and dur / base_mean > self.detour_cap)
+
+
+class _Solution:
+    """Routes with their durations and the (route, position) of every stop."""
+
+    def __init__(self, prob: _Problem, routes: List[List[int]]) -> None:
+        self.prob = prob
+        self.routes = [list(r) for r in routes]
+        self.dur = [prob.duration(r) for r in self.routes]
+        self.route_of = {}
+        self.pos_of = {}
+        for k in range(len(self.routes)):
+            self._index(k)
+
+    def _index(self, k: int) -> None:
+        for p, i in enumerate(self.routes[k]):
+            self.route_of[i] = k
+            self.pos_of[i] = p
+
+    def n_routes(self) -> int:
+        return sum(1 for r in self.routes if r)
+
+    def key(self) -> Tuple[int, float]:
+        return self.n_routes(), sum(self.dur)
+
+    def gain(self, move: _Move) -> Optional[Tuple[int, float, List[float]]]:
+        """(routes removed, seconds saved, new durations) or None if infeasible."""
+        removed, saved, durs = 0, 0.0, []
+        for k, seq in move:
+            d = self.prob.duration(seq)
+            if seq and not self.prob.feasible(seq, d):
+                return None
+            removed += bool(self.routes[k]) and not seq
+            saved += self.dur[k] - d
+            durs.append(d)
+        return removed, saved, durs
+
+    def apply(self, move: _Move, durs: List[float]) -> None:
+        for (k, seq), d in zip(move, durs):
+            self.routes[k] = seq
+            self.dur[k] = d
+            self._index(k)
+
+    def copy(self) -> "_Solution":
+        out = _Solution.__new__(_Solution)
+        out.prob = self.prob
+        out.routes = [list(r) for r in self.routes]
+        out.dur = list(self.dur)
+        out.route_of = dict(self.route_of)
+        out.pos_of = dict(self.pos_of)
+        return out
+
+
+def _moves(sol: _Solution, i: int, j: int) -> Iterator[_Move]:
+    """Candidate moves relating stop i to its neighbour j."""
+    a, b = sol.route_of[i], sol.route_of[j]
+    A, B = sol.routes[a], sol.routes[b]
+    p, q = sol.pos_of[i], sol.pos_of[j]
+    if a == b:
+        # 2-opt: reverse the stretch between i and j.
+        lo, hi = min(p, q), max(p, q)
+        yield [(a, A[:lo] + A[lo : hi + 1][::-1] + A[hi + 1 :])]
+        # Or-opt: move a segment starting at i next to j.
+        for L in range(1, LS_MAX_SEGMENT + 1):
+            seg = A[p : p + L]
+            if len(seg) < L or j in seg:
+                break
+            rest = A[:p] + A[p + L :]
+            at = rest.index(j)
+            yield [(a, rest[: at + 1] + seg + rest[at + 1 :])]
+            yield [(a, rest[:at] + seg + rest[at:])]
+        return
+    # Relocate: move a segment starting at i before / after j.
+    for L in range(1, LS_MAX_SEGMENT + 1):
+        seg = A[p : p + L]
+        if len(seg) < L:
+            break
+        rest = A[:p] + A[p + L :]
+        yield [(a, rest), (b, B[: q + 1] + seg + B[q + 1 :])]
+        yield [(a, rest), (b, B[:q] + seg + B[q:])]
+    # Swap and cross-exchange: exchange segments starting at i and j.
+    for La in range(1, LS_CROSS_SEGMENT + 1):
+        for Lb in range(1, LS_CROSS_SEGMENT + 1):
+            if p + La > len(A) or q + Lb > len(B):
+                continue
+            yield [
+                (a, A[:p] + B[q : q + Lb] + A[p + La :]),
+                (b, B[:q] + A[p : p + La] + B[q + Lb :]),
+            ]
+    # 2-opt*: exchange the tails after i and after j.
+    yield [(a, A[: p + 1] + B[q + 1 :]), (b, B[: q + 1] + A[p + 1 :])]
+
+
+def _improves(gain: Tuple[int, float, List[float]]) -> bool:
+    removed, saved, _ = gain
+    return removed > 0 or (removed == 0 and saved > LS_EPS)
+
+
+def _descend(
+    sol: _Solution, neighbours: np.ndarray, stops: np.ndarray, deadline: float
+) -> None:
+    """First-improvement descent over the granular neighbourhood until a local optimum."""
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for r, i in enumerate(stops):
+            i = int(i)
+            for j in neighbours[r]:
+                j = int(j)
+                for move in _moves(sol, i, j):
+                    gain = sol.gain(move)
+                    if gain is not None and _improves(gain):
+                        sol.apply(move, gain[2])
+                        improved = True
+                        break
+                else:
+                    continue
+                break
+            if time.perf_counter() >= deadline:
+                return
+
+
+def _cheapest_insertion(sol: _Solution, i: int, skip: int) -> Optional[Tuple[_Move, List[float]]]:
+    """Cheapest feasible position for stop i in any non-empty route except skip."""
+    best = None
+    for k, seq in enumerate(sol.routes):
+        if k == skip or not seq:
+            continue
+        for at in range(len(seq) + 1):
+            move = [(k, seq[:at] + [i] + seq[at:])]
+            gain = sol.gain(move)
+            if gain is not None and (best is None or gain[1] > best[0]):
+                best = (gain[1], move, gain[2])
+    return None if best is None else (best[1], best[2])
+
+
+def _eliminate_route(sol: _Solution, k: int) -> bool:
+    """Kick: re-insert every stop of route k elsewhere (cheapest position). False if one does not fit."""
+    stops = sorted(sol.routes[k], key=lambda i: -sol.prob.demand[i])
+    sol.apply([(k, [])], [0.0])
+    for i in stops:
+        ins = _cheapest_insertion(sol, i, skip=k)
+        if ins is None:
+            return False
+        sol.apply(*ins)
+    return True
+
+
+def improve_routes(
+    routes_idx: List[List[int]],
+    stops_demands: Sequence[int],
+    duration_matrix: np.ndarray,
+    office_index: int,
+    bus_capacity: int,
+    max_stops: int,
+    max_route_duration: float,
+    detour_cap: float,
+    time_budget_s: float,
+    seed: int = 0,
+    max_kicks: Optional[int] = None,
+) -> List[List[int]]:
+    """
+    Local search on open routes (each ending at office_index). Moves: 2-opt and
+    or-opt inside a route; relocate, swap, cross-exchange and 2-opt* between
+    routes, each restricted to the LS_NEIGHBOURS nearest stops. Only the one or
+    two routes a move changes are re-costed and re-checked (capacity,
+    max_stops, max_route_duration, detour cap).
+
+    After the first local optimum, the rest of time_budget_s (or max_kicks)
+    goes to route-elimination kicks (a small route, picked with seed, is
+    dissolved into the others) each followed by a new descent, until no light
+    route can be dissolved. Returns the best
+    solution found: fewer routes first, then less total duration. Route order
+    is kept; emptied routes are dropped. The same stops stay served.
+    """
+    deadline = time.perf_counter() + time_budget_s
+    stops = np.array(sorted(i for r in routes_idx for i in r), dtype=np.int64)
+    if len(stops) < 2:
+        return [list(r) for r in routes_idx]
+    D = np.asarray(duration_matrix, dtype=float)
+    prob = _Problem(
+        D=D,
+        office_index=office_index,
+        demand=np.asarray(stops_demands, dtype=np.int64),
+        T_to_office=D[:, office_index],
+        bus_capacity=bus_capacity,
+        max_stops=max_stops,
+        max_route_duration=max_route_duration,
+        detour_cap=detour_cap,
+    )
+    sub = D[np.ix_(stops, stops)]
+    closeness = np.minimum(sub, sub.T)
+    np.fill_diagonal(closeness, np.inf)
+    k = min(LS_NEIGHBOURS, len(stops) - 1)
+    near = np.argsort(closeness, axis=1, kind="stable")[:, :k]
+    neighbours = stops[near]
+
+    current = _Solution(prob, routes_idx)
+    _descend(current, neighbours, stops, deadline)
+    best = current.copy()
+    rng = np.random.default_rng(seed)
+    kicks = 0
+    failed: set = set()  # routes of current that could not be dissolved
+    while time.perf_counter() < deadline and (max_kicks is None or kicks < max_kicks):
+        kicks += 1
+        live = [r for r in range(len(current.routes)) if current.routes[r] and r not in failed]
+        if not live or current.n_routes() < 2:
+            break
+        # Smaller routes are likelier to dissolve: pick among the lightest few.
+        light = sorted(live, key=lambda r: int(prob.demand[current.routes[r]].sum()))[:3]
+        r = int(rng.choice(light))
+        trial = current.copy()
+        if not _eliminate_route(trial, r):
+            failed.add(r)
+            continue
+        _descend(trial, neighbours, stops, deadline)
+        if trial.key() < best.key():
+            best = trial.copy()
+        current = trial
+        failed.clear()
+    return [r for r in best.routes if r]
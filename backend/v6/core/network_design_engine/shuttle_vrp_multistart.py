@@ -0,0 +1,133 @@
+"""
+V6 shuttle VRP multi-start. Pure logic only.
+Runs randomized Clarke–Wright variants (perturbed savings, noisy tie-breaks,
+shuffled small-route absorption) over a process pool sharing the duration
+matrix, and keeps the best VRPResult.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from backend.v6.core.duration_profile import DurationProfile, resolve_duration_matrix
+from backend.v6.core.network_design_engine.shuttle_vrp_engine import (
+    BUS_CAPACITY_DEFAULT,
+    MAX_ROUTE_DURATION_DEFAULT,
+    MAX_STOPS_DEFAULT,
+    MIN_EMP_SHUTTLE_DEFAULT,
+    VRPResult,
+    _CWVariant,
+    _solve_routes,
+    _V4_VARIANT,
+    _vrp_result,
+)
+from backend.v6.core.network_design_engine.shuttle_vrp_local_search import improve_routes
+from backend.v6.domain.constraints import StructuralConstraints
+
+MULTISTART_LAMBDA_RANGE = (0.6, 1.4)  # saving = D[tail, office] - lam * D[tail, head]
+MULTISTART_NOISE = 0.05  # savings scaled by a uniform factor in [1 - noise, 1 + noise]
+
+# Process-pool workers read the shared matrix and solve arguments from here (set by _init_worker).
+_SHARED: Dict[str, Any] = {}
+
+
+def multistart_variants(n_starts: int, seed: int = 0) -> List[_CWVariant]:
+    """
+    Variant 0 is plain V4 Clarke–Wright (multi-start is never worse than a
+    single run); variant k draws lam from MULTISTART_LAMBDA_RANGE with
+    default_rng([seed, k]), uses MULTISTART_NOISE and shuffles absorption
+    on odd k. Same (n_starts, seed) -> same variants.
+    """
+    variants = [_V4_VARIANT]
+    for k in range(1, n_starts):
+        lam = float(np.random.default_rng([seed, k]).uniform(*MULTISTART_LAMBDA_RANGE))
+        variants.append(
+            _CWVariant(lam=lam, noise=MULTISTART_NOISE, shuffle_absorption=k % 2 == 1, seed=(seed, k))
+        )
+    return variants
+
+
+def _result_key(routes_idx: List[List[int]], stops_demands: Sequence[int]) -> Tuple[int, int]:
+    """Fewer routes first, then more served employees."""
+    return len(routes_idx), -sum(stops_demands[i] for r in routes_idx for i in r)
+
+
+def _init_worker(shm_name: str, shape: Tuple[int, int], args: Tuple[Any, ...]) -> None:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _SHARED.update(shm=shm, D=np.ndarray(shape, dtype=float, buffer=shm.buf), args=args)
+
+
+def _solve_task(variant: _CWVariant) -> List[List[int]]:
+    stops_demands, office_index, *rest = _SHARED["args"]
+    return _solve_routes(stops_demands, _SHARED["D"], office_index, *rest, variant=variant)
+
+
+def run_shuttle_vrp_multistart(
+    stops_demands: Sequence[int],
+    duration_matrix: Union[np.ndarray, DurationProfile],
+    office_index: int,
+    constraints: StructuralConstraints,
+    min_emp_shuttle: int = MIN_EMP_SHUTTLE_DEFAULT,
+    max_stops: int = MAX_STOPS_DEFAULT,
+    max_route_duration: int = MAX_ROUTE_DURATION_DEFAULT,
+    n_starts: int = 16,
+    workers: Optional[int] = None,
+    seed: int = 0,
+    local_search_s: float = 0.0,
+    departure_min: Optional[float] = None,
+) -> VRPResult:
+    """
+    run_shuttle_vrp over n_starts Clarke–Wright variants (multistart_variants),
+    keeping the best result: fewer routes first, then more served employees;
+    ties -> lower variant index. The duration matrix is shared read-only with
+    the workers through shared memory (workers=None: one per CPU, at most
+    n_starts; workers=1: serial). local_search_s > 0 post-optimizes the winner
+    with improve_routes. A DurationProfile is read at departure_min, as in
+    run_shuttle_vrp. The result depends only on (inputs, n_starts, seed), not
+    on workers.
+    """
+    if not stops_demands:
+        return VRPResult(routes_idx=[], served_stop_indices=set(), unserved_stop_indices=[])
+    D = np.ascontiguousarray(resolve_duration_matrix(duration_matrix, departure_min))
+    S = len(stops_demands)
+    if D.shape[0] != D.shape[1]:
+        raise ValueError("duration_matrix must be square")
+    if S >= D.shape[0]:
+        raise ValueError("duration_matrix too small for number of stops")
+
+    bus_capacity = constraints.bus_capacity if constraints.bus_capacity > 0 else BUS_CAPACITY_DEFAULT
+    args = (
+        list(stops_demands), office_index, bus_capacity, constraints.detour_cap,
+        constraints.backfill_max_delta_min, min_emp_shuttle, max_stops, max_route_duration,
+    )
+    variants = multistart_variants(n_starts, seed)
+    workers = workers or min(len(variants), os.cpu_count() or 1)
+    if workers > 1 and len(variants) > 1:
+        shm = shared_memory.SharedMemory(create=True, size=D.nbytes)
+        try:
+            np.ndarray(D.shape, dtype=float, buffer=shm.buf)[:] = D
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(shm.name, D.shape, args),
+            ) as pool:
+                solutions = list(pool.map(_solve_task, variants))
+        finally:
+            shm.close()
+            shm.unlink()
+    else:
+        solutions = [
+            _solve_routes(args[0], D, *args[1:], variant=variant) for variant in variants
+        ]
+
+    best = min(range(len(solutions)), key=lambda k: (_result_key(solutions[k], stops_demands), k))
+    routes_idx = solutions[best]
+    if local_search_s > 0:
+        routes_idx = improve_routes(
+            routes_idx, stops_demands, D, office_index, bus_capacity, max_stops,
+            max_route_duration, constraints.detour_cap, local_search_s, seed=seed,
+        )
+    return _vrp_result(routes_idx, S)
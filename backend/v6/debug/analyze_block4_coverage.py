@@ -44,6 +44,7 @@ def main():
         min_shuttle_occupancy=0.7,
         detour_cap=2.2,
         backfill_max_delta_min=1.35,
+        split_method="kmeans",  # paridad V4
     )
     final_v6, carpool_v6 = run_shuttle_stop_opening(
         employees, office_lat, office_lng, constraints
@@ -116,7 +117,7 @@ def main():
     print("4. REGLAS ESTRICTAS (Block 4)")
     print("=" * 60)
     print("  • min_ok=8: clusters con < 8 miembros se descartan -> residual.")
-    print("  • max_ok=40: clusters grandes se parten (KMeans); subclusters < 8 se descartan.")
+    print("  • max_ok=40: clusters grandes se parten (KMeans en paridad V4); subclusters < 8 se descartan.")
     print("  • exclude_radius_m=1000: cluster cuyo centroide está a < 1000 m de oficina -> todo a carpool.")
     print(f"  • Empleados a < 1000 m de oficina: {within_1000} -> posibles clusters 'cerca oficina' excluidos.")
     print("  Conclusión: con datos dispersos y muchas zonas con < 8 vecinos en 1000 m, es esperable")
@@ -222,6 +222,7 @@ def main():
         min_shuttle_occupancy=0.7,
         detour_cap=2.2,
         backfill_max_delta_min=1.35,
+        split_method="kmeans",  # paridad V4
     )
     final_v6, carpool_v6 = run_shuttle_stop_opening(employees, OFFICE_LAT, OFFICE_LNG, constraints)
     assigned_v6 = N - len(carpool_v6)
@@ -0,0 +1,473 @@
+"""
+Comprobaciones de paridad y determinismo de V6 (Block 4, barrido, Block 5 y red viaria).
+
+Cada comprobación compara la ruta optimizada con una referencia y devuelve (ok, mensaje):
+- Greedy: greedy_open_stops (CELF + grafo de radio CSR) = bucle V4 exhaustivo
+  (mismas paradas, mismos miembros y en el mismo orden), también con domicilios
+  duplicados (empates de distancia).
+- Reabsorción: reabsorb_pair_radius = bucle V4 punto a punto.
+- Determinismo y workers: dos ejecuciones iguales y mismo resultado con 1 y N workers.
+- Incremental: update_shuttle_stop_opening = run_shuttle_stop_opening sobre el censo nuevo.
+- Barrido: cada fila de sweep_shuttle_stop_opening = run_shuttle_stop_opening con esa combinación.
+- stop_sites: check_stop_sites de evaluate_block4_v6.
+- CH: many_to_many = Dijkstra completo sobre un grafo sintético, y RoadNetworkProvider
+  igual con y sin jerarquía (también con cutoff_s).
+- DurationMatrixStore = build_duration_matrix tras altas y bajas de paradas.
+- Búsqueda local VRP: improve_routes sobre instancias aleatorias da rutas factibles
+  (capacidad, paradas, duración, desvío), sirve las mismas paradas y nunca empeora
+  (rutas, luego duración total).
+- Multi-start VRP: run_shuttle_vrp_multistart da lo mismo con 1 y N workers, con un
+  solo arranque coincide con V4 y nunca es peor que V4 (rutas, luego empleados servidos).
+
+Las comprobaciones de Block 4 corren con el preset cobertura y con parámetros V4.
+Sale con código 1 si alguna falla.
+
+Uso (desde raíz del repo):
+  python -m backend.v6.debug.check_parity_v6
+  python -m backend.v6.debug.check_parity_v6 --csv otro.csv --workers 4
+"""
+
+import argparse
+import random
+import tempfile
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import KDTree
+
+from backend.v6.application.config import DEFAULT_STRUCTURAL_CONSTRAINTS
+from backend.v6.core.network_design_engine.shuttle_stop_engine import (
+    _lat_lon_to_meters,
+    _resolve_params,
+    greedy_open_stops,
+    radius_neighbour_graph,
+    reabsorb_pair_radius,
+    run_shuttle_stop_opening,
+    run_shuttle_stop_opening_state,
+    too_close,
+    update_shuttle_stop_opening,
+)
+from backend.v6.core.network_design_engine.shuttle_stop_sweep import (
+    expand_grid,
+    sweep_shuttle_stop_opening,
+)
+from backend.v6.core.network_design_engine.shuttle_vrp_engine import (
+    MAX_ROUTE_DURATION_DEFAULT,
+    MAX_STOPS_DEFAULT,
+    run_shuttle_vrp,
+)
+from backend.v6.core.network_design_engine.shuttle_vrp_local_search import improve_routes
+from backend.v6.core.network_design_engine.shuttle_vrp_multistart import run_shuttle_vrp_multistart
+from backend.v6.debug.evaluate_block4_v6 import (
+    DEFAULT_CSV,
+    DEFAULT_OFFICE_LAT,
+    DEFAULT_OFFICE_LNG,
+    block4_constraints,
+    check_determinism,
+    check_stop_sites,
+    load_employees,
+)
+from backend.v6.domain.constraints import StructuralConstraints
+from backend.v6.domain.models import CensusDelta, Employee
+from backend.v6.infrastructure.contraction_hierarchy import load_or_build_hierarchy
+from backend.v6.infrastructure.duration_matrix import (
+    DurationMatrixStore,
+    HaversineProvider,
+    build_duration_matrix,
+)
+from backend.v6.infrastructure.road_network import RoadGraph, RoadNetworkProvider
+
+
+def with_duplicated_homes(employees: list[Employee], seed: int = 0) -> list[Employee]:
+    """Censo con la mitad de los domicilios copiados de otro empleado (distancias empatadas)."""
+    rng = random.Random(seed)
+    homes = [(e.home_lat, e.home_lng) for e in employees]
+    out = []
+    for e in employees:
+        if rng.random() < 0.5:
+            lat, lng = rng.choice(homes)
+            e = replace(e, home_lat=lat, home_lng=lng)
+        out.append(e)
+    return out
+
+
+def _greedy_reference(
+    X: np.ndarray, radius: float, cap: int, min_threshold: int, min_sep: float
+) -> tuple[list[int], list[list[int]]]:
+    """Apertura greedy V4: en cada ronda se evalúan todos los candidatos (empate = menor índice)."""
+    tree = KDTree(X)
+    unassigned = np.ones(len(X), dtype=bool)
+    centers: list[int] = []
+    members: list[list[int]] = []
+    while True:
+        best_gain, best = 0, None
+        for i in np.flatnonzero(unassigned):
+            if too_close(X[i], [X[c] for c in centers], min_sep):
+                continue
+            nbrs = [j for j in tree.query_ball_point(X[i : i + 1], r=radius)[0] if unassigned[j]]
+            dists = np.linalg.norm(X[nbrs] - X[i], axis=1)
+            take = [nbrs[k] for k in np.argsort(dists)][:cap]
+            if len(take) > best_gain:
+                best_gain, best = len(take), (int(i), take)
+        if best is None or best_gain < min_threshold:
+            return centers, members
+        centers.append(best[0])
+        members.append(best[1])
+        unassigned[best[1]] = False
+
+
+def _reabsorb_reference(
+    X: np.ndarray, members_list: list[list[int]], cap: int, pair_radius: float
+) -> list[list[int]]:
+    """Reabsorción V4: cada punto libre (índice creciente) entra en el primer cluster con hueco y un miembro a <= pair_radius."""
+    members = [list(m) for m in members_list]
+    assigned = np.zeros(len(X), dtype=bool)
+    for mems in members:
+        assigned[mems] = True
+    cap_left = [cap - len(m) for m in members]
+    for i in np.flatnonzero(~assigned):
+        for k, mems in enumerate(members):
+            if cap_left[k] > 0 and np.linalg.norm(X[mems] - X[i], axis=1).min() <= pair_radius:
+                mems.append(int(i))
+                cap_left[k] -= 1
+                break
+    return members
+
+
+def check_greedy_and_reabsorption(
+    employees: list[Employee],
+    office_lat: float,
+    office_lng: float,
+    constraints: StructuralConstraints,
+) -> tuple[bool, str]:
+    """greedy_open_stops y reabsorb_pair_radius frente a los bucles V4. Returns (ok, message)."""
+    p = _resolve_params(constraints)
+    X = _lat_lon_to_meters(employees, office_lat, office_lng)
+    graph = radius_neighbour_graph(X, KDTree(X), p.radius)
+    centers, members, _ = greedy_open_stops(
+        X, graph, p.min_shuttle, p.cap, np.ones(len(X), dtype=bool), p.min_sep
+    )
+    ref_centers, ref_members = _greedy_reference(X, p.radius, p.cap, p.min_shuttle, p.min_sep)
+    if centers != ref_centers:
+        return False, f"Greedy: paradas distintas ({len(centers)} vs {len(ref_centers)} de referencia)"
+    if members != ref_members:
+        return False, "Greedy: mismas paradas pero distintos miembros u orden"
+    ref_reabsorbed = _reabsorb_reference(X, members, p.cap, p.pair_radius)
+    reabsorb_pair_radius(X, KDTree(X), members, p.cap, p.pair_radius)
+    if members != ref_reabsorbed:
+        return False, "Reabsorción distinta de la referencia V4"
+    n_reabsorbed = sum(len(m) for m in members) - sum(len(m) for m in ref_members)
+    return True, f"{len(centers)} paradas idénticas, {n_reabsorbed} reabsorbidos idénticos"
+
+
+def check_workers(
+    employees: list[Employee],
+    office_lat: float,
+    office_lng: float,
+    constraints: StructuralConstraints,
+    workers: int,
+) -> tuple[bool, str]:
+    """Mismo resultado (clusters en orden y carpool) con 1 y con workers procesos."""
+    ref = run_shuttle_stop_opening(employees, office_lat, office_lng, constraints)
+    out = run_shuttle_stop_opening(employees, office_lat, office_lng, constraints, workers=workers)
+    if out != ref:
+        return False, f"Distinto resultado con 1 y {workers} workers"
+    return True, f"1 = {workers} workers ({len(ref[0])} paradas)"
+
+
+def check_incremental(
+    employees: list[Employee],
+    office_lat: float,
+    office_lng: float,
+    constraints: StructuralConstraints,
+    steps: int = 3,
+    seed: int = 0,
+) -> tuple[bool, str]:
+    """
+    Encadena steps deltas aleatorios (mudanzas, altas cerca de otro domicilio y
+    bajas) con update_shuttle_stop_opening y compara cada estado con el cálculo
+    completo sobre su censo.
+    """
+    rng = random.Random(seed)
+    state = run_shuttle_stop_opening_state(employees, office_lat, office_lng, constraints)
+    for step in range(steps):
+        current = state.employees
+        ids = [e.employee_id for e in current]
+        moved_ids = set(rng.sample(ids, min(5, len(ids))))
+        removed = rng.sample([eid for eid in ids if eid not in moved_ids], min(3, len(ids) - len(moved_ids)))
+        moved = [
+            replace(e, home_lat=e.home_lat + rng.gauss(0, 0.005), home_lng=e.home_lng + rng.gauss(0, 0.005))
+            for e in current
+            if e.employee_id in moved_ids
+        ]
+        added = []
+        for k in range(3):
+            near = rng.choice(current)
+            added.append(
+                Employee(f"alta_{step}_{k}", near.home_lat + rng.gauss(0, 0.002), near.home_lng + rng.gauss(0, 0.002), False)
+            )
+        state = update_shuttle_stop_opening(state, CensusDelta(moved=moved, added=added, removed=removed))
+        full = run_shuttle_stop_opening(state.employees, office_lat, office_lng, constraints)
+        if full != (state.final_clusters, state.carpool_set):
+            return False, f"Paso {step + 1}: incremental distinto del cálculo completo"
+    return True, f"{steps} deltas encadenados = cálculo completo"
+
+
+def check_sweep(
+    employees: list[Employee],
+    office_lat: float,
+    office_lng: float,
+    constraints: StructuralConstraints,
+    workers: int,
+) -> tuple[bool, str]:
+    """Cada fila del barrido coincide con run_shuttle_stop_opening en esa combinación."""
+    grid = {
+        "assign_radius_m": [constraints.assign_radius_m, constraints.assign_radius_m + 200.0],
+        "min_ok": [6, 8],
+        "max_ok": [30, 40],
+    }
+    rows = sweep_shuttle_stop_opening(employees, office_lat, office_lng, constraints, grid, workers=workers)
+    for row, (setting, c, params) in zip(rows, expand_grid(constraints, grid)):
+        clusters, carpool = run_shuttle_stop_opening(employees, office_lat, office_lng, c, params=params)
+        sizes = sorted(len(cl) for cl in clusters)
+        expected = (len(clusters), len(carpool), sum(sizes), sizes[-1] if sizes else 0)
+        got = (row["n_clusters"], row["n_carpool"], row["n_shuttle"], row["stop_size_max"])
+        if got != expected:
+            return False, f"Barrido distinto en {setting}: {got} vs {expected}"
+    return True, f"{len(rows)} combinaciones = run_shuttle_stop_opening"
+
+
+def synthetic_road_graph(
+    office_lat: float, office_lng: float, side: int = 30, seed: int = 0
+) -> RoadGraph:
+    """
+    Rejilla side × side alrededor de la oficina (~200 m entre nodos) con tiempos
+    aleatorios, un 15% de calles de sentido único y dos nodos aislados al final
+    (pares no alcanzables).
+    """
+    rng = np.random.default_rng(seed)
+    ii, jj = np.meshgrid(np.arange(side), np.arange(side), indexing="ij")
+    node = ii * side + jj
+    lat = np.r_[office_lat + 0.0018 * (ii.ravel() - side / 2), office_lat + 0.05, office_lat - 0.05]
+    lng = np.r_[office_lng + 0.0024 * (jj.ravel() - side / 2), office_lng + 0.05, office_lng - 0.05]
+    u = np.r_[node[:, :-1].ravel(), node[:-1, :].ravel()]
+    v = np.r_[node[:, 1:].ravel(), node[1:, :].ravel()]
+    forward = rng.uniform(15.0, 60.0, len(u))
+    backward = rng.uniform(15.0, 60.0, len(u))
+    two_way = rng.random(len(u)) >= 0.15
+    rows = np.r_[u, v[two_way]]
+    cols = np.r_[v, u[two_way]]
+    n = len(lat)
+    adj = csr_matrix((np.r_[forward, backward[two_way]], (rows, cols)), shape=(n, n))
+    return RoadGraph(lat, lng, adj)
+
+
+def check_contraction_hierarchy(office_lat: float, office_lng: float, seed: int = 0) -> tuple[bool, str]:
+    """
+    CH frente a Dijkstra completo (mismos pares no alcanzables, diferencia
+    relativa < 1e-9) y RoadNetworkProvider con y sin jerarquía, sin límite y con
+    cutoff_s. La CH se guarda y se vuelve a leer de caché.
+    """
+    graph = synthetic_road_graph(office_lat, office_lng, seed=seed)
+    rng = np.random.default_rng(seed)
+    src = np.r_[rng.integers(0, graph.n_nodes, 60), graph.n_nodes - 1]
+    dst = np.r_[rng.integers(0, graph.n_nodes, 80), graph.n_nodes - 2]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        load_or_build_hierarchy(graph, Path(cache_dir))
+        ch = load_or_build_hierarchy(graph, Path(cache_dir))
+    ref = graph.node_durations_s(src, dst)
+    got = ch.many_to_many(src, dst)
+    finite = np.isfinite(ref)
+    if not np.array_equal(finite, np.isfinite(got)):
+        return False, "CH y Dijkstra no coinciden en los pares no alcanzables"
+    rel = float(np.max(np.abs(got[finite] - ref[finite]) / np.maximum(ref[finite], 1.0)))
+    if rel > 1e-9:
+        return False, f"CH distinta de Dijkstra (dif. relativa {rel:.1e})"
+    pts = np.column_stack([
+        rng.uniform(graph.node_lat.min(), graph.node_lat.max(), 50),
+        rng.uniform(graph.node_lng.min(), graph.node_lng.max(), 50),
+    ])
+    for cutoff_s in (None, 300.0):
+        plain = RoadNetworkProvider(graph, cutoff_s=cutoff_s).durations_s(pts, pts)
+        with_ch = RoadNetworkProvider(graph, cutoff_s=cutoff_s, hierarchy=ch).durations_s(pts, pts)
+        if not np.allclose(plain, with_ch, rtol=1e-6):
+            return False, f"RoadNetworkProvider distinto con y sin CH (cutoff_s={cutoff_s})"
+    return True, f"{len(src)}×{len(dst)} pares = Dijkstra (dif. relativa {rel:.0e}), proveedor igual con CH"
+
+
+def check_duration_store(office_lat: float, office_lng: float, seed: int = 0) -> tuple[bool, str]:
+    """DurationMatrixStore tras altas y bajas = build_duration_matrix, calculando solo los pares nuevos."""
+    rng = random.Random(seed)
+    provider = HaversineProvider()
+    stops = [(office_lat + rng.uniform(-0.2, 0.2), office_lng + rng.uniform(-0.2, 0.2)) for _ in range(80)]
+    store = DurationMatrixStore(provider)
+    for week in range(3):
+        D, office_idx = store.matrix(stops, office_lat, office_lng, prune=True)
+        ref, ref_office_idx = build_duration_matrix(stops, office_lat, office_lng, provider)
+        if office_idx != ref_office_idx or not np.allclose(D, ref, atol=1e-3):
+            return False, f"Semana {week + 1}: store distinto de build_duration_matrix"
+        stops = rng.sample(stops, len(stops) - 10) + [
+            (office_lat + rng.uniform(-0.2, 0.2), office_lng + rng.uniform(-0.2, 0.2)) for _ in range(10)
+        ]
+    n_full = 3 * (len(stops) + 1) ** 2
+    return True, f"3 rediseños = build_duration_matrix ({store.n_computed} pares calculados vs {n_full} desde cero)"
+
+
+def vrp_instances(
+    office_lat: float, office_lng: float, n_instances: int = 12, seed: int = 0
+) -> list[tuple[list[int], np.ndarray, int]]:
+    """
+    Instancias de Block 5 (demandas, matriz D Haversine, índice de oficina):
+    20-80 paradas en 3-8 barrios a menos de ~20 km de la oficina, 6-40 empleados por parada.
+    """
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n_instances):
+        n_stops = int(rng.integers(20, 81))
+        hubs = rng.uniform(-0.15, 0.15, size=(int(rng.integers(3, 9)), 2))
+        pts = hubs[rng.integers(0, len(hubs), n_stops)] + rng.normal(0, 0.02, size=(n_stops, 2))
+        stops = [(office_lat + a, office_lng + b) for a, b in pts]
+        D, office_idx = build_duration_matrix(stops, office_lat, office_lng)
+        demands = rng.integers(6, 41, n_stops).tolist()
+        out.append((demands, np.asarray(D, dtype=float), office_idx))
+    return out
+
+
+def _route_duration(seq: list[int], D: np.ndarray, office_idx: int) -> float:
+    return float(sum(D[a, b] for a, b in zip(seq, seq[1:])) + D[seq[-1], office_idx])
+
+
+def _infeasible_route(
+    seq: list[int], demands: list[int], D: np.ndarray, office_idx: int, constraints: StructuralConstraints
+) -> str | None:
+    """Motivo por el que seq incumple las reglas V4 de Block 5, o None si es factible."""
+    dur = _route_duration(seq, D, office_idx)
+    if sum(demands[i] for i in seq) > constraints.bus_capacity:
+        return "capacidad"
+    if len(seq) > MAX_STOPS_DEFAULT:
+        return "nº de paradas"
+    if dur > MAX_ROUTE_DURATION_DEFAULT:
+        return "duración"
+    base_mean = float(np.mean([D[i, office_idx] for i in seq]))
+    if base_mean > 0.0 and dur / base_mean > constraints.detour_cap * (1.0 + 1e-9):
+        return "desvío"
+    return None
+
+
+def check_vrp_local_search(office_lat: float, office_lng: float, seed: int = 0) -> tuple[bool, str]:
+    """
+    improve_routes (10 kicks por instancia) sobre la solución V4 de cada
+    instancia: rutas factibles, cada parada servida una vez, mismas paradas
+    servidas y (rutas, duración total) nunca peor.
+    """
+    constraints = DEFAULT_STRUCTURAL_CONSTRAINTS
+    fewer_routes = shorter = 0
+    instances = vrp_instances(office_lat, office_lng, seed=seed)
+    for k, (demands, D, office_idx) in enumerate(instances):
+        before = run_shuttle_vrp(demands, D, office_idx, constraints).routes_idx
+        after = improve_routes(
+            before, demands, D, office_idx, constraints.bus_capacity, MAX_STOPS_DEFAULT,
+            MAX_ROUTE_DURATION_DEFAULT, constraints.detour_cap, time_budget_s=5.0,
+            seed=seed, max_kicks=10,
+        )
+        served = [i for r in after for i in r]
+        if len(served) != len(set(served)) or set(served) != {i for r in before for i in r}:
+            return False, f"Instancia {k}: cambian las paradas servidas"
+        for seq in after:
+            reason = _infeasible_route(seq, demands, D, office_idx, constraints)
+            if reason is not None:
+                return False, f"Instancia {k}: ruta infactible ({reason})"
+        cost_before = (len(before), sum(_route_duration(r, D, office_idx) for r in before))
+        cost_after = (len(after), sum(_route_duration(r, D, office_idx) for r in after))
+        if cost_after[0] > cost_before[0] or (
+            cost_after[0] == cost_before[0] and cost_after[1] > cost_before[1] + 1e-6
+        ):
+            return False, f"Instancia {k}: peor que V4 ({cost_after} vs {cost_before})"
+        fewer_routes += cost_after[0] < cost_before[0]
+        shorter += cost_after[0] == cost_before[0] and cost_after[1] < cost_before[1] - 1e-6
+    return True, (
+        f"{len(instances)} instancias factibles, mismas paradas; "
+        f"{fewer_routes} con menos rutas, {shorter} más cortas"
+    )
+
+
+def check_vrp_multistart(
+    office_lat: float, office_lng: float, workers: int, n_starts: int = 8, seed: int = 0
+) -> tuple[bool, str]:
+    """
+    run_shuttle_vrp_multistart con 1 y con workers procesos: mismas rutas; con
+    n_starts=1, las de run_shuttle_vrp (variante 0 = V4); y frente a V4 nunca más
+    rutas, ni menos servidos con las mismas rutas.
+    """
+    constraints = DEFAULT_STRUCTURAL_CONSTRAINTS
+    better = 0
+    instances = vrp_instances(office_lat, office_lng, seed=seed)
+    for k, (demands, D, office_idx) in enumerate(instances):
+        serial = run_shuttle_vrp_multistart(
+            demands, D, office_idx, constraints, n_starts=n_starts, workers=1, seed=seed
+        )
+        pooled = run_shuttle_vrp_multistart(
+            demands, D, office_idx, constraints, n_starts=n_starts, workers=workers, seed=seed
+        )
+        if pooled.routes_idx != serial.routes_idx:
+            return False, f"Instancia {k}: distinto resultado con 1 y {workers} workers"
+        v4 = run_shuttle_vrp(demands, D, office_idx, constraints)
+        single = run_shuttle_vrp_multistart(demands, D, office_idx, constraints, n_starts=1, workers=1)
+        if single.routes_idx != v4.routes_idx:
+            return False, f"Instancia {k}: la variante 0 no es V4"
+        key_ms, key_v4 = (
+            (len(r.routes_idx), -sum(demands[i] for i in r.served_stop_indices)) for r in (serial, v4)
+        )
+        if key_ms > key_v4:
+            return False, f"Instancia {k}: peor que V4 (rutas, -servidos) {key_ms} vs {key_v4}"
+        better += key_ms < key_v4
+    return True, f"{len(instances)} instancias: 1 = {workers} workers, {better} mejores que V4 y ninguna peor"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y determinismo V6")
+    parser.add_argument("--csv", type=Path, default=DEFAULT_CSV, help="CSV con employee_id, home_lat, home_lng")
+    parser.add_argument("--office-lat", type=float, default=DEFAULT_OFFICE_LAT, help="Latitud oficina")
+    parser.add_argument("--office-lng", type=float, default=DEFAULT_OFFICE_LNG, help="Longitud oficina")
+    parser.add_argument("--workers", type=int, default=2, help="Procesos para workers, barrido y multi-start (frente a 1)")
+    args = parser.parse_args()
+
+    if not args.csv.exists():
+        print(f"ERROR: No existe el archivo {args.csv}")
+        return 1
+
+    employees = load_employees(args.csv)
+    print(f"Empleados cargados: {len(employees)} desde {args.csv}")
+    office = (args.office_lat, args.office_lng)
+    results = []
+    for preset, use_coverage in (("cobertura", True), ("V4", False)):
+        c = block4_constraints(use_coverage)
+        results += [
+            (f"[{preset}] Greedy + reabsorción", check_greedy_and_reabsorption(employees, *office, c)),
+            (f"[{preset}] Domicilios duplicados", check_greedy_and_reabsorption(with_duplicated_homes(employees), *office, c)),
+            (f"[{preset}] Determinismo", check_determinism(employees, *office, c)),
+            (f"[{preset}] Workers", check_workers(employees, *office, c, args.workers)),
+            (f"[{preset}] Incremental", check_incremental(employees, *office, c)),
+            (f"[{preset}] Barrido", check_sweep(employees, *office, c, args.workers)),
+            (f"[{preset}] stop_sites", check_stop_sites(employees, *office, c)),
+        ]
+    results += [
+        ("CH vs Dijkstra", check_contraction_hierarchy(*office)),
+        ("DurationMatrixStore", check_duration_store(*office)),
+        ("VRP búsqueda local", check_vrp_local_search(*office)),
+        ("VRP multi-start", check_vrp_multistart(*office, args.workers)),
+    ]
+
+    print("\n--- Paridad V6 ---")
+    width = max(len(name) for name, _ in results)
+    for name, (ok, msg) in results:
+        print(f"  {name.ljust(width)}  {'OK' if ok else 'FAIL'} — {msg}")
+    n_fail = sum(not ok for _, (ok, _) in results)
+    print(f"\n  Resumen: {len(results) - n_fail}/{len(results)} OK")
+    return 1 if n_fail else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
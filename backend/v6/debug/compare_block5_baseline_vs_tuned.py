@@ -14,9 +14,8 @@ Salida: tabla lado a lado + resumen; opcional --out para guardar CSV/markdown.
 
 import argparse
 import csv
-import math
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List
 
 import numpy as np
 
@@ -24,6 +23,8 @@ from backend.v6.application.config import (
     DEFAULT_OFFICE_LAT,
     DEFAULT_OFFICE_LNG,
     DEFAULT_STRUCTURAL_CONSTRAINTS,
+    DURATION_MATRIX_CACHE_DIR,
+    ROAD_GRAPH_CACHE_DIR,
 )
 from backend.v6.application.shuttle_candidates import block4_clusters_to_shuttle_options
 from backend.v6.core.network_design_engine.shuttle_stop_engine import (
@@ -35,6 +36,9 @@ from backend.v6.core.network_design_engine.shuttle_vrp_engine import (
 )
 from backend.v6.domain.constraints import StructuralConstraints
 from backend.v6.domain.models import Employee, ShuttleOption
+from backend.v6.infrastructure.contraction_hierarchy import load_or_build_hierarchy
+from backend.v6.infrastructure.duration_matrix import build_duration_matrix
+from backend.v6.infrastructure.road_network import RoadNetworkProvider, load_road_graph
 
 
 DATA_CSV = (
@@ -79,45 +83,6 @@ def _load_employees(csv_path: Path) -> List[Employee]:
     return employees
 
 
-def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    r = 6371.0
-    lat1_r = math.radians(lat1)
-    lat2_r = math.radians(lat2)
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_r) * math.cos(lat2_r) * math.sin(
-        dlon / 2
-    ) ** 2
-    c = 2 * math.asin(min(1.0, math.sqrt(a)))
-    return r * c
-
-
-def _build_duration_matrix(
-    stops_coords: List[Tuple[float, float]],
-    office_lat: float,
-    office_lng: float,
-    speed_kmh: float = 30.0,
-) -> Tuple[np.ndarray, int]:
-    S = len(stops_coords)
-    N = S + 1
-    D = np.zeros((N, N), dtype=float)
-    office_idx = S
-    all_coords: List[Tuple[float, float]] = stops_coords + [
-        (office_lat, office_lng)
-    ]
-    for i in range(N):
-        for j in range(N):
-            if i == j:
-                D[i, j] = 0.0
-            else:
-                lat1, lon1 = all_coords[i]
-                lat2, lon2 = all_coords[j]
-                dist_km = _haversine_km(lat1, lon1, lat2, lon2)
-                hours = dist_km / max(speed_kmh, 1.0)
-                D[i, j] = hours * 3600.0
-    return D, office_idx
-
-
 def _route_durations(
     routes_idx: List[List[int]], D: np.ndarray, office_idx: int
 ) -> List[float]:
@@ -195,6 +160,28 @@ def main() -> int:
         default=None,
         help="Guardar resumen en este path (extensión .md o .csv)",
     )
+    parser.add_argument(
+        "--matrix-cache",
+        type=Path,
+        default=DURATION_MATRIX_CACHE_DIR,
+        help="Directorio de caché de matrices de tiempos (.npy)",
+    )
+    parser.add_argument(
+        "--no-matrix-cache",
+        action="store_true",
+        help="Calcular la matriz de tiempos sin leer ni escribir caché",
+    )
+    parser.add_argument(
+        "--road-graph",
+        type=Path,
+        default=None,
+        help="Grafo viario local (.graphml, .csv de aristas o .npz); por defecto Haversine",
+    )
+    parser.add_argument(
+        "--road-ch",
+        action="store_true",
+        help="Con --road-graph: consultas por contraction hierarchy (se construye y cachea la primera vez)",
+    )
     args = parser.parse_args()
 
     if not args.csv.exists():
@@ -218,8 +205,17 @@ def main() -> int:
 
     stops_coords = [(s.centroid_lat, s.centroid_lng) for s in stops]
     stops_demands = [s.estimated_size for s in stops]
-    D, office_idx = _build_duration_matrix(
-        stops_coords, args.office_lat, args.office_lng
+    provider = None
+    if args.road_graph is not None:
+        graph = load_road_graph(args.road_graph, ROAD_GRAPH_CACHE_DIR)
+        hierarchy = load_or_build_hierarchy(graph, ROAD_GRAPH_CACHE_DIR) if args.road_ch else None
+        provider = RoadNetworkProvider(graph, hierarchy=hierarchy)
+    D, office_idx = build_duration_matrix(
+        stops_coords,
+        args.office_lat,
+        args.office_lng,
+        provider=provider,
+        cache_dir=None if args.no_matrix_cache else args.matrix_cache,
     )
 
     # ---------- Baseline (V4 frozen) ----------
@@ -248,6 +248,7 @@ def main():
         min_shuttle_occupancy=0.7,
         detour_cap=2.2,
         backfill_max_delta_min=1.35,
+        split_method="kmeans",  # paridad V4
     )
     final_clusters_v6, carpool_set_v6 = run_shuttle_stop_opening(employees, office_lat, office_lng, constraints)
     num_excluded_v6 = len(carpool_set_v6)
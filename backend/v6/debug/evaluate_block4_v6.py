@@ -3,13 +3,14 @@ Evaluación del nivel del Block 4 en V6.
 
 Ejecuta solo el motor de paradas shuttle (run_shuttle_stop_opening) y reporta:
 - Métricas: clusters, tamaños, excluidos, cobertura.
-- Cumplimiento: separación mínima entre paradas, determinismo.
+- Cumplimiento: separación mínima entre paradas, determinismo, modo stop_sites.
 - Nivel: OK / WARN / FAIL por criterio y resumen.
 
 Criterios de nivel:
 - Cobertura: OK >= 85%, WARN >= 70%, FAIL < 70%.
 - Separación mínima: todas las paradas a >= min_stop_sep_m (350 m por defecto).
 - Determinismo: dos ejecuciones deben dar el mismo resultado.
+- stop_sites: con más sitios que empleados, mismo resultado con 1 y 2 workers y en el barrido.
 
 Uso (desde raíz del repo):
   python -m backend.v6.debug.evaluate_block4_v6              # por defecto: preset cobertura Optimob
@@ -29,6 +30,7 @@ from backend.v6.core.network_design_engine.shuttle_stop_engine import (
     run_shuttle_stop_opening,
     _lat_lon_to_meters,
 )
+from backend.v6.core.network_design_engine.shuttle_stop_sweep import sweep_shuttle_stop_opening
 from backend.v6.domain.constraints import StructuralConstraints
 from backend.v6.domain.models import Employee
 
@@ -118,16 +120,42 @@ def check_determinism(
     return True, "Dos ejecuciones idénticas"
 
 
-def run_evaluation(
+def check_stop_sites(
     employees: list[Employee],
-    office_lat: float = DEFAULT_OFFICE_LAT,
-    office_lng: float = DEFAULT_OFFICE_LNG,
-    min_sep_m: float = MIN_STOP_SEP_M,
-    use_coverage_params: bool = True,
-) -> dict:
-    """Ejecuta Block 4 V6 y devuelve métricas. Por defecto usa preset cobertura Optimob; con use_coverage_params=False, parámetros V4 (paridad)."""
+    office_lat: float,
+    office_lng: float,
+    constraints: StructuralConstraints,
+) -> tuple[bool, str]:
+    """
+    Modo stop_sites con más sitios que empleados: primero un señuelo lejano por
+    empleado y después un sitio en cada domicilio, de modo que las paradas que
+    se abren tienen índice de sitio >= número de empleados. Debe dar el mismo
+    resultado con 1 y 2 workers, y el barrido la misma cobertura. Returns (ok, message).
+    """
+    homes = [(e.home_lat, e.home_lng) for e in employees]
+    sites = [(lat + 0.5, lng) for lat, lng in homes] + homes
+    c1, cp1 = run_shuttle_stop_opening(
+        employees, office_lat, office_lng, constraints, stop_sites=sites
+    )
+    c2, cp2 = run_shuttle_stop_opening(
+        employees, office_lat, office_lng, constraints, workers=2, stop_sites=sites
+    )
+    if (c1, cp1) != (c2, cp2):
+        return False, "Distinto resultado con 1 y 2 workers"
+    if not c1:
+        return False, "Ninguna parada abierta en los sitios de los domicilios"
+    (row,) = sweep_shuttle_stop_opening(
+        employees, office_lat, office_lng, constraints, {}, workers=1, stop_sites=sites
+    )
+    if (row["n_clusters"], row["n_carpool"]) != (len(c1), len(cp1)):
+        return False, f"Barrido distinto: {row['n_clusters']} paradas vs {len(c1)}"
+    return True, f"{len(sites)} sitios / {len(employees)} empleados: {len(c1)} paradas, 1 = 2 workers = barrido"
+
+
+def block4_constraints(use_coverage_params: bool = True) -> StructuralConstraints:
+    """Preset cobertura Optimob (por defecto) o, con use_coverage_params=False, parámetros V4 (paridad)."""
     if use_coverage_params:
-        constraints = StructuralConstraints(
+        return StructuralConstraints(
             assign_radius_m=1200.0,
             max_cluster_size=MAX_CLUSTER,
             bus_capacity=50,
@@ -139,15 +167,26 @@ def run_evaluation(
             pair_radius_m=450.0,
             assign_by_stop_radius_after=True,
         )
-    else:
-        constraints = StructuralConstraints(
-            assign_radius_m=float(ASSIGN_RADIUS_M),
-            max_cluster_size=MAX_CLUSTER,
-            bus_capacity=50,
-            min_shuttle_occupancy=0.7,
-            detour_cap=2.2,
-            backfill_max_delta_min=1.35,
-        )
+    return StructuralConstraints(
+        assign_radius_m=float(ASSIGN_RADIUS_M),
+        max_cluster_size=MAX_CLUSTER,
+        bus_capacity=50,
+        min_shuttle_occupancy=0.7,
+        detour_cap=2.2,
+        backfill_max_delta_min=1.35,
+        split_method="kmeans",
+    )
+
+
+def run_evaluation(
+    employees: list[Employee],
+    office_lat: float = DEFAULT_OFFICE_LAT,
+    office_lng: float = DEFAULT_OFFICE_LNG,
+    min_sep_m: float = MIN_STOP_SEP_M,
+    use_coverage_params: bool = True,
+) -> dict:
+    """Ejecuta Block 4 V6 y devuelve métricas. Por defecto usa preset cobertura Optimob; con use_coverage_params=False, parámetros V4 (paridad)."""
+    constraints = block4_constraints(use_coverage_params)
     final_clusters, carpool_set = run_shuttle_stop_opening(
         employees, office_lat, office_lng, constraints
     )
@@ -159,6 +198,7 @@ def run_evaluation(
         final_clusters, employees, office_lat, office_lng, min_sep_m
     )
     det_ok, det_msg = check_determinism(employees, office_lat, office_lng, constraints)
+    sites_ok, sites_msg = check_stop_sites(employees, office_lat, office_lng, constraints)
 
     assign_radius_m = constraints.assign_radius_m
     overlap_stops = 0
@@ -184,6 +224,8 @@ def run_evaluation(
         "min_pairwise_m": min_pairwise,
         "determinism_ok": det_ok,
         "determinism_msg": det_msg,
+        "stop_sites_ok": sites_ok,
+        "stop_sites_msg": sites_msg,
         "final_clusters": final_clusters,
         "carpool_set": carpool_set,
         "overlap_stops": overlap_stops,
@@ -363,6 +405,7 @@ def main():
     sep_level = "OK" if r["min_sep_ok"] else "FAIL"
     print(f"  Separación mínima (>{MIN_STOP_SEP_M}m): {sep_level} (min par = {r['min_pairwise_m']:.0f}m)")
     print(f"  Determinismo: {'OK' if r['determinism_ok'] else 'FAIL'} — {r['determinism_msg']}")
+    print(f"  stop_sites:   {'OK' if r['stop_sites_ok'] else 'FAIL'} — {r['stop_sites_msg']}")
 
     # ---- Nivel ----
     cov_level = level_for_coverage(r["coverage_pct"])
@@ -370,9 +413,11 @@ def main():
     print(f"  Cobertura:       {cov_level} ({r['coverage_pct']:.1f}%)")
     print(f"  Separación:      {'OK' if r['min_sep_ok'] else 'FAIL'}")
     print(f"  Determinismo:    {'OK' if r['determinism_ok'] else 'FAIL'}")
-    if cov_level == "OK" and r["min_sep_ok"] and r["determinism_ok"]:
+    print(f"  stop_sites:      {'OK' if r['stop_sites_ok'] else 'FAIL'}")
+    checks_ok = r["min_sep_ok"] and r["determinism_ok"] and r["stop_sites_ok"]
+    if cov_level == "OK" and checks_ok:
         print("  Resumen:         NIVEL OK (Block 4 V6 listo para uso)")
-    elif cov_level == "FAIL" or not r["min_sep_ok"] or not r["determinism_ok"]:
+    elif cov_level == "FAIL" or not checks_ok:
         print("  Resumen:         NIVEL FAIL (revisar criterios)")
     else:
         print("  Resumen:         NIVEL WARN (aceptable con revisión)")
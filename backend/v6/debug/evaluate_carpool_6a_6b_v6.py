@@ -20,6 +20,7 @@ from backend.v6.application.config import (
     DEFAULT_OFFICE_LAT,
     DEFAULT_OFFICE_LNG,
     DEFAULT_STRUCTURAL_CONSTRAINTS,
+    ROAD_GRAPH_CACHE_DIR,
 )
 from backend.v6.application.shuttle_candidates import get_shuttle_candidates_block4
 from backend.v6.core.allocation_engine.carpool_prep_engine import run_carpool_prep
@@ -27,6 +28,18 @@ from backend.v6.core.allocation_engine.carpool_match_engine import run_carpool_m
 from backend.v6.core.allocation_engine.carpool_time_adapter import HaversineCarpoolAdapter
 from backend.v6.domain.constraints import CarpoolMatchConfig
 from backend.v6.domain.models import CarpoolMatch, CarpoolPerson, DriverRoute, Employee
+from backend.v6.infrastructure.contraction_hierarchy import load_or_build_hierarchy
+from backend.v6.infrastructure.duration_matrix import HaversineProvider
+from backend.v6.infrastructure.duration_profile import (
+    PeakProfileProvider,
+    ProfiledCarpoolAdapter,
+    parse_peak_profile,
+)
+from backend.v6.infrastructure.road_network import (
+    RoadNetworkCarpoolAdapter,
+    RoadNetworkProvider,
+    load_road_graph,
+)
 
 DATA_CSV = Path(__file__).resolve().parent.parent / "data" / "v4_employees_frozen.csv"
 
@@ -161,6 +174,9 @@ def main() -> int:
     parser.add_argument("--csv", type=Path, default=DATA_CSV)
     parser.add_argument("--pct-drivers", type=float, default=0.35, help="Fracción empleados como conductores (CSV sin columna)")
     parser.add_argument("--map", action="store_true", help="Generar mapa HTML (masa partida, match, fuera)")
+    parser.add_argument("--road-graph", type=Path, default=None, help="Grafo viario local (.graphml, .csv o .npz); por defecto Haversine")
+    parser.add_argument("--road-ch", action="store_true", help="Con --road-graph: consultas por contraction hierarchy (cacheada)")
+    parser.add_argument("--peak-profile", default=None, help="Factores de congestión por hora, p. ej. '07:30=1.15,08:30=1.45' (detour/ETA a la hora de salida de cada pax)")
     args = parser.parse_args()
 
     if not args.csv.exists():
@@ -185,7 +201,16 @@ def main() -> int:
         print("Sin pasajeros o sin censo; no se ejecuta 6B.")
         return 0
 
-    adapter = HaversineCarpoolAdapter(speed_kmh=30.0)
+    if args.road_graph is not None:
+        graph = load_road_graph(args.road_graph, ROAD_GRAPH_CACHE_DIR)
+        hierarchy = load_or_build_hierarchy(graph, ROAD_GRAPH_CACHE_DIR) if args.road_ch else None
+        adapter = RoadNetworkCarpoolAdapter(RoadNetworkProvider(graph, hierarchy=hierarchy))
+    else:
+        adapter = HaversineCarpoolAdapter(speed_kmh=30.0)
+    if args.peak_profile:
+        base = adapter.provider if args.road_graph is not None else HaversineProvider(30.0)
+        peak = PeakProfileProvider(base, parse_peak_profile(args.peak_profile))
+        adapter = ProfiledCarpoolAdapter(adapter, peak, peak.departure_min)
     config = CarpoolMatchConfig()
     result = run_carpool_match(
         census, DEFAULT_OFFICE_LAT, DEFAULT_OFFICE_LNG, adapter, config
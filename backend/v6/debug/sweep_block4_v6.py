@@ -0,0 +1,112 @@
+"""
+Barrido de parámetros del Block 4 V6 sobre un censo.
+
+Evalúa todas las combinaciones de una rejilla de StructuralConstraints / ShuttleStopParams
+con sweep_shuttle_stop_opening (proyección, KDTree, grafos de radio y apertura greedy
+compartidos entre combinaciones) y muestra una tabla de KPIs: cobertura, nº de paradas,
+tamaños de parada. Opcionalmente la guarda en CSV.
+
+Uso (desde raíz del repo):
+  python -m backend.v6.debug.sweep_block4_v6
+  python -m backend.v6.debug.sweep_block4_v6 --grid assign_radius_m=1000,1200 min_ok=6,8 --out sweep.csv
+"""
+
+import argparse
+import csv
+import time
+from pathlib import Path
+
+from backend.v6.application.config import (
+    DEFAULT_OFFICE_LAT,
+    DEFAULT_OFFICE_LNG,
+    DEFAULT_STRUCTURAL_CONSTRAINTS,
+)
+from backend.v6.core.network_design_engine.shuttle_stop_sweep import sweep_shuttle_stop_opening
+from backend.v6.debug.evaluate_block4_v6 import DEFAULT_CSV, load_employees
+
+# Rejilla por defecto: alrededor del preset cobertura Optimob
+DEFAULT_GRID = {
+    "assign_radius_m": [1000.0, 1200.0, 1400.0],
+    "pair_radius_m": [350.0, 450.0, 550.0],
+    "min_ok": [6, 8],
+    "max_ok": [30, 40],
+}
+
+KPI_COLUMNS = ["coverage_pct", "n_clusters", "n_shuttle", "n_carpool", "stop_size_min", "stop_size_median", "stop_size_max"]
+
+
+def _parse_value(raw: str):
+    """'1200' -> 1200, '1200.5' -> 1200.5, 'none' -> None, 'true'/'false' -> bool, resto texto."""
+    low = raw.strip().lower()
+    if low == "none":
+        return None
+    if low in ("true", "false"):
+        return low == "true"
+    for cast in (int, float):
+        try:
+            return cast(raw)
+        except ValueError:
+            pass
+    return raw.strip()
+
+
+def parse_grid(items: list[str]) -> dict:
+    """['assign_radius_m=1000,1200', 'split_method=balanced,kmeans'] -> rejilla."""
+    grid = {}
+    for item in items:
+        name, _, values = item.partition("=")
+        grid[name.strip()] = [_parse_value(v) for v in values.split(",")]
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido de parámetros Block 4 V6")
+    parser.add_argument("--csv", type=Path, default=DEFAULT_CSV, help="CSV con employee_id, home_lat, home_lng")
+    parser.add_argument("--office-lat", type=float, default=DEFAULT_OFFICE_LAT, help="Latitud oficina")
+    parser.add_argument("--office-lng", type=float, default=DEFAULT_OFFICE_LNG, help="Longitud oficina")
+    parser.add_argument("--grid", nargs="*", default=None, help="nombre=v1,v2,... (por defecto DEFAULT_GRID)")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto: nº CPUs)")
+    parser.add_argument("--out", type=Path, default=None, help="Guardar la tabla en este CSV")
+    args = parser.parse_args()
+
+    if not args.csv.exists():
+        print(f"ERROR: No existe el archivo {args.csv}")
+        return 1
+
+    employees = load_employees(args.csv)
+    grid = parse_grid(args.grid) if args.grid else DEFAULT_GRID
+    n_combos = 1
+    for values in grid.values():
+        n_combos *= len(values)
+    print(f"Empleados cargados: {len(employees)} desde {args.csv}")
+    print(f"Combinaciones: {n_combos}  ({', '.join(f'{k}={v}' for k, v in grid.items())})")
+
+    t0 = time.perf_counter()
+    rows = sweep_shuttle_stop_opening(
+        employees,
+        args.office_lat,
+        args.office_lng,
+        DEFAULT_STRUCTURAL_CONSTRAINTS,
+        grid,
+        workers=args.workers,
+    )
+    print(f"Barrido completado en {time.perf_counter() - t0:.1f} s\n")
+
+    columns = list(grid) + KPI_COLUMNS
+    widths = [max(len(c), 8) for c in columns]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for row in sorted(rows, key=lambda r: -r["coverage_pct"]):
+        cells = [f"{row[c]:.1f}" if isinstance(row[c], float) else str(row[c]) for c in columns]
+        print("  ".join(cell.rjust(w) for cell, w in zip(cells, widths)))
+
+    if args.out:
+        with open(args.out, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\nTabla guardada en {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -19,6 +19,11 @@ class StructuralConstraints:
     min_ok_far: Optional[int] = None  # min miembros por cluster en zona lejana (ej. 6)
     pair_radius_m: Optional[float] = None  # radio (m) para reabsorber residual en paradas; mayor = más cobertura
     assign_by_stop_radius_after: Optional[bool] = None  # True = segundo paso: asignar residual por distancia a centro de parada
+    split_method: Optional[str] = None  # clusters > max_ok: "balanced" (defecto, bisección eje principal) | "kmeans" (V4)
+    residual_assignment: Optional[str] = None  # segundo paso: "greedy" (defecto, orden por índice) | "min_cost" (máx. asignados, mín. distancia)
+    candidate_sites: Optional[str] = None  # centros candidatos del greedy: "employees" (defecto, V4) | "grid" (un representante por celda)
+    site_grid_m: Optional[float] = None  # lado (m) de la celda para candidate_sites="grid" (defecto 100)
+    snap_tolerance_m: Optional[float] = None  # coreset: agrupa domicilios a < tolerancia (m) en puntos con peso para el greedy; 0 = solo idénticos
 
 
 @dataclass(frozen=True)
@@ -52,3 +57,4 @@ class CarpoolMatchConfig:
     max_drivers_per_mp: int = 40
     min_passengers_per_driver: int = 1
     do_2opt: bool = True
+    snap_tolerance_m: Optional[float] = None  # coreset para DBSCAN de MPs: domicilios a < tolerancia (m) como un punto con peso; None = desactivado
@@ -14,8 +14,17 @@ class Employee:
     willing_driver: bool
     # Opcional: minuto del día (desde medianoche) para ventana de llegada; usado en carpool (prioridad app/empleado).
     hora_obj_min: Optional[float] = None
-    # Opcional: minuto del día (desde medianoche) para ventana de llegada; usado en carpool (prioridad app/empleado).
-    hora_obj_min: Optional[float] = None
+    # Opcional: oficina de destino. None = oficina por defecto del plan (multi-sede: agrupa por esta coordenada).
+    work_lat: Optional[float] = None
+    work_lng: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class CensusDelta:
+    """Cambios de censo entre dos planificaciones (overrides de app, altas, bajas)."""
+    moved: List[Employee]  # mismo employee_id, datos nuevos (casa, conductor, hora)
+    added: List[Employee]
+    removed: List[str]  # employee_id
 
 
 @dataclass(frozen=True)
@@ -140,6 +149,8 @@ class CarpoolMatchResult:
     n_unmatched: int
     duration_ms: float
     unmatched_reasons: Optional[dict] = None  # pax_id -> "no_candidate" | "trimmed_by_detour"
+    n_snap_points: Optional[int] = None  # puntos con peso del DBSCAN de MPs (config.snap_tolerance_m)
+    snap_max_error_m: Optional[float] = None  # distancia máx. (m) domicilio -> punto con peso
 
 
 @dataclass(frozen=True)
@@ -0,0 +1,215 @@
+"""
+V6 contraction hierarchy (CH) sobre un RoadGraph, para consultas muchos-a-muchos.
+
+Preproceso (offline, una vez por grafo): se contraen los nodos por orden de
+importancia (edge difference + vecinos contraídos, con actualización perezosa);
+al contraer v se añade un atajo u→w cuando la búsqueda de testigo (Dijkstra
+local acotado sin pasar por v) no encuentra un camino u→w tan corto como
+u→v→w. Queda un grafo "hacia arriba" (aristas a nodos de mayor rango) en dos
+CSR: salientes (búsqueda desde orígenes) y entrantes invertidas (desde destinos).
+
+Consulta por buckets: una búsqueda hacia arriba por destino deja (destino,
+dist) en el bucket de cada nodo alcanzado; una búsqueda hacia arriba por origen
+recorre los buckets de sus nodos y toma el mínimo. Por lote de nodos, un
+Dijkstra de csgraph con min_only (una sola fila de n) da el conjunto alcanzable
+hacia arriba, cerrado por aristas salientes; las búsquedas por nodo corren
+sobre ese subgrafo (cientos de nodos en lugar de n), así que ni el tiempo ni la
+memoria por búsqueda crecen con el grafo. El cruce con los buckets se hace por
+lotes en NumPy. Se guarda como .npz con la huella del grafo.
+"""
+
+import heapq
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from backend.v6.infrastructure.road_network import DIJKSTRA_BATCH, RoadGraph
+
+CH_WITNESS_SETTLE_LIMIT = 60  # nodos asentados por búsqueda de testigo (más = menos atajos, más lento)
+CH_TARGET_BATCH = 256  # destinos por lote de buckets (acota memoria: nodos tocados × lote)
+_CH_FORMAT_VERSION = 1
+
+
+def _witness_dists(
+    out_adj: List[Dict[int, float]], u: int, skip: int, max_d: float, limit: int
+) -> Dict[int, float]:
+    """Dijkstra desde u sin pasar por skip, hasta max_d o limit nodos asentados."""
+    dist = {u: 0.0}
+    heap = [(0.0, u)]
+    settled = 0
+    while heap and settled < limit:
+        d, x = heapq.heappop(heap)
+        if d > dist[x]:
+            continue
+        if d > max_d:
+            break
+        settled += 1
+        for y, w in out_adj[x].items():
+            if y == skip:
+                continue
+            nd = d + w
+            if nd < dist.get(y, np.inf):
+                dist[y] = nd
+                heapq.heappush(heap, (nd, y))
+    return dist
+
+
+def _shortcuts(
+    out_adj: List[Dict[int, float]], in_adj: List[Dict[int, float]], v: int, limit: int
+) -> List[Tuple[int, int, float]]:
+    """Atajos (u, w, peso) necesarios para contraer v."""
+    out: List[Tuple[int, int, float]] = []
+    if not in_adj[v] or not out_adj[v]:
+        return out
+    max_vw = max(out_adj[v].values())
+    for u, d_uv in in_adj[v].items():
+        dist = _witness_dists(out_adj, u, v, d_uv + max_vw, limit)
+        for w, d_vw in out_adj[v].items():
+            if w != u and dist.get(w, np.inf) > d_uv + d_vw:
+                out.append((u, w, d_uv + d_vw))
+    return out
+
+
+def _csr(n: int, rows: List[List[Tuple[int, float]]]) -> csr_matrix:
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(r) for r in rows])
+    indices = np.array([c for r in rows for c, _ in r], dtype=np.int64)
+    data = np.array([w for r in rows for _, w in r], dtype=float)
+    return csr_matrix((data, indices, indptr), shape=(n, n))
+
+
+class ContractionHierarchy:
+    """rank[v] = orden de contracción; up / down = CSR hacia arriba (salientes / entrantes invertidas)."""
+
+    def __init__(self, rank: np.ndarray, up: csr_matrix, down: csr_matrix, graph_fingerprint: str):
+        self.rank = rank
+        self.up = up
+        self.down = down
+        self.graph_fingerprint = graph_fingerprint
+
+    @classmethod
+    def build(cls, graph: RoadGraph, witness_limit: int = CH_WITNESS_SETTLE_LIMIT) -> "ContractionHierarchy":
+        n = graph.n_nodes
+        adj = graph.adj.tocoo()
+        out_adj: List[Dict[int, float]] = [dict() for _ in range(n)]
+        in_adj: List[Dict[int, float]] = [dict() for _ in range(n)]
+        for u, w, d in zip(adj.row.tolist(), adj.col.tolist(), adj.data.tolist()):
+            out_adj[u][w] = d
+            in_adj[w][u] = d
+        deleted = [0] * n
+
+        def priority(v: int) -> int:
+            n_sc = len(_shortcuts(out_adj, in_adj, v, witness_limit))
+            return n_sc - len(in_adj[v]) - len(out_adj[v]) + deleted[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = np.full(n, -1, dtype=np.int64)
+        up_rows: List[List[Tuple[int, float]]] = [[] for _ in range(n)]
+        down_rows: List[List[Tuple[int, float]]] = [[] for _ in range(n)]
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if rank[v] >= 0:
+                continue
+            # Actualización perezosa: si la prioridad empeoró, vuelve a la cola.
+            p = priority(v)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, v))
+                continue
+            for u, w, d in _shortcuts(out_adj, in_adj, v, witness_limit):
+                if d < out_adj[u].get(w, np.inf):
+                    out_adj[u][w] = d
+                    in_adj[w][u] = d
+            rank[v] = order
+            order += 1
+            # Vecinos aún sin contraer = nodos de mayor rango: aristas hacia arriba de v.
+            up_rows[v] = sorted(out_adj[v].items())
+            down_rows[v] = sorted(in_adj[v].items())
+            for w in out_adj[v]:
+                del in_adj[w][v]
+                deleted[w] += 1
+            for u in in_adj[v]:
+                del out_adj[u][v]
+                deleted[u] += 1
+            out_adj[v], in_adj[v] = {}, {}
+        return cls(rank, _csr(n, up_rows), _csr(n, down_rows), graph.fingerprint())
+
+    @staticmethod
+    def _upward(csr: csr_matrix, nodes: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Búsqueda hacia arriba desde cada nodo: (nodos alcanzados, distancias)."""
+        out: List[Tuple[np.ndarray, np.ndarray]] = []
+        for b in range(0, len(nodes), DIJKSTRA_BATCH):
+            batch = nodes[b : b + DIJKSTRA_BATCH]
+            # Alcanzables desde el lote: sus distancias no salen del subgrafo.
+            closest = dijkstra(csr, directed=True, indices=batch, min_only=True)
+            reach = np.flatnonzero(np.isfinite(closest))
+            sub = csr[reach][:, reach]
+            rows = dijkstra(sub, directed=True, indices=np.searchsorted(reach, batch))
+            for row in np.atleast_2d(rows):
+                reached = np.flatnonzero(np.isfinite(row))
+                out.append((reach[reached], row[reached]))
+        return out
+
+    def many_to_many(self, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """Segundos por red de cada nodo de sources a cada nodo de targets (inf = no alcanzable)."""
+        src_u, src_inv = np.unique(np.asarray(sources, dtype=np.int64), return_inverse=True)
+        tgt_u, tgt_inv = np.unique(np.asarray(targets, dtype=np.int64), return_inverse=True)
+        fwd = self._upward(self.up, src_u)
+        out = np.full((len(src_u), len(tgt_u)), np.inf)
+        pos = np.full(len(self.rank), -1, dtype=np.int64)
+        for t0 in range(0, len(tgt_u), CH_TARGET_BATCH):
+            bwd = self._upward(self.down, tgt_u[t0 : t0 + CH_TARGET_BATCH])
+            # Buckets del lote: fila por nodo alcanzado por algún destino, columna por destino.
+            touched = np.unique(np.concatenate([n for n, _ in bwd]))
+            buckets = np.full((len(touched), len(bwd)), np.inf)
+            for j, (nodes, dist) in enumerate(bwd):
+                buckets[np.searchsorted(touched, nodes), j] = dist
+            pos[touched] = np.arange(len(touched))
+            for i, (nodes, dist) in enumerate(fwd):
+                k = pos[nodes]
+                hit = k >= 0
+                if hit.any():
+                    out[i, t0 : t0 + len(bwd)] = (dist[hit][:, None] + buckets[k[hit]]).min(axis=0)
+            pos[touched] = -1
+        return out[np.ix_(src_inv.ravel(), tgt_inv.ravel())]
+
+    def save(self, path: Path) -> None:
+        np.savez(
+            path,
+            version=_CH_FORMAT_VERSION,
+            graph_fingerprint=self.graph_fingerprint,
+            rank=self.rank,
+            up_indptr=self.up.indptr, up_indices=self.up.indices, up_data=self.up.data,
+            down_indptr=self.down.indptr, down_indices=self.down.indices, down_data=self.down.data,
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "ContractionHierarchy":
+        with np.load(path) as z:
+            if int(z["version"]) != _CH_FORMAT_VERSION:
+                raise ValueError(f"formato de CH obsoleto en {path}")
+            n = len(z["rank"])
+            up = csr_matrix((z["up_data"], z["up_indices"], z["up_indptr"]), shape=(n, n))
+            down = csr_matrix((z["down_data"], z["down_indices"], z["down_indptr"]), shape=(n, n))
+            return cls(z["rank"], up, down, str(z["graph_fingerprint"]))
+
+
+def load_or_build_hierarchy(graph: RoadGraph, cache_dir: Optional[Path] = None) -> ContractionHierarchy:
+    """CH del grafo; con cache_dir se reutiliza ch_<huella del grafo>.npz o se construye y guarda."""
+    path = None
+    if cache_dir is not None:
+        path = Path(cache_dir) / f"ch_{graph.fingerprint()}.npz"
+        if path.exists():
+            return ContractionHierarchy.load(path)
+    ch = ContractionHierarchy.build(graph)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp.npz")
+        ch.save(tmp)
+        os.replace(tmp, path)
+    return ch
@@ -0,0 +1,218 @@
+"""
+V6 matrices de tiempos (segundos) para Block 5 y comparativas.
+
+Un proveedor (DurationMatrixProvider) calcula tiempos origen × destino; el de
+por defecto es Haversine + velocidad constante, vectorizado con NumPy.
+build_duration_matrix construye la matriz paradas + oficina (convención V4:
+oficina = último índice) y, con cache_dir, la memoiza en disco como .npy
+(float32, abierta con memory map) con clave = hash de proveedor + coordenadas.
+DurationMatrixStore mantiene una matriz incremental por identidad de nodo:
+entre rediseños solo se calculan las filas/columnas de paradas nuevas.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Protocol, Tuple
+
+import numpy as np
+
+R_KM = 6371.0
+
+
+class DurationMatrixProvider(Protocol):
+    """Tiempos de viaje en segundos entre puntos (lat, lng)."""
+
+    def durations_s(self, origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        """origins (N, 2), destinations (M, 2) en grados → (N, M) float32 en segundos."""
+        ...
+
+    def cache_key(self) -> str:
+        """Identifica proveedor y parámetros (forma parte de la clave de caché)."""
+        ...
+
+
+def haversine_km_arrays(
+    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
+) -> np.ndarray:
+    """Haversine (km) elemento a elemento con broadcasting, misma fórmula que haversine_km."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return R_KM * 2 * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def haversine_km_matrix(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """Haversine (km) de cada origen (N, 2) a cada destino (M, 2) → (N, M)."""
+    return haversine_km_arrays(
+        origins[:, 0][:, None], origins[:, 1][:, None],
+        destinations[:, 0][None, :], destinations[:, 1][None, :],
+    )
+
+
+class HaversineProvider:
+    """Línea recta a velocidad constante (por defecto 30 km/h, como V4)."""
+
+    def __init__(self, speed_kmh: float = 30.0):
+        self.speed_kmh = max(1.0, speed_kmh)
+
+    def durations_s(self, origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        km = haversine_km_matrix(origins, destinations)
+        return (km / self.speed_kmh * 3600.0).astype(np.float32)
+
+    def cache_key(self) -> str:
+        return f"haversine:{self.speed_kmh!r}"
+
+
+def _matrix_key(provider: DurationMatrixProvider, nodes: np.ndarray) -> str:
+    h = hashlib.sha256(provider.cache_key().encode("utf-8"))
+    h.update(np.ascontiguousarray(nodes, dtype=np.float64).tobytes())
+    return h.hexdigest()[:32]
+
+
+def build_duration_matrix(
+    stops_coords: List[Tuple[float, float]],
+    office_lat: float,
+    office_lng: float,
+    provider: Optional[DurationMatrixProvider] = None,
+    cache_dir: Optional[Path] = None,
+) -> Tuple[np.ndarray, int]:
+    """
+    Matriz D (N×N, segundos, float32) con N = S + 1: paradas 0..S-1 y oficina = S.
+    Diagonal a 0. provider None = HaversineProvider(). Con cache_dir, si ya existe
+    la matriz de (proveedor, paradas, oficina) se abre con memory map (solo lectura);
+    si no, se calcula y se guarda.
+    """
+    provider = provider or HaversineProvider()
+    nodes = np.array(list(stops_coords) + [(office_lat, office_lng)], dtype=float)
+    office_idx = len(stops_coords)
+    path = None
+    if cache_dir is not None:
+        path = Path(cache_dir) / f"{_matrix_key(provider, nodes)}.npy"
+        if path.exists():
+            return np.load(path, mmap_mode="r"), office_idx
+
+    D = np.asarray(provider.durations_s(nodes, nodes), dtype=np.float32)
+    np.fill_diagonal(D, 0.0)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp.npy")
+        np.save(tmp, D)
+        os.replace(tmp, path)  # atómico: otro proceso nunca ve un .npy a medias
+        return np.load(path, mmap_mode="r"), office_idx
+    return D, office_idx
+
+
+class DurationMatrixStore:
+    """
+    Matriz de tiempos incremental con identidad estable por nodo (coordenadas
+    redondeadas a 1e-7 grados). Al pedir un conjunto de paradas + oficina solo
+    se calculan las filas/columnas de los nodos nuevos; los nodos retirados
+    liberan su hueco (se reutiliza sin recalcular el resto). Con path se
+    persiste entre ejecuciones (rediseño semanal: solo paradas nuevas).
+    """
+
+    def __init__(self, provider: DurationMatrixProvider, path: Optional[Path] = None):
+        self.provider = provider
+        self.path = None if path is None else Path(path)
+        self._coords = np.zeros((0, 2))
+        self._M = np.zeros((0, 0), dtype=np.float32)
+        self._slot: Dict[Tuple[float, float], int] = {}
+        self._free: List[int] = []
+        self.n_computed = 0  # pares (origen, destino) pedidos al proveedor
+
+    @classmethod
+    def open(cls, provider: DurationMatrixProvider, cache_dir: Path) -> "DurationMatrixStore":
+        """Store persistido en cache_dir para este proveedor (vacío si aún no existe)."""
+        key = hashlib.sha256(provider.cache_key().encode("utf-8")).hexdigest()[:32]
+        store = cls(provider, Path(cache_dir) / f"store_{key}.npz")
+        if store.path.exists():
+            with np.load(store.path) as z:
+                store._coords = z["coords"]
+                store._M = z["matrix"]
+            alive = ~np.isnan(store._coords[:, 0])
+            store._slot = {
+                cls.key(lat, lng): int(i)
+                for i, (lat, lng) in zip(np.flatnonzero(alive), store._coords[alive])
+            }
+            store._free = sorted(np.flatnonzero(~alive).tolist(), reverse=True)
+        return store
+
+    @staticmethod
+    def key(lat: float, lng: float) -> Tuple[float, float]:
+        return round(float(lat), 7), round(float(lng), 7)
+
+    def __len__(self) -> int:
+        return len(self._slot)
+
+    def _grow(self, n: int) -> None:
+        cap = len(self._coords)
+        new_cap = max(cap + n, 2 * cap)
+        M = np.zeros((new_cap, new_cap), dtype=np.float32)
+        M[:cap, :cap] = self._M
+        self._M = M
+        self._coords = np.vstack([self._coords, np.full((new_cap - cap, 2), np.nan)])
+        self._free = list(range(new_cap - 1, cap - 1, -1)) + self._free
+
+    def add(self, coords: List[Tuple[float, float]]) -> np.ndarray:
+        """Hueco de cada punto; calcula solo filas y columnas de los puntos nuevos."""
+        new: List[int] = []
+        for lat, lng in coords:
+            k = self.key(lat, lng)
+            if k not in self._slot:
+                if not self._free:
+                    self._grow(len(coords))
+                i = self._free.pop()
+                self._slot[k] = i
+                self._coords[i] = (lat, lng)
+                new.append(i)
+        if new:
+            new_a = np.array(new, dtype=np.int64)
+            alive = np.array(sorted(self._slot.values()), dtype=np.int64)
+            old = np.setdiff1d(alive, new_a)
+            self._M[np.ix_(new_a, alive)] = self.provider.durations_s(self._coords[new_a], self._coords[alive])
+            self._M[np.ix_(old, new_a)] = self.provider.durations_s(self._coords[old], self._coords[new_a])
+            self._M[new_a, new_a] = 0.0
+            self.n_computed += len(new_a) * len(alive) + len(old) * len(new_a)
+        return np.array([self._slot[self.key(lat, lng)] for lat, lng in coords], dtype=np.int64)
+
+    def retain(self, coords: List[Tuple[float, float]]) -> None:
+        """Retira los nodos que no están en coords (su hueco queda libre, sin recalcular nada)."""
+        keep = {self.key(lat, lng) for lat, lng in coords}
+        for k in [k for k in self._slot if k not in keep]:
+            i = self._slot.pop(k)
+            self._coords[i] = np.nan
+            self._free.append(i)
+
+    def matrix(
+        self,
+        stops_coords: List[Tuple[float, float]],
+        office_lat: float,
+        office_lng: float,
+        prune: bool = False,
+    ) -> Tuple[np.ndarray, int]:
+        """
+        (D, office_idx) como build_duration_matrix, reindexada desde el store.
+        Si los huecos ya están en orden 0..S es una vista sin copia (válida hasta
+        la siguiente modificación del store); si no, se extrae la submatriz
+        (memcpy, sin llamadas al proveedor). prune retira del store los nodos
+        que no se han pedido.
+        """
+        nodes = list(stops_coords) + [(office_lat, office_lng)]
+        slots = self.add(nodes)
+        if prune:
+            self.retain(nodes)
+        n = len(slots)
+        if np.array_equal(slots, np.arange(n)):
+            return self._M[:n, :n], n - 1
+        return self._M[np.ix_(slots, slots)], n - 1
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp.npz")
+        np.savez(tmp, coords=self._coords, matrix=self._M)
+        os.replace(tmp, self.path)
@@ -0,0 +1,155 @@
+"""
+V6 matrices de tiempos por hora de salida (perfiles K × N × N).
+
+Un TimeDependentProvider da tiempos para una hora de salida concreta; el de
+referencia es PeakProfileProvider: un proveedor plano (Haversine o red viaria)
+multiplicado por un factor de congestión interpolado por hora (p. ej.
+"07:30=1.15,08:30=1.45,09:30=1.10"). build_duration_profile genera las K
+franjas paradas + oficina y, con cache_dir, las escribe franja a franja en un
+.npy con memory map (memoria acotada a una franja) que se reabre en solo lectura.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from backend.v6.core.duration_profile import DurationProfile
+from backend.v6.infrastructure.duration_matrix import DurationMatrixProvider
+
+
+class TimeDependentProvider(Protocol):
+    """Tiempos de viaje en segundos para una hora de salida (minutos desde medianoche)."""
+
+    def durations_s_at(
+        self, origins: np.ndarray, destinations: np.ndarray, departure_min: float
+    ) -> np.ndarray:
+        ...
+
+    def cache_key(self) -> str:
+        ...
+
+
+def parse_peak_profile(value: str) -> List[Tuple[float, float]]:
+    """'07:30=1.2,08:30=1.45' → [(450.0, 1.2), (510.0, 1.45)] ordenado por hora."""
+    out: List[Tuple[float, float]] = []
+    for item in value.split(","):
+        hhmm, _, factor = item.strip().partition("=")
+        h, _, m = hhmm.strip().partition(":")
+        if not factor or not m:
+            raise ValueError(f"franja de perfil inválida: {item!r} (formato HH:MM=factor)")
+        out.append((float(int(h) * 60 + int(m)), float(factor)))
+    return sorted(out)
+
+
+class PeakProfileProvider:
+    """
+    Tiempo a la hora t = tiempo del proveedor base × factor(t), con factor
+    interpolado linealmente entre las franjas de profile (constante fuera).
+    """
+
+    def __init__(self, base: DurationMatrixProvider, profile: Sequence[Tuple[float, float]]):
+        if not profile:
+            raise ValueError("profile vacío")
+        self.base = base
+        self.profile = sorted((float(t), float(f)) for t, f in profile)
+        self._last: Optional[Tuple[bytes, np.ndarray]] = None  # base de la última consulta (K franjas = 1 cálculo)
+
+    @property
+    def departure_min(self) -> np.ndarray:
+        """Horas de las franjas (las del perfil), útiles como cortes del DurationProfile."""
+        return np.array([t for t, _ in self.profile])
+
+    def factor(self, departure_min: float) -> float:
+        return float(np.interp(departure_min, *zip(*self.profile)))
+
+    def durations_s_at(
+        self, origins: np.ndarray, destinations: np.ndarray, departure_min: float
+    ) -> np.ndarray:
+        origins, destinations = np.asarray(origins, dtype=float), np.asarray(destinations, dtype=float)
+        key = origins.tobytes() + b"|" + destinations.tobytes()
+        if self._last is None or self._last[0] != key:
+            self._last = (key, np.asarray(self.base.durations_s(origins, destinations), dtype=float))
+        return (self._last[1] * self.factor(departure_min)).astype(np.float32)
+
+    def cache_key(self) -> str:
+        return f"peak:{self.base.cache_key()}:{self.profile!r}"
+
+
+def build_duration_profile(
+    stops_coords: List[Tuple[float, float]],
+    office_lat: float,
+    office_lng: float,
+    departure_min: Sequence[float],
+    provider: TimeDependentProvider,
+    cache_dir: Optional[Path] = None,
+    dtype: type = np.float32,
+) -> Tuple[DurationProfile, int]:
+    """
+    Perfil (K, N, N) con N = S + 1 (oficina = S), una franja por hora de
+    departure_min (creciente), diagonal a 0. dtype float16 reduce a la mitad
+    el disco (paso de ~2 s a una hora de viaje). Con cache_dir se reutiliza o
+    se escribe <hash>.npy franja a franja y se devuelve abierto con memory map.
+    """
+    minutes = np.asarray(departure_min, dtype=float)
+    nodes = np.array(list(stops_coords) + [(office_lat, office_lng)], dtype=float)
+    office_idx = len(stops_coords)
+    shape = (len(minutes), len(nodes), len(nodes))
+
+    def fill(out: np.ndarray) -> None:
+        for k, t in enumerate(minutes):
+            T = np.asarray(provider.durations_s_at(nodes, nodes, float(t)), dtype=float)
+            np.fill_diagonal(T, 0.0)
+            out[k] = T
+
+    if cache_dir is None:
+        slices = np.empty(shape, dtype=dtype)
+        fill(slices)
+        return DurationProfile(minutes, slices), office_idx
+
+    h = hashlib.sha256(provider.cache_key().encode("utf-8"))
+    for a in (nodes, minutes):
+        h.update(np.ascontiguousarray(a, dtype=np.float64).tobytes())
+    h.update(np.dtype(dtype).str.encode("utf-8"))
+    path = Path(cache_dir) / f"profile_{h.hexdigest()[:32]}.npy"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp.npy")
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=shape)
+        fill(out)
+        out.flush()
+        del out
+        os.replace(tmp, path)
+    return DurationProfile(minutes, np.load(path, mmap_mode="r")), office_idx
+
+
+class ProfiledCarpoolAdapter:
+    """
+    CarpoolTimeAdapter que añade tt_min_profile: tiempos (min) en las franjas
+    departure_min según provider. tt_min, walk_dist_m (y tt_min_matrix si
+    existe) siguen siendo los del adapter base (tiempos libres).
+    """
+
+    def __init__(self, base, provider: TimeDependentProvider, departure_min: Sequence[float]):
+        self.base = base
+        self.provider = provider
+        self.departure_min = np.asarray(departure_min, dtype=float)
+        if hasattr(base, "tt_min_matrix"):
+            self.tt_min_matrix = base.tt_min_matrix
+
+    def tt_min(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        return self.base.tt_min(lat1, lon1, lat2, lon2)
+
+    def walk_dist_m(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        return self.base.walk_dist_m(lat1, lon1, lat2, lon2)
+
+    def tt_min_profile(
+        self, lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
+    ) -> DurationProfile:
+        a, b = np.c_[lat1, lon1], np.c_[lat2, lon2]
+        slices = np.stack(
+            [self.provider.durations_s_at(a, b, float(t)) for t in self.departure_min]
+        ).astype(np.float32) / 60.0
+        return DurationProfile(self.departure_min, slices)
@@ -2,10 +2,10 @@
 V6 population loader. Raw dict -> domain Employee. Merge empresa + overrides (app).
 """
 
-from backend.v6.domain.models import Employee
+from backend.v6.domain.models import CensusDelta, Employee
 
 
-def _parse_arrival_to_minutes(value: str | None) -> float | None:
+def parse_arrival_to_minutes(value: str | None) -> float | None:
     """Convierte 'HH:MM' a minutos desde medianoche. None si vacío o inválido."""
     if not value or not isinstance(value, str):
         return None
@@ -24,11 +24,24 @@ def _parse_arrival_to_minutes(value: str | None) -> float | None:
     return None
 
 
+def _parse_work_location(raw: dict) -> tuple[float | None, float | None]:
+    """work_lat/work_lng; (0, 0) o ausente = sin oficina propia (se usa la del plan)."""
+    lat = raw.get("work_lat")
+    lng = raw.get("work_lng")
+    if lat is None or lng is None:
+        return None, None
+    lat, lng = float(lat), float(lng)
+    if lat == 0.0 and lng == 0.0:
+        return None, None
+    return lat, lng
+
+
 def load_employees(raw_employees: list[dict]) -> list[Employee]:
     """Transform raw list of dicts into list[Employee]. Acepta arrival_window_start para hora_obj_min."""
     result: list[Employee] = []
     for raw in raw_employees:
-        hora = _parse_arrival_to_minutes(raw.get("arrival_window_start"))
+        hora = parse_arrival_to_minutes(raw.get("arrival_window_start"))
+        work_lat, work_lng = _parse_work_location(raw)
         result.append(
             Employee(
                 employee_id=str(raw.get("employee_id", "")),
@@ -36,6 +49,8 @@ def load_employees(raw_employees: list[dict]) -> list[Employee]:
                 home_lng=float(raw.get("home_lng", 0.0)),
                 willing_driver=bool(raw.get("willing_driver", False)),
                 hora_obj_min=hora,
+                work_lat=work_lat,
+                work_lng=work_lng,
             )
         )
     return result
@@ -69,7 +84,7 @@ def build_census_with_overrides(
         willing_driver = o.get("willing_driver")
         hora = o.get("hora_obj_min")
         if hora is None and o.get("arrival_window_start") is not None:
-            hora = _parse_arrival_to_minutes(str(o["arrival_window_start"]))
+            hora = parse_arrival_to_minutes(str(o["arrival_window_start"]))
         out.append(
             Employee(
                 employee_id=e.employee_id,
@@ -77,6 +92,22 @@ def build_census_with_overrides(
                 home_lng=float(home_lng) if home_lng is not None else e.home_lng,
                 willing_driver=bool(willing_driver) if willing_driver is not None else e.willing_driver,
                 hora_obj_min=float(hora) if hora is not None else e.hora_obj_min,
+                work_lat=e.work_lat,
+                work_lng=e.work_lng,
             )
         )
     return out
+
+
+def census_delta(previous: list[Employee], current: list[Employee]) -> CensusDelta:
+    """
+    Diferencia entre dos censos por employee_id (p. ej. base vs build_census_with_overrides):
+    moved = presentes en ambos con algún dato distinto; added / removed = altas y bajas.
+    """
+    prev_by_id = {e.employee_id: e for e in previous}
+    curr_ids = {e.employee_id for e in current}
+    return CensusDelta(
+        moved=[e for e in current if e.employee_id in prev_by_id and e != prev_by_id[e.employee_id]],
+        added=[e for e in current if e.employee_id not in prev_by_id],
+        removed=[e.employee_id for e in previous if e.employee_id not in curr_ids],
+    )
@@ -0,0 +1,336 @@
+"""
+V6 red viaria offline: tiempos de viaje sobre un grafo local (sin red en runtime).
+
+Formatos de entrada:
+  - GraphML estilo OSMnx (nodos con x/y; aristas con travel_time, o length +
+    speed_kph/maxspeed). Un extracto .osm.pbf se convierte antes a GraphML
+    (p. ej. osmnx.graph_from_xml + save_graphml) fuera del proceso de diseño.
+  - CSV de aristas: u_lat, u_lng, v_lat, v_lng y opcionales length_m,
+    travel_time_s, speed_kmh, oneway (sin oneway = doble sentido).
+
+El grafo preprocesado (CSR de segundos + coordenadas de nodos) se guarda como
+.npz junto a la clave del fichero fuente, de modo que arrancar es leer arrays.
+Consultas muchos-a-muchos: Dijkstra de scipy.sparse.csgraph por lotes de
+orígenes, con límite opcional (cutoff_s). Cada punto se engancha al nodo más
+cercano y el tramo punto↔nodo se cuenta en línea recta a connector_speed_kmh.
+"""
+
+import hashlib
+import math
+import os
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import KDTree
+
+from backend.v6.infrastructure.duration_matrix import R_KM, haversine_km_arrays, haversine_km_matrix
+
+DEFAULT_ROAD_SPEED_KMH = 30.0  # aristas sin travel_time ni velocidad
+DIJKSTRA_BATCH = 64  # orígenes por llamada a dijkstra (acota memoria: batch × n_nodos)
+_GRAPH_FORMAT_VERSION = 1  # subir si cambia el preprocesado (invalida la caché .npz)
+
+
+class RoadGraph:
+    """Grafo dirigido: adj[u, v] = segundos de la arista u→v (mínimo entre paralelas)."""
+
+    def __init__(self, node_lat: np.ndarray, node_lng: np.ndarray, adj: csr_matrix):
+        self.node_lat = np.asarray(node_lat, dtype=float)
+        self.node_lng = np.asarray(node_lng, dtype=float)
+        self.adj = adj.tocsr()
+        # Proyección equirectangular local (m) para enganchar puntos al nodo más cercano.
+        self._cos_lat = math.cos(math.radians(float(self.node_lat.mean()))) if len(node_lat) else 1.0
+        self._tree = KDTree(self._project(self.node_lat, self.node_lng))
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_lat)
+
+    def _project(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        k = R_KM * 1000.0 * math.pi / 180.0
+        return np.column_stack([np.asarray(lat) * k, np.asarray(lng) * k * self._cos_lat])
+
+    def fingerprint(self) -> str:
+        """Hash del contenido del grafo (parte de las claves de caché de matrices)."""
+        if self._fingerprint is None:
+            h = hashlib.sha256()
+            for a in (self.node_lat, self.node_lng, self.adj.indptr, self.adj.indices, self.adj.data):
+                h.update(np.ascontiguousarray(a).tobytes())
+            self._fingerprint = h.hexdigest()[:16]
+        return self._fingerprint
+
+    def nearest_nodes(self, lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(nodo más cercano, distancia en m) para cada punto."""
+        dist, idx = self._tree.query(self._project(lat, lng))
+        return np.asarray(idx, dtype=np.int64), np.asarray(dist, dtype=float)
+
+    def node_durations_s(
+        self, src: np.ndarray, dst: np.ndarray, cutoff_s: Optional[float] = None
+    ) -> np.ndarray:
+        """Segundos por red de cada nodo src a cada nodo dst ((len(src), len(dst)); inf = no alcanzable)."""
+        src_u, src_inv = np.unique(src, return_inverse=True)
+        out = np.empty((len(src_u), len(dst)), dtype=float)
+        limit = np.inf if cutoff_s is None else cutoff_s
+        for b in range(0, len(src_u), DIJKSTRA_BATCH):
+            rows = dijkstra(self.adj, directed=True, indices=src_u[b : b + DIJKSTRA_BATCH], limit=limit)
+            out[b : b + DIJKSTRA_BATCH] = rows[:, dst]
+        return out[src_inv.ravel()]
+
+    def save(self, path: Path) -> None:
+        np.savez(
+            path,
+            version=_GRAPH_FORMAT_VERSION,
+            node_lat=self.node_lat,
+            node_lng=self.node_lng,
+            indptr=self.adj.indptr,
+            indices=self.adj.indices,
+            data=self.adj.data,
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "RoadGraph":
+        with np.load(path) as z:
+            if int(z["version"]) != _GRAPH_FORMAT_VERSION:
+                raise ValueError(f"formato de grafo obsoleto en {path}")
+            n = len(z["node_lat"])
+            adj = csr_matrix((z["data"], z["indices"], z["indptr"]), shape=(n, n))
+            return cls(z["node_lat"], z["node_lng"], adj)
+
+
+def _graph_from_edges(
+    node_lat: np.ndarray,
+    node_lng: np.ndarray,
+    u: np.ndarray,
+    v: np.ndarray,
+    seconds: np.ndarray,
+) -> RoadGraph:
+    """CSR con el mínimo entre aristas paralelas (coo→csr sumaría duplicados)."""
+    n = len(node_lat)
+    keep = u != v
+    u, v, seconds = u[keep], v[keep], seconds[keep]
+    order = np.lexsort((seconds, v, u))
+    u, v, seconds = u[order], v[order], seconds[order]
+    first = np.ones(len(u), dtype=bool)
+    first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+    # En csgraph un peso 0 puede leerse como "sin arista": suelo positivo para aristas degeneradas.
+    seconds = np.maximum(seconds[first], 1e-3)
+    adj = csr_matrix((seconds, (u[first], v[first])), shape=(n, n))
+    return RoadGraph(node_lat, node_lng, adj)
+
+
+def _edge_seconds(
+    length_m: np.ndarray, travel_time_s: np.ndarray, speed_kmh: np.ndarray
+) -> np.ndarray:
+    """travel_time_s si existe; si no, length_m a speed_kmh (DEFAULT_ROAD_SPEED_KMH si falta)."""
+    speed = np.where(np.isfinite(speed_kmh) & (speed_kmh > 0), speed_kmh, DEFAULT_ROAD_SPEED_KMH)
+    return np.where(np.isfinite(travel_time_s), travel_time_s, length_m / (speed / 3.6))
+
+
+def _float_or_nan(value: Optional[str]) -> float:
+    """'50', '50 mph' o "['30', '50']" (maxspeed de OSM) → float; vacío o ilegible → nan."""
+    if value is None:
+        return math.nan
+    value = value.strip().strip("[]").split(",")[0].strip().strip("'\"")
+    factor = 1.609344 if value.endswith("mph") else 1.0
+    try:
+        return float(value.replace("mph", "").replace("km/h", "").strip()) * factor
+    except ValueError:
+        return math.nan
+
+
+def _is_true(value: Optional[str]) -> bool:
+    return value is not None and value.strip().lower() in ("1", "true", "yes")
+
+
+def load_edge_list_csv(path: Path) -> RoadGraph:
+    """CSV de aristas (ver docstring del módulo). Nodos = coordenadas únicas (1e-7 grados)."""
+    import csv
+
+    rows: List[Dict[str, str]] = []
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    ends = np.array(
+        [[float(r["u_lat"]), float(r["u_lng"]), float(r["v_lat"]), float(r["v_lng"])] for r in rows],
+        dtype=float,
+    ).reshape(-1, 4)
+    coords = np.round(np.vstack([ends[:, :2], ends[:, 2:]]), 7)
+    nodes, inv = np.unique(coords, axis=0, return_inverse=True)
+    inv = inv.ravel()
+    u, v = inv[: len(rows)], inv[len(rows) :]
+    length = np.array([_float_or_nan(r.get("length_m")) for r in rows], dtype=float)
+    missing = ~np.isfinite(length)
+    if missing.any():
+        length[missing] = haversine_km_arrays(*ends[missing].T) * 1000.0
+    seconds = _edge_seconds(
+        length,
+        np.array([_float_or_nan(r.get("travel_time_s")) for r in rows], dtype=float),
+        np.array([_float_or_nan(r.get("speed_kmh")) for r in rows], dtype=float),
+    )
+    two_way = np.array([not _is_true(r.get("oneway")) for r in rows], dtype=bool)
+    return _graph_from_edges(
+        nodes[:, 0],
+        nodes[:, 1],
+        np.concatenate([u, v[two_way]]),
+        np.concatenate([v, u[two_way]]),
+        np.concatenate([seconds, seconds[two_way]]),
+    )
+
+
+def load_graphml(path: Path) -> RoadGraph:
+    """GraphML estilo OSMnx (nodos x=lng, y=lat). edgedefault='undirected' añade ambos sentidos."""
+    ns = {"g": "http://graphml.graphdrawing.org/xmlns"}
+    root = ET.parse(path).getroot()
+    keys = {
+        (k.get("for"), k.get("attr.name")): k.get("id") for k in root.findall("g:key", ns)
+    }
+    graph = root.find("g:graph", ns)
+    if graph is None:
+        raise ValueError(f"GraphML sin <graph>: {path}")
+
+    def data(elem: ET.Element, scope: str, name: str) -> Optional[str]:
+        key = keys.get((scope, name))
+        if key is None:
+            return None
+        d = elem.find(f"g:data[@key='{key}']", ns)
+        return None if d is None else d.text
+
+    node_ids: Dict[str, int] = {}
+    lat: List[float] = []
+    lng: List[float] = []
+    for node in graph.findall("g:node", ns):
+        node_ids[node.get("id")] = len(lat)
+        lat.append(float(data(node, "node", "y")))
+        lng.append(float(data(node, "node", "x")))
+
+    u: List[int] = []
+    v: List[int] = []
+    length: List[float] = []
+    travel: List[float] = []
+    speed: List[float] = []
+    for edge in graph.findall("g:edge", ns):
+        u.append(node_ids[edge.get("source")])
+        v.append(node_ids[edge.get("target")])
+        length.append(_float_or_nan(data(edge, "edge", "length")))
+        travel.append(_float_or_nan(data(edge, "edge", "travel_time")))
+        sp = _float_or_nan(data(edge, "edge", "speed_kph"))
+        speed.append(sp if math.isfinite(sp) else _float_or_nan(data(edge, "edge", "maxspeed")))
+    u_a, v_a = np.array(u, dtype=np.int64), np.array(v, dtype=np.int64)
+    lat_a, lng_a = np.array(lat), np.array(lng)
+    length_a = np.array(length, dtype=float)
+    missing = ~np.isfinite(length_a)
+    if missing.any():
+        um, vm = u_a[missing], v_a[missing]
+        length_a[missing] = haversine_km_arrays(lat_a[um], lng_a[um], lat_a[vm], lng_a[vm]) * 1000.0
+    seconds = _edge_seconds(length_a, np.array(travel, dtype=float), np.array(speed, dtype=float))
+    if graph.get("edgedefault") == "undirected":
+        u_a, v_a = np.concatenate([u_a, v_a]), np.concatenate([v_a, u_a])
+        seconds = np.concatenate([seconds, seconds])
+    return _graph_from_edges(lat_a, lng_a, u_a, v_a, seconds)
+
+
+def load_road_graph(path: Path, cache_dir: Optional[Path] = None) -> RoadGraph:
+    """
+    Carga .graphml, .csv o un .npz ya preprocesado. Con cache_dir, el resultado
+    del parseo se guarda como .npz con clave (ruta, tamaño, mtime) del fuente.
+    """
+    path = Path(path)
+    if path.suffix == ".npz":
+        return RoadGraph.load(path)
+    loaders = {".graphml": load_graphml, ".csv": load_edge_list_csv}
+    if path.suffix not in loaders:
+        raise ValueError(f"formato de grafo no soportado: {path.suffix} (usa .graphml, .csv o .npz)")
+    cached = None
+    if cache_dir is not None:
+        st = path.stat()
+        key = f"{path.resolve()}:{st.st_size}:{st.st_mtime_ns}:{_GRAPH_FORMAT_VERSION}"
+        cached = Path(cache_dir) / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}.npz"
+        if cached.exists():
+            return RoadGraph.load(cached)
+    graph = loaders[path.suffix](path)
+    if cached is not None:
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cached.with_suffix(f".{os.getpid()}.tmp.npz")
+        graph.save(tmp)
+        os.replace(tmp, cached)
+    return graph
+
+
+class RoadNetworkProvider:
+    """
+    DurationMatrixProvider sobre un RoadGraph. Tiempo = tramo de enganche origen
+    + red + tramo de enganche destino; enganches en línea recta a
+    connector_speed_kmh. Pares sin camino caen a Haversine a connector_speed_kmh
+    para que D siga siendo finita. Con cutoff_s, un par cuya parte de red no
+    cabe en cutoff_s (o sin camino) vale max(cutoff_s + enganches, Haversine):
+    su parte de red es > cutoff_s, así que nunca sale más corto que un par
+    dentro del límite con los mismos enganches. Con
+    hierarchy (ContractionHierarchy del mismo grafo) la parte de red sale de
+    su consulta por buckets en lugar de un Dijkstra completo por origen.
+    """
+
+    def __init__(
+        self,
+        graph: RoadGraph,
+        connector_speed_kmh: float = 30.0,
+        cutoff_s: Optional[float] = None,
+        hierarchy=None,
+    ):
+        self.graph = graph
+        self.connector_speed_kmh = max(1.0, connector_speed_kmh)
+        self.cutoff_s = cutoff_s
+        if hierarchy is not None and hierarchy.graph_fingerprint != graph.fingerprint():
+            raise ValueError("hierarchy no corresponde a este grafo")
+        self.hierarchy = hierarchy
+
+    def durations_s(self, origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        origins, destinations = np.asarray(origins, dtype=float), np.asarray(destinations, dtype=float)
+        mps = self.connector_speed_kmh / 3.6
+        src, src_m = self.graph.nearest_nodes(origins[:, 0], origins[:, 1])
+        dst, dst_m = self.graph.nearest_nodes(destinations[:, 0], destinations[:, 1])
+        if self.hierarchy is None:
+            T = self.graph.node_durations_s(src, dst, self.cutoff_s)
+        else:
+            T = self.hierarchy.many_to_many(src, dst)
+            if self.cutoff_s is not None:
+                T[T > self.cutoff_s] = np.inf
+        connectors = src_m[:, None] / mps + dst_m[None, :] / mps
+        T += connectors
+        unreachable = ~np.isfinite(T)
+        if unreachable.any():
+            fallback = haversine_km_matrix(origins, destinations) * 1000.0 / mps
+            if self.cutoff_s is not None:
+                fallback = np.maximum(fallback, self.cutoff_s + connectors)
+            T[unreachable] = fallback[unreachable]
+        return T.astype(np.float32)
+
+    def cache_key(self) -> str:
+        # v2: pares fuera de cutoff_s con suelo cutoff_s + enganches (las cachés v1 no valen).
+        return f"road:v2:{self.graph.fingerprint()}:{self.connector_speed_kmh!r}:{self.cutoff_s!r}"
+
+
+class RoadNetworkCarpoolAdapter:
+    """
+    CarpoolTimeAdapter sobre red viaria: tt_min por RoadNetworkProvider;
+    walk_dist_m sigue en línea recta. tt_min_matrix calcula bloques enteros
+    (Dijkstra por origen, o buckets de la CH del proveedor); run_carpool_match
+    lo usa si existe.
+    """
+
+    def __init__(self, provider: RoadNetworkProvider):
+        self.provider = provider
+
+    def tt_min_matrix(
+        self, lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
+    ) -> np.ndarray:
+        T = self.provider.durations_s(np.c_[lat1, lon1], np.c_[lat2, lon2])
+        return T.astype(float) / 60.0
+
+    def tt_min(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        return float(self.tt_min_matrix([lat1], [lon1], [lat2], [lon2])[0, 0])
+
+    def walk_dist_m(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        return float(haversine_km_arrays(lat1, lon1, lat2, lon2)) * 1000.0